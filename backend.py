@@ -0,0 +1,266 @@
+import ctypes
+import hashlib
+import os
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from llvmlite import binding, ir
+
+import instrument
+
+_LLVM_INITIALIZED = False
+_RUNTIME_LOADED = False
+
+# Integer slow paths, printing, the arena allocator and runtime errors; linked
+# into every executable and loaded into the process for the JIT
+RUNTIME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runtime")
+RUNTIME_SOURCES = ("rinha_int.c", "rinha_value.c", "rinha_output.c", "rinha_profile.c")
+RUNTIME_HEADERS = ("rinha.h",)
+
+
+class BackendError(Exception):
+    pass
+
+
+class OptPreset(NamedTuple):
+    speed_level: int
+    size_level: int
+
+
+# Size levels follow clang's -Os/-Oz: the O2 pipeline with a lower inlining
+# threshold and no loop unrolling or vectorization.
+OPT_LEVELS: Dict[str, OptPreset] = {
+    "0": OptPreset(0, 0),
+    "1": OptPreset(1, 0),
+    "2": OptPreset(2, 0),
+    "3": OptPreset(3, 0),
+    "s": OptPreset(2, 1),
+    "z": OptPreset(2, 2),
+}
+
+SIZE_INLINING_THRESHOLDS = {1: 50, 2: 5}
+
+
+class OptStats(NamedTuple):
+    opt_level: str
+    time: float
+    # Only counted with time_passes or instrumentation on
+    instructions_before: Optional[int]
+    instructions_after: Optional[int]
+    pass_timings: Optional[str]
+
+
+class JitResult(NamedTuple):
+    compile_time: float
+    run_time: float
+    opt_stats: OptStats
+
+
+def initialize_llvm():
+    global _LLVM_INITIALIZED
+    if _LLVM_INITIALIZED:
+        return
+    binding.initialize_native_target()
+    binding.initialize_native_asmprinter()
+    _LLVM_INITIALIZED = True
+
+
+def create_target_machine(reloc: str = "pic") -> binding.TargetMachine:
+    with instrument.phase("llvm_init"):
+        initialize_llvm()
+        target = binding.Target.from_triple(binding.get_process_triple())
+        return target.create_target_machine(
+            cpu=binding.get_host_cpu_name(),
+            features=binding.get_host_cpu_features().flatten(),
+            reloc=reloc,
+        )
+
+
+def target_id(target_machine: binding.TargetMachine) -> str:
+    return f"{target_machine.triple}/{binding.get_host_cpu_name()}/{binding.get_host_cpu_features().flatten()}"
+
+
+def parse_module(mod: ir.Module, target_machine: binding.TargetMachine) -> binding.ModuleRef:
+    with instrument.phase("ir_serialize"):
+        ir_text = str(mod)
+    with instrument.phase("ir_parse"):
+        llvm_mod = binding.parse_assembly(ir_text)
+    # MCJIT refuses modules whose layout differs from the target machine's
+    llvm_mod.triple = target_machine.triple
+    llvm_mod.data_layout = str(target_machine.target_data)
+    try:
+        with instrument.phase("ir_verify"):
+            llvm_mod.verify()
+    except RuntimeError as e:
+        raise BackendError(f"Invalid LLVM module: {e}")
+    return llvm_mod
+
+
+def count_instructions(llvm_mod: binding.ModuleRef) -> int:
+    return sum(1 for func in llvm_mod.functions for block in func.blocks for _ in block.instructions)
+
+
+def optimize_module(llvm_mod: binding.ModuleRef, target_machine: binding.TargetMachine,
+                    opt_level: str = "2", time_passes: bool = False) -> OptStats:
+    if opt_level not in OPT_LEVELS:
+        raise BackendError(f"Unknown optimization level: -O{opt_level}. Available levels: {list(OPT_LEVELS)}")
+    preset = OPT_LEVELS[opt_level]
+
+    pto = binding.create_pipeline_tuning_options(speed_level=preset.speed_level)
+    if preset.size_level:
+        pto.inlining_threshold = SIZE_INLINING_THRESHOLDS[preset.size_level]
+        pto.loop_unrolling = False
+        pto.loop_vectorization = False
+        pto.slp_vectorization = False
+    pass_builder = binding.create_pass_builder(target_machine, pto)
+
+    # Walking every instruction through the C API costs as much as a fast
+    # -O0 pipeline, so only reports pay for it
+    counting = time_passes or instrument.ENABLED
+    instructions_before = count_instructions(llvm_mod) if counting else None
+    if instrument.ENABLED:
+        instrument.count("llvm.instructions_before_opt", instructions_before)
+    if time_passes:
+        pass_builder.start_pass_timing()
+    start = time.perf_counter()
+    with instrument.phase("optimize"):
+        pass_builder.getModulePassManager().run(llvm_mod, pass_builder)
+    elapsed = time.perf_counter() - start
+    pass_timings = pass_builder.finish_pass_timing() if time_passes else None
+
+    instructions_after = count_instructions(llvm_mod) if counting else None
+    if instrument.ENABLED:
+        instrument.count("llvm.instructions_after_opt", instructions_after)
+    return OptStats(
+        opt_level=opt_level,
+        time=elapsed,
+        instructions_before=instructions_before,
+        instructions_after=instructions_after,
+        pass_timings=pass_timings,
+    )
+
+
+def format_opt_stats(stats: OptStats) -> str:
+    lines = [
+        f"-O{stats.opt_level}: {stats.time * 1000:.3f} ms, "
+        f"instructions {stats.instructions_before} -> {stats.instructions_after}"
+    ]
+    if stats.pass_timings:
+        lines.append(stats.pass_timings.rstrip())
+    return "\n".join(lines)
+
+
+def emit_object(llvm_mod: binding.ModuleRef, target_machine: binding.TargetMachine) -> bytes:
+    with instrument.phase("emit_object"):
+        return target_machine.emit_object(llvm_mod)
+
+
+def emit_bitcode(llvm_mod: binding.ModuleRef) -> bytes:
+    with instrument.phase("emit_bitcode"):
+        return llvm_mod.as_bitcode()
+
+
+def runtime_cache_dir() -> str:
+    from cache import DEFAULT_CACHE_DIR
+    return os.path.join(os.environ.get("CLOWNHEAD_CACHE_DIR", DEFAULT_CACHE_DIR), "runtime")
+
+
+def compile_runtime(compiler: str, sources: List[str], mode: str, suffix: str) -> str:
+    # Compiled once per source/compiler/mode and reused from the cache directory
+    digest = hashlib.sha256(f"{compiler}\0{mode}".encode("utf8"))
+    for name in (*sources, *RUNTIME_HEADERS):
+        with open(os.path.join(RUNTIME_DIR, name), 'rb') as f:
+            digest.update(name.encode("utf8") + b"\0" + f.read())
+    stem = os.path.splitext(sources[0])[0] if len(sources) == 1 else "rinha"
+    output_dir = runtime_cache_dir()
+    output_path = os.path.join(output_dir, f"{stem}-{digest.hexdigest()[:16]}{suffix}")
+    if os.path.exists(output_path):
+        return output_path
+
+    os.makedirs(output_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f".{stem}-")
+    os.close(fd)
+    command = [compiler, "-O2", "-fPIC", mode, *(os.path.join(RUNTIME_DIR, name) for name in sources), "-o", tmp_path]
+    try:
+        with instrument.phase("build_runtime"):
+            subprocess.run(command, check=True, capture_output=True, text=True)
+        os.replace(tmp_path, output_path)
+    except FileNotFoundError:
+        raise BackendError(f"Compiler not found: {compiler} (choose a C compiler with --cc)")
+    except subprocess.CalledProcessError as e:
+        raise BackendError(f"Building the runtime failed ({' '.join(command)}):\n{e.stderr}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def build_runtime(compiler: str = "clang", shared: bool = False) -> List[str]:
+    if shared:
+        return [compile_runtime(compiler, list(RUNTIME_SOURCES), "-shared", ".so")]
+    return [compile_runtime(compiler, [source], "-c", ".o") for source in RUNTIME_SOURCES]
+
+
+def load_runtime(compiler: str = "clang"):
+    global _RUNTIME_LOADED
+    if _RUNTIME_LOADED:
+        return
+    binding.load_library_permanently(build_runtime(compiler, shared=True)[0])
+    _RUNTIME_LOADED = True
+
+
+def link_executable(object_paths: List[str], output_path: str, linker: str = "clang"):
+    command = [linker, *object_paths, *build_runtime(linker), "-o", output_path]
+    try:
+        with instrument.phase("link"):
+            subprocess.run(command, check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise BackendError(f"Linker not found: {linker}")
+    except subprocess.CalledProcessError as e:
+        raise BackendError(f"Linking failed ({' '.join(command)}):\n{e.stderr}")
+
+
+def build_executable(llvm_mod: binding.ModuleRef, target_machine: binding.TargetMachine,
+                     output_path: str, linker: str = "clang"):
+    # The object only lives long enough to be handed to the linker
+    with tempfile.TemporaryDirectory(prefix="clownhead-") as tmpdir:
+        object_path = os.path.join(tmpdir, os.path.basename(output_path) + ".o")
+        with open(object_path, 'wb') as f:
+            f.write(emit_object(llvm_mod, target_machine))
+        link_executable([object_path], output_path, linker)
+
+
+def jit_compile(llvm_mod: binding.ModuleRef, target_machine: binding.TargetMachine):
+    # The engine owns the generated code, so callers must keep it alive while calling main
+    with instrument.phase("jit_compile"):
+        engine = binding.create_mcjit_compiler(llvm_mod, target_machine)
+        engine.finalize_object()
+        engine.run_static_constructors()
+
+    main_addr = engine.get_function_address("main")
+    if not main_addr:
+        raise BackendError("Module has no 'main' function")
+    return engine, ctypes.CFUNCTYPE(ctypes.c_int32)(main_addr)
+
+
+def run_jit(mod: ir.Module, target_machine: Optional[binding.TargetMachine] = None,
+            opt_level: str = "2", time_passes: bool = False, compiler: str = "clang") -> JitResult:
+    start = time.perf_counter()
+
+    if target_machine is None:
+        target_machine = create_target_machine()
+    llvm_mod = parse_module(mod, target_machine)
+    opt_stats = optimize_module(llvm_mod, target_machine, opt_level, time_passes)
+    load_runtime(compiler)
+    engine, main_func = jit_compile(llvm_mod, target_machine)
+
+    compiled = time.perf_counter()
+    with instrument.phase("execute"):
+        # Generated main flushes the runtime's output buffer before returning
+        main_func()
+    finished = time.perf_counter()
+
+    engine.run_static_destructors()
+    return JitResult(compile_time=compiled - start, run_time=finished - compiled, opt_stats=opt_stats)
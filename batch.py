@@ -0,0 +1,198 @@
+"""Compile many Rinha JSON ASTs per process on a pool of warm workers.
+
+    python batch.py example.json benchmarks/ 'inputs/**/*.json' [-j 4] [--output-dir out]
+    find inputs -name '*.json' | python batch.py -
+    python batch.py --socket /tmp/clownhead.sock
+
+Every worker imports llvmlite, initializes LLVM and creates the target machine
+once, then compiles whatever it is handed. Each finished file is reported as
+one JSON line (on stdout, or back over the socket connection that sent it).
+"""
+import argparse
+import glob
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from main import add_compile_options, build_artifact, configure_logging
+
+# Set in each worker process by initialize_worker
+_TARGET_MACHINE = None
+
+
+def initialize_worker():
+    global _TARGET_MACHINE
+    from backend import create_target_machine
+    import codegen  # noqa: F401 (imported once here instead of on the first file)
+
+    _TARGET_MACHINE = create_target_machine()
+
+
+def compile_file(path: str, args: argparse.Namespace, output_dir: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    output_name = os.path.join(output_dir, os.path.basename(path).split('.')[0])
+    result: Dict[str, Any] = {"path": path, "worker": os.getpid()}
+    try:
+        output_path, hit_key, report = build_artifact(path, args, _TARGET_MACHINE, output_name)
+        result.update(ok=True, output=output_path, cached=hit_key is not None)
+        if report:
+            result.update(reused_units=report.reused, compiled_units=report.compiled)
+    except Exception as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    result["compile_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def submit(executor: ProcessPoolExecutor, path: str, args: argparse.Namespace,
+           on_done: Callable[[Dict[str, Any]], None]) -> Future:
+    submitted = time.perf_counter()
+    future = executor.submit(compile_file, path, args, args.output_dir)
+
+    def done(future: Future):
+        error = future.exception()
+        if error is None:
+            result = future.result()
+        else:
+            # The worker itself died (e.g. LLVM aborted), not just the compile
+            result = {"path": path, "ok": False, "error": f"{type(error).__name__}: {error}"}
+        # Includes the time spent waiting for a free worker
+        result["wall_ms"] = round((time.perf_counter() - submitted) * 1000, 3)
+        on_done(result)
+
+    future.add_done_callback(done)
+    return future
+
+
+def expand_inputs(inputs: Iterable[str]) -> Iterator[str]:
+    for item in inputs:
+        if item == "-":
+            # Paths are submitted as they arrive, so a producer can stream them in
+            for line in sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        elif os.path.isdir(item):
+            yield from sorted(glob.glob(os.path.join(item, "*.json")))
+        elif glob.has_magic(item):
+            yield from sorted(glob.glob(item, recursive=True))
+        else:
+            yield item
+
+
+def run_batch(paths: Iterable[str], executor: ProcessPoolExecutor, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    lock = threading.Lock()
+    results: List[Dict[str, Any]] = []
+
+    def report(result: Dict[str, Any]):
+        with lock:
+            results.append(result)
+            print(json.dumps(result), flush=True)
+
+    futures = [submit(executor, path, args, report) for path in paths]
+    for future in futures:
+        future.exception()
+    # Done callbacks may still be running right after the futures resolve
+    executor.shutdown(wait=True)
+    return results
+
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    # One path per line; one JSON result line per path, in completion order
+    def handle(self):
+        lock = threading.Lock()
+
+        def report(result: Dict[str, Any]):
+            with lock:
+                try:
+                    self.wfile.write(json.dumps(result).encode("utf8") + b"\n")
+                    self.wfile.flush()
+                except OSError:
+                    pass
+
+        # Futures resolve before their done callbacks run, so wait on the
+        # reports themselves before the connection is closed
+        reported = []
+        for line in self.rfile:
+            path = line.decode("utf8").strip()
+            if path:
+                event = threading.Event()
+                reported.append(event)
+                submit(self.server.executor, path, self.server.args,
+                       lambda result, event=event: (report(result), event.set()))
+        for event in reported:
+            event.wait()
+
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, executor: ProcessPoolExecutor, args: argparse.Namespace):
+        self.executor = executor
+        self.args = args
+        super().__init__(path, CompileRequestHandler)
+
+
+def stop_serving(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(path: str, executor: ProcessPoolExecutor, args: argparse.Namespace):
+    if os.path.exists(path):
+        os.remove(path)
+    signal.signal(signal.SIGTERM, stop_serving)
+    with CompileServer(path, executor, args) as server:
+        print(f"Listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compile many Rinha JSON ASTs on a pool of worker processes")
+    parser.add_argument("inputs", nargs="*",
+                        help="JSON AST files, directories (their *.json files), glob patterns, or - to read paths "
+                             "from stdin")
+    parser.add_argument("--socket", help="serve compile requests on this Unix socket instead of compiling inputs")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--output-dir", default=".", help="directory for the generated artifacts (default: .)")
+    add_compile_options(parser)
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.socket:
+        parser.error("give at least one input, - for stdin, or --socket")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(args.log_level)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=initialize_worker)
+    if args.socket:
+        with executor:
+            serve(args.socket, executor, args)
+        return
+
+    start = time.perf_counter()
+    results = run_batch(expand_inputs(args.inputs), executor, args)
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for result in results if not result["ok"])
+    cached = sum(1 for result in results if result.get("cached"))
+    print(f"Compiled {len(results)} files ({failed} failed, {cached} from cache) in {elapsed * 1000:.1f} ms "
+          f"on {args.workers} workers", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare AST memory and conversion time against the old dict-backed nodes.
+
+    python benchmarks/ast_memory.py [--depth 20000] [--repeat 3]
+
+The "legacy" run swaps every my_ast class used by main.py for an equivalent
+class without __slots__ and stops interning filenames, which is how nodes were
+represented before; the "current" run uses my_ast as is.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+import my_ast  # noqa: E402
+from benchmarks.deep_ast import deep_binary, deep_let_chain  # noqa: E402
+
+NODE_CLASSES = ("Loc", "Parameter", "Int", "Str", "Bool", "Binary", "Var", "If", "Let", "Call", "Function", "Print",
+                "File")
+
+
+def legacy_class(cls):
+    # Same constructor, but instances get a per-object __dict__
+    return type(f"Legacy{cls.__name__}", (), {"__init__": cls.__init__})
+
+
+@contextmanager
+def legacy_nodes():
+    saved = {name: getattr(main, name) for name in NODE_CLASSES}
+    saved_convert_location = main.convert_location
+    legacy = {name: legacy_class(getattr(my_ast, name)) for name in NODE_CLASSES}
+    for name, cls in legacy.items():
+        setattr(main, name, cls)
+    main.convert_location = lambda data: legacy["Loc"](data["start"], data["end"], data["filename"])
+    try:
+        yield
+    finally:
+        for name, cls in saved.items():
+            setattr(main, name, cls)
+        main.convert_location = saved_convert_location
+
+
+def count_nodes(ast) -> int:
+    count = 0
+    pending = [ast.expression]
+    while pending:
+        node = pending.pop()
+        count += 1
+        for attr in ("value", "next", "lhs", "rhs", "condition", "then", "otherwise", "callee"):
+            child = getattr(node, attr, None)
+            if child is not None and hasattr(child, "location"):
+                pending.append(child)
+        pending.extend(getattr(node, "arguments", ()))
+    return count
+
+
+def measure(data, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        main.dict_to_ast(data)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    ast = main.dict_to_ast(data)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, after - before, count_nodes(ast)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for name, generate in (("let-chain", deep_let_chain), ("binary", deep_binary)):
+        data = generate(args.depth)
+        with legacy_nodes():
+            legacy_time, legacy_bytes, nodes = measure(data, args.repeat)
+        current_time, current_bytes, _ = measure(data, args.repeat)
+
+        print(f"{name} ({nodes} nodes):")
+        print(f"  legacy   {legacy_bytes / nodes:7.1f} bytes/node  convert {legacy_time * 1000:9.1f} ms")
+        print(f"  current  {current_bytes / nodes:7.1f} bytes/node  convert {current_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,121 @@
+"""Measure JSON-to-AST conversion on synthetic, very deeply nested programs.
+
+    python benchmarks/deep_ast.py [--depth 100000]
+
+Two shapes are generated: a chain of `let xN = xN-1 + 1;` bindings and a
+right-nested `1 + (1 + (1 + ...))` expression. For each one the streaming
+reader (`read_ast_from_json`) is compared with decoding to dicts first and
+converting afterwards (`parse_ast_from_json` + `dict_to_ast`).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import dict_to_ast, parse_ast_from_json, read_ast_from_json  # noqa: E402
+
+FILENAME = "deep.rinha"
+
+
+def location():
+    # A fresh string per location, as the JSON decoder produces
+    return {"start": 0, "end": 0, "filename": FILENAME.encode().decode()}
+
+
+def deep_let_chain(depth: int) -> dict:
+    expression = {"kind": "Print", "value": {"kind": "Var", "text": f"x{depth}", "location": location()},
+                  "location": location()}
+    for i in range(depth, 0, -1):
+        value = {"kind": "Binary", "op": "Add",
+                 "lhs": {"kind": "Var", "text": f"x{i - 1}", "location": location()},
+                 "rhs": {"kind": "Int", "value": 1, "location": location()},
+                 "location": location()}
+        expression = {"kind": "Let", "name": {"text": f"x{i}", "location": location()},
+                      "value": value, "next": expression, "location": location()}
+    expression = {"kind": "Let", "name": {"text": "x0", "location": location()},
+                  "value": {"kind": "Int", "value": 0, "location": location()},
+                  "next": expression, "location": location()}
+    return {"name": FILENAME, "expression": expression, "location": location()}
+
+
+def deep_binary(depth: int) -> dict:
+    expression = {"kind": "Int", "value": 1, "location": location()}
+    for _ in range(depth):
+        expression = {"kind": "Binary", "op": "Add",
+                      "lhs": {"kind": "Int", "value": 1, "location": location()},
+                      "rhs": expression, "location": location()}
+    expression = {"kind": "Print", "value": expression, "location": location()}
+    return {"name": FILENAME, "expression": expression, "location": location()}
+
+
+def write_json(data, f):
+    # json.dump recurses per level too, so encode with an explicit stack
+    pending = [data]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, _Raw):
+            f.write(item.text)
+        elif isinstance(item, dict):
+            parts = [_Raw("{")]
+            for i, (key, value) in enumerate(item.items()):
+                parts.append(_Raw(("," if i else "") + json.dumps(key) + ":"))
+                parts.append(value)
+            parts.append(_Raw("}"))
+            pending.extend(reversed(parts))
+        elif isinstance(item, list):
+            parts = [_Raw("[")]
+            for i, value in enumerate(item):
+                if i:
+                    parts.append(_Raw(","))
+                parts.append(value)
+            parts.append(_Raw("]"))
+            pending.extend(reversed(parts))
+        else:
+            f.write(json.dumps(item))
+
+
+class _Raw:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for name, generate in (("let-chain", deep_let_chain), ("binary", deep_binary)):
+        with tempfile.NamedTemporaryFile('w', suffix=".json", delete=False) as f:
+            write_json(generate(args.depth), f)
+            path = f.name
+        try:
+            size = os.path.getsize(path)
+            stream_time, stream_peak = measure(read_ast_from_json, path)
+            dict_time, dict_peak = measure(lambda p: dict_to_ast(parse_ast_from_json(p)), path)
+        finally:
+            os.remove(path)
+
+        print(f"{name} (depth {args.depth}, {size / 1e6:.1f} MB):")
+        print(f"  streaming       {stream_time:8.2f} s  peak {stream_peak / 1e6:8.1f} MB")
+        print(f"  dict + convert  {dict_time:8.2f} s  peak {dict_peak / 1e6:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
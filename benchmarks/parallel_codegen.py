@@ -0,0 +1,113 @@
+"""Measure parallel code generation on a synthetic program with many functions.
+
+    python benchmarks/parallel_codegen.py [--functions 200] [--width 4] [--jobs 1,2,4] [-O 2] [--repeat 3]
+                                          [--cc clang]
+
+The program has --functions top-level functions, each a loop over a sum of
+--width terms, and prints the sum of their results. For every --jobs value it
+is built into an executable with `incremental.compile_units`, without the
+cache, and the fastest of --repeat builds is reported next to a build of the
+whole program as a single module.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.deep_ast import FILENAME, location  # noqa: E402
+
+
+def chained_functions(count: int, width: int) -> dict:
+    def var(name):
+        return {"kind": "Var", "text": name, "location": location()}
+
+    def binary(op, lhs, rhs):
+        return {"kind": "Binary", "op": op, "lhs": lhs, "rhs": rhs, "location": location()}
+
+    def call(name, *arguments):
+        return {"kind": "Call", "callee": var(name), "arguments": list(arguments), "location": location()}
+
+    def literal(value):
+        return {"kind": "Int", "value": value, "location": location()}
+
+    # Prints f0(0, 3) + f1(1, 3) + ...
+    total = literal(0)
+    for i in range(count):
+        total = binary("Add", total, call(f"f{i}", literal(i), literal(3)))
+    expression = {"kind": "Print", "value": total, "location": location()}
+    for i in range(count - 1, -1, -1):
+        # f{i}(x, n) loops n times over (x * 1 + i) % 7 + (x * 2 + i) % 7 + ...
+        step = literal(i)
+        for k in range(1, width + 1):
+            step = binary("Add", step, binary("Rem", binary("Add", binary("Mul", var("x"), literal(k)), literal(i)),
+                                              literal(7)))
+        body = {"kind": "If", "condition": binary("Eq", var("n"), literal(0)), "then": var("x"),
+                "otherwise": call(f"f{i}", step, binary("Sub", var("n"), literal(1))), "location": location()}
+        function = {"kind": "Function", "parameters": [{"text": "x", "location": location()},
+                                                       {"text": "n", "location": location()}],
+                    "value": body, "location": location()}
+        expression = {"kind": "Let", "name": {"text": f"f{i}", "location": location()}, "value": function,
+                      "next": expression, "location": location()}
+    return {"name": FILENAME, "expression": expression, "location": location()}
+
+
+def build_whole(ast, target_machine, output_path: str, opt_level: str, cc: str):
+    from backend import build_executable, optimize_module, parse_module
+    from codegen import generate_code
+
+    llvm_mod = parse_module(generate_code(ast, target_machine), target_machine)
+    optimize_module(llvm_mod, target_machine, opt_level)
+    build_executable(llvm_mod, target_machine, output_path, cc)
+
+
+def best_of(repeat: int, build) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(args: argparse.Namespace):
+    from backend import build_runtime, create_target_machine
+    from incremental import compile_units
+    from main import dict_to_ast, optimize_ast
+
+    options = argparse.Namespace(opt_level=args.opt_level, no_memoize=False, profile_use=None)
+    ast = optimize_ast(dict_to_ast(chained_functions(args.functions, args.width)), options)
+    target_machine = create_target_machine()
+    # Compile the runtime up front so no build pays for it
+    build_runtime(args.cc)
+
+    print(f"{args.functions} functions, width {args.width}, -O{args.opt_level}, {os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory(prefix="clownhead-bench-") as tmpdir:
+        output_path = os.path.join(tmpdir, "program")
+        whole = best_of(args.repeat, lambda: build_whole(ast, target_machine, output_path, args.opt_level, args.cc))
+        print(f"  single module      {whole:9.1f} ms")
+        for jobs in [int(jobs) for jobs in args.jobs.split(",")]:
+            elapsed = best_of(args.repeat, lambda: compile_units(ast, target_machine, output_path, args.opt_level,
+                                                                 args.cc, jobs=jobs))
+            print(f"  --codegen-jobs {jobs:<3} {elapsed:9.1f} ms  ({whole / elapsed:.2f}x)")
+
+
+def main(argv=None):
+    from main import call_with_deep_stack
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--functions", type=int, default=200)
+    parser.add_argument("--width", type=int, default=4, help="terms summed in each function body")
+    parser.add_argument("--jobs", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("-O", dest="opt_level", default="2")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cc", default="clang", help="compiler driver used to link the executables")
+    # The sum at the top level is as deep as there are functions
+    call_with_deep_stack(run, parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
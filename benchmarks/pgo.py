@@ -0,0 +1,116 @@
+"""Compare executables built with --pgo against regular builds.
+
+    python benchmarks/pgo.py [-O 2] [--repeat 5] [--cc clang] [--collatz 300000]
+
+Every input is compiled twice without the cache, once normally and once with
+--pgo (whose training run is the program itself), and each executable is run
+--repeat times with its output discarded. The fastest run of each is reported
+with the speedup of the PGO build. The inputs are the bundled examples and a
+synthetic branchy program, the sum of the Collatz step counts of 1..--collatz.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.deep_ast import FILENAME, location, write_json  # noqa: E402
+from benchmarks.suite import EXAMPLES  # noqa: E402
+
+
+def collatz_sum(limit: int) -> dict:
+    # let collatz = fn (n, steps) => if (n == 1) { steps } else { if (n % 2 == 0) { collatz(n / 2, steps + 1) }
+    #                                                           else { collatz(3 * n + 1, steps + 1) } };
+    # let sum = fn (i, acc) => if (i == 0) { acc } else { sum(i - 1, acc + collatz(i, 0)) };
+    # print(sum(limit, 0))
+    def var(name):
+        return {"kind": "Var", "text": name, "location": location()}
+
+    def literal(value):
+        return {"kind": "Int", "value": value, "location": location()}
+
+    def binary(op, lhs, rhs):
+        return {"kind": "Binary", "op": op, "lhs": lhs, "rhs": rhs, "location": location()}
+
+    def call(name, *arguments):
+        return {"kind": "Call", "callee": var(name), "arguments": list(arguments), "location": location()}
+
+    def branch(condition, then, otherwise):
+        return {"kind": "If", "condition": condition, "then": then, "otherwise": otherwise, "location": location()}
+
+    def function(parameters, body):
+        return {"kind": "Function", "parameters": [{"text": name, "location": location()} for name in parameters],
+                "value": body, "location": location()}
+
+    def let(name, value, next):
+        return {"kind": "Let", "name": {"text": name, "location": location()}, "value": value, "next": next,
+                "location": location()}
+
+    steps = binary("Add", var("steps"), literal(1))
+    collatz = function(["n", "steps"], branch(
+        binary("Eq", var("n"), literal(1)), var("steps"),
+        branch(binary("Eq", binary("Rem", var("n"), literal(2)), literal(0)),
+               call("collatz", binary("Div", var("n"), literal(2)), steps),
+               call("collatz", binary("Add", binary("Mul", literal(3), var("n")), literal(1)), steps))))
+    total = function(["i", "acc"], branch(
+        binary("Eq", var("i"), literal(0)), var("acc"),
+        call("sum", binary("Sub", var("i"), literal(1)), binary("Add", var("acc"), call("collatz", var("i"), literal(0))))))
+    expression = let("collatz", collatz, let("sum", total, {"kind": "Print", "value": call("sum", literal(limit),
+                                                                                         literal(0)),
+                                                          "location": location()}))
+    return {"name": FILENAME, "expression": expression, "location": location()}
+
+
+def build(path: str, directory: str, output: str, flags: list, opt_level: str, cc: str) -> float:
+    # Returns the compile time in ms; main.py names the executable after the input
+    command = [sys.executable, os.path.join(ROOT, "main.py"), path, "-O", opt_level, "--cc", cc, "--no-cache"]
+    start = time.perf_counter()
+    subprocess.run(command + flags, cwd=directory, stdout=subprocess.DEVNULL, check=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    shutil.move(os.path.join(directory, os.path.basename(path).split('.')[0]), output)
+    return elapsed
+
+
+def best_run(executable: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([executable], stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-O", dest="opt_level", default="2")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cc", default="clang", help="compiler driver used to link the executables")
+    parser.add_argument("--collatz", type=int, default=300000, help="size of the synthetic Collatz workload")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="clownhead-bench-") as tmpdir:
+        inputs = {name: os.path.join(ROOT, name) for name in EXAMPLES}
+        collatz_path = os.path.join(tmpdir, "collatz.json")
+        with open(collatz_path, 'w') as f:
+            write_json(collatz_sum(args.collatz), f)
+        inputs[f"collatz-{args.collatz}"] = collatz_path
+
+        print(f"{'input':<20} {'build ms':>10} {'pgo build ms':>13} {'run ms':>9} {'pgo run ms':>11}  speedup")
+        for name, path in inputs.items():
+            regular = os.path.join(tmpdir, "regular")
+            profiled = os.path.join(tmpdir, "pgo")
+            build_ms = build(path, tmpdir, regular, [], args.opt_level, args.cc)
+            pgo_build_ms = build(path, tmpdir, profiled, ["--pgo"], args.opt_level, args.cc)
+            run_ms = best_run(regular, args.repeat)
+            pgo_run_ms = best_run(profiled, args.repeat)
+            print(f"{name:<20} {build_ms:>10.1f} {pgo_build_ms:>13.1f} {run_ms:>9.2f} {pgo_run_ms:>11.2f}  "
+                  f"{run_ms / pgo_run_ms:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
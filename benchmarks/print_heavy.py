@@ -0,0 +1,100 @@
+"""Measure compiled programs whose run time is spent printing.
+
+    python benchmarks/print_heavy.py [--lines 1000000] [-O 2] [--repeat 5] [--cc clang]
+
+A synthetic program prints --lines integers and as many string literals from
+a recursive loop. It is built once and run --repeat times for every output
+target: /dev/null, a pipe, a regular file, and a regular file written through
+a memory mapping (RINHA_OUTPUT_MMAP=1). The fastest run of each is reported.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.deep_ast import FILENAME, location, write_json  # noqa: E402
+
+
+def print_loop(lines: int) -> dict:
+    # let loop = fn (i) => if (i == lines) { i } else { let _ = print(i * 7919); let _ = print("tick"); loop(i + 1) };
+    # loop(0)
+    def var(name):
+        return {"kind": "Var", "text": name, "location": location()}
+
+    def literal(value):
+        return {"kind": "Int", "value": value, "location": location()}
+
+    def binary(op, lhs, rhs):
+        return {"kind": "Binary", "op": op, "lhs": lhs, "rhs": rhs, "location": location()}
+
+    def let(name, value, next):
+        return {"kind": "Let", "name": {"text": name, "location": location()}, "value": value, "next": next,
+                "location": location()}
+
+    def show(value):
+        return {"kind": "Print", "value": value, "location": location()}
+
+    step = {"kind": "Call", "callee": var("loop"), "arguments": [binary("Add", var("i"), literal(1))],
+            "location": location()}
+    body = let("_", show(binary("Mul", var("i"), literal(7919))),
+               let("_", show({"kind": "Str", "value": "tick", "location": location()}), step))
+    loop = {"kind": "Function", "parameters": [{"text": "i", "location": location()}],
+            "value": {"kind": "If", "condition": binary("Eq", var("i"), literal(lines)), "then": var("i"),
+                      "otherwise": body, "location": location()},
+            "location": location()}
+    start = {"kind": "Call", "callee": var("loop"), "arguments": [literal(0)], "location": location()}
+    return {"name": FILENAME, "expression": let("loop", loop, start), "location": location()}
+
+
+def best_run(command: list, repeat: int, env: dict, stdout_path=None, pipe=False) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if pipe:
+            # Drained by a reader the way a consumer of the output would be
+            reader = subprocess.Popen(["cat"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+            subprocess.run(command, stdout=reader.stdin, env=env)
+            reader.stdin.close()
+            reader.wait()
+        else:
+            with open(stdout_path, 'wb') as stdout:
+                subprocess.run(command, stdout=stdout, env=env)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("-O", dest="opt_level", default="2")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cc", default="clang", help="compiler driver used to link the executable")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="clownhead-bench-") as tmpdir:
+        path = os.path.join(tmpdir, "prints.json")
+        with open(path, 'w') as f:
+            write_json(print_loop(args.lines), f)
+        subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), path, "-O", args.opt_level, "--cc", args.cc,
+                        "--no-cache"], cwd=tmpdir, stdout=subprocess.DEVNULL, check=True)
+        executable = [os.path.join(tmpdir, "prints")]
+        output_path = os.path.join(tmpdir, "output.txt")
+        env = dict(os.environ)
+        env.pop("RINHA_OUTPUT_MMAP", None)
+
+        print(f"{2 * args.lines} lines, -O{args.opt_level}")
+        print(f"  /dev/null          {best_run(executable, args.repeat, env, os.devnull):9.1f} ms")
+        print(f"  pipe               {best_run(executable, args.repeat, env, pipe=True):9.1f} ms")
+        print(f"  file               {best_run(executable, args.repeat, env, output_path):9.1f} ms")
+        mapped = best_run(executable, args.repeat, dict(env, RINHA_OUTPUT_MMAP="1"), output_path)
+        print(f"  file (mmap)        {mapped:9.1f} ms")
+        print(f"  output             {os.path.getsize(output_path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
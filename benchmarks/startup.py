@@ -0,0 +1,94 @@
+"""Measure the start-up cost of main.py, cold and through a prewarmed forkserver.
+
+    python benchmarks/startup.py [--repeat 10] [--cc clang] [--input example.json]
+
+First the import time of an --interp run is broken down with
+`python -X importtime`: the total and the slowest top-level imports. Then each
+mode (--interp, --jit, an executable from the cache and one built without it)
+is run --repeat times as a fresh process, and again with CLOWNHEAD_FORKSERVER
+pointing at a forkserver.py started for the purpose. The fastest run of each
+is reported.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+MODES = {
+    "--interp": ["--interp"],
+    "--jit": ["--jit"],
+    "exe (cached)": [],
+    "exe (--no-cache)": ["--no-cache"],
+}
+
+
+def import_times(path: str, directory: str) -> list:
+    # (cumulative us, module) for every top-level import of an --interp run
+    result = subprocess.run([sys.executable, "-X", "importtime", MAIN, path, "--interp"], cwd=directory,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit() and not name.startswith("  "):
+                imports.append((int(cumulative), name.strip()))
+    return imports
+
+
+def best_run(command: list, directory: str, env: dict, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def start_server(socket_path: str, cc: str) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "forkserver.py"), socket_path, "--cc", cc],
+                              stderr=subprocess.PIPE, text=True)
+    # The server reports once it is prewarmed and listening
+    server.stderr.readline()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--cc", default="clang", help="compiler driver used to link the executables")
+    parser.add_argument("--input", default=os.path.join(ROOT, "example.json"))
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="clownhead-bench-") as tmpdir:
+        path = os.path.abspath(args.input)
+        imports = import_times(path, tmpdir)
+        total = sum(cumulative for cumulative, _ in imports)
+        slowest = ", ".join(f"{name} {cumulative / 1000:.1f}" for cumulative, name in sorted(imports)[::-1][:5])
+        print(f"-X importtime, --interp: {total / 1000:.1f} ms in {len(imports)} top-level imports ({slowest})")
+
+        cold_env = dict(os.environ, CLOWNHEAD_CACHE_DIR=os.path.join(tmpdir, "cache"))
+        cold_env.pop("CLOWNHEAD_FORKSERVER", None)
+        socket_path = os.path.join(tmpdir, "forkserver.sock")
+        warm_env = dict(cold_env, CLOWNHEAD_FORKSERVER=socket_path)
+        server = start_server(socket_path, args.cc)
+        try:
+            python_ms = best_run([sys.executable, "-c", "pass"], tmpdir, cold_env, args.repeat)
+            print(f"{'mode':<18} {'cold ms':>9} {'warm ms':>9}  (python -c pass: {python_ms:.1f} ms)")
+            for name, flags in MODES.items():
+                command = [sys.executable, MAIN, path, "--cc", args.cc] + flags
+                cold_ms = best_run(command, tmpdir, cold_env, args.repeat)
+                warm_ms = best_run(command, tmpdir, warm_env, args.repeat)
+                print(f"{name:<18} {cold_ms:>9.1f} {warm_ms:>9.1f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
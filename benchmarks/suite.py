@@ -0,0 +1,335 @@
+"""Benchmark every compiler phase over the bundled examples and synthetic workloads.
+
+    python benchmarks/suite.py [--backends aot,jit,interp] [--levels 0,2] [--scale 1] [--repeat 3]
+                               [--cc clang] [--baseline benchmarks/baseline.json] [--update-baseline]
+                               [--threshold 0.25]
+
+Each (input, backend, level) case runs in a fresh worker process so peak RSS
+is per case; the fastest of --repeat runs is kept for every phase, and compiled
+cases also record what common subexpression elimination removed. Results are
+written as JSON to --output. With --baseline, any phase (or the peak RSS) that
+is more than --threshold slower/larger than the baseline, and by more than
+--noise-ms, is reported and the exit status is 1. --update-baseline writes the
+current results to the baseline file instead.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.deep_ast import FILENAME, deep_let_chain, location, write_json  # noqa: E402
+
+EXAMPLES = ("example.json", "sum.json", "comb.json", "print.json")
+BACKENDS = ("aot", "jit", "interp")
+
+# Base sizes of the synthetic programs, multiplied by --scale
+SYNTHETIC_SIZES = {"deep-let": 200, "wide-expression": 2000, "many-functions": 200, "repeated-calls": 15}
+
+
+def wide_expression(width: int) -> dict:
+    # A balanced sum of `width` literals: many nodes, shallow tree
+    terms = [{"kind": "Int", "value": i, "location": location()} for i in range(width)]
+    while len(terms) > 1:
+        paired = [{"kind": "Binary", "op": "Add", "lhs": terms[i], "rhs": terms[i + 1], "location": location()}
+                  for i in range(0, len(terms) - 1, 2)]
+        if len(terms) % 2:
+            paired.append(terms[-1])
+        terms = paired
+    expression = {"kind": "Print", "value": terms[0], "location": location()}
+    return {"name": FILENAME, "expression": expression, "location": location()}
+
+
+def many_functions(count: int) -> dict:
+    # f0..fN-1, each adding its index to the result of the previous one
+    def var(name):
+        return {"kind": "Var", "text": name, "location": location()}
+
+    def call(name, argument):
+        return {"kind": "Call", "callee": var(name), "arguments": [argument], "location": location()}
+
+    expression = {"kind": "Print", "value": call(f"f{count - 1}", {"kind": "Int", "value": 1, "location": location()}),
+                  "location": location()}
+    for i in range(count - 1, -1, -1):
+        body = {"kind": "Binary", "op": "Add", "lhs": var("x"), "rhs": {"kind": "Int", "value": i, "location": location()},
+                "location": location()}
+        if i:
+            body = call(f"f{i - 1}", body)
+        function = {"kind": "Function", "parameters": [{"text": "x", "location": location()}], "value": body,
+                    "location": location()}
+        expression = {"kind": "Let", "name": {"text": f"f{i}", "location": location()}, "value": function,
+                      "next": expression, "location": location()}
+    return {"name": FILENAME, "expression": expression, "location": location()}
+
+
+def repeated_calls(limit: int) -> dict:
+    # let triangle = fn (n) => if (n == 0) { 0 } else { n + triangle(n - 1) };
+    # let loop = fn (i, n, acc) => if (i == triangle(n) * triangle(n)) { acc } else {
+    #   let _ = if (i % 10000 == 0) { print(i) } else { 0 }; loop(i + 1, n, acc + (i % 7) * (i % 7)) };
+    # print(loop(0, limit, 0))
+    def var(name):
+        return {"kind": "Var", "text": name, "location": location()}
+
+    def literal(value):
+        return {"kind": "Int", "value": value, "location": location()}
+
+    def binary(op, lhs, rhs):
+        return {"kind": "Binary", "op": op, "lhs": lhs, "rhs": rhs, "location": location()}
+
+    def call(name, *arguments):
+        return {"kind": "Call", "callee": var(name), "arguments": list(arguments), "location": location()}
+
+    def branch(condition, then, otherwise):
+        return {"kind": "If", "condition": condition, "then": then, "otherwise": otherwise, "location": location()}
+
+    def function(parameters, body):
+        return {"kind": "Function", "parameters": [{"text": name, "location": location()} for name in parameters],
+                "value": body, "location": location()}
+
+    def let(name, value, next):
+        return {"kind": "Let", "name": {"text": name, "location": location()}, "value": value, "next": next,
+                "location": location()}
+
+    triangle = function(["n"], branch(binary("Eq", var("n"), literal(0)), literal(0),
+                                      binary("Add", var("n"), call("triangle", binary("Sub", var("n"), literal(1))))))
+    report = branch(binary("Eq", binary("Rem", var("i"), literal(10000)), literal(0)),
+                    {"kind": "Print", "value": var("i"), "location": location()}, literal(0))
+    step = binary("Add", var("acc"), binary("Mul", binary("Rem", var("i"), literal(7)),
+                                            binary("Rem", var("i"), literal(7))))
+    loop = function(["i", "n", "acc"], branch(
+        binary("Eq", var("i"), binary("Mul", call("triangle", var("n")), call("triangle", var("n")))), var("acc"),
+        let("_", report, call("loop", binary("Add", var("i"), literal(1)), var("n"), step))))
+    start = {"kind": "Print", "value": call("loop", literal(0), literal(limit), literal(0)), "location": location()}
+    return {"name": FILENAME, "expression": let("triangle", triangle, let("loop", loop, start)), "location": location()}
+
+
+SYNTHETIC_WORKLOADS: Dict[str, Callable[[int], dict]] = {
+    "deep-let": deep_let_chain,
+    "wide-expression": wide_expression,
+    "many-functions": many_functions,
+    "repeated-calls": repeated_calls,
+}
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def measure_case(path: str, backend: str, opt_level: str, cc: str) -> Dict[str, Any]:
+    import instrument
+    from main import dict_to_ast, optimize_ast, parse_ast_from_json
+
+    timer = PhaseTimer()
+    result: Dict[str, Any] = {}
+    options = argparse.Namespace(opt_level=opt_level, no_memoize=False, profile_use=None)
+
+    with timer.phase("json_parse"):
+        data = parse_ast_from_json(path)
+    with timer.phase("dict_to_ast"):
+        ast = dict_to_ast(data)
+
+    if backend == "interp":
+        from interpreter import compile_program
+        with timer.phase("compile"):
+            program = compile_program(ast)
+        with timer.phase("execute"):
+            program()
+            sys.stdout.flush()
+        result["phases"] = timer.phases
+        return result
+
+    from backend import (create_target_machine, emit_object, jit_compile, link_executable, load_runtime,
+                         optimize_module, parse_module)
+    from codegen import generate_code
+
+    with timer.phase("llvm_init"):
+        target_machine = create_target_machine()
+    with timer.phase("ast_optimize"):
+        stats = instrument.enable()
+        ast = optimize_ast(ast, options)
+        instrument.disable()
+    result["cse_eliminated_nodes"] = stats.counters.get("cse.eliminated_nodes", 0)
+    result["cse_hoisted_calls"] = stats.counters.get("cse.hoisted_calls", 0)
+    with timer.phase("generate_code"):
+        mod = generate_code(ast, target_machine)
+    with timer.phase("ir_serialize"):
+        ir_text = str(mod)
+    with timer.phase("ir_parse"):
+        llvm_mod = parse_module(mod, target_machine)
+    with timer.phase("optimize"):
+        optimize_module(llvm_mod, target_machine, opt_level)
+    result["ir_bytes"] = len(ir_text)
+
+    if backend == "jit":
+        load_runtime(cc)
+        with timer.phase("native_codegen"):
+            engine, main_func = jit_compile(llvm_mod, target_machine)
+        with timer.phase("execute"):
+            main_func()
+    else:
+        with tempfile.TemporaryDirectory(prefix="clownhead-bench-") as tmpdir:
+            object_path = os.path.join(tmpdir, "program.o")
+            exe_path = os.path.join(tmpdir, "program")
+            with timer.phase("native_codegen"):
+                with open(object_path, 'wb') as f:
+                    f.write(emit_object(llvm_mod, target_machine))
+            with timer.phase("link"):
+                link_executable([object_path], exe_path, cc)
+            with timer.phase("execute"):
+                process = subprocess.Popen([exe_path], stdout=subprocess.DEVNULL)
+                _, _, usage = os.wait4(process.pid, 0)
+            result["execute_rss_kb"] = usage.ru_maxrss
+
+    result["phases"] = timer.phases
+    return result
+
+
+def run_worker(path: str, backend: str, opt_level: str, cc: str, result_path: str):
+    from main import call_with_deep_stack
+
+    # Programs print to stdout, so results go through a file
+    result = call_with_deep_stack(measure_case, path, backend, opt_level, cc)
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+def run_case(path: str, backend: str, opt_level: str, cc: str, repeat: int) -> Dict[str, Any]:
+    best: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="clownhead-bench-") as tmpdir:
+        result_path = os.path.join(tmpdir, "result.json")
+        for _ in range(repeat):
+            command = [sys.executable, os.path.abspath(__file__), "--worker", path, backend, opt_level, cc, result_path]
+            process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if process.returncode != 0:
+                return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else
+                        f"worker exited with status {process.returncode}"}
+            with open(result_path) as f:
+                result = json.load(f)
+            if not best:
+                best = result
+                continue
+            for phase, elapsed in result["phases"].items():
+                best["phases"][phase] = min(best["phases"][phase], elapsed)
+            for key in ("peak_rss_kb", "execute_rss_kb"):
+                if key in result:
+                    best[key] = min(best[key], result[key])
+
+    best["phases"]["total"] = sum(best["phases"].values())
+    return best
+
+
+def prepare_inputs(scale: int, directory: str) -> Dict[str, str]:
+    inputs = {name: os.path.join(ROOT, name) for name in EXAMPLES}
+    for name, generate in SYNTHETIC_WORKLOADS.items():
+        size = SYNTHETIC_SIZES[name] * scale
+        path = os.path.join(directory, f"{name}-{size}.json")
+        with open(path, 'w') as f:
+            write_json(generate(size), f)
+        inputs[f"{name}-{size}"] = path
+    return inputs
+
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+                     noise_ms: float) -> List[str]:
+    regressions = []
+    for case, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(case)
+        if previous is None or "error" in previous:
+            continue
+        if "error" in current:
+            regressions.append(f"{case}: now fails ({current['error']})")
+            continue
+        for phase, elapsed in current["phases"].items():
+            before = previous["phases"].get(phase)
+            if before is not None and elapsed > before * (1 + threshold) and elapsed - before > noise_ms:
+                regressions.append(f"{case} {phase}: {before:.2f} ms -> {elapsed:.2f} ms")
+        for key in ("peak_rss_kb", "execute_rss_kb"):
+            before, after = previous.get(key), current.get(key)
+            if before and after and after > before * (1 + threshold):
+                regressions.append(f"{case} {key}: {before} -> {after}")
+    return regressions
+
+
+def format_case(case: str, result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return f"{case:40} ERROR {result['error']}"
+    phases = "  ".join(f"{phase} {elapsed:.2f}" for phase, elapsed in result["phases"].items())
+    line = f"{case:40} rss {result['peak_rss_kb'] / 1024:6.1f} MB  {phases}"
+    if "cse_eliminated_nodes" in result:
+        line += f"  cse {result['cse_eliminated_nodes']} nodes, {result['cse_hoisted_calls']} hoisted calls"
+    return line
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated subset of aot,jit,interp")
+    parser.add_argument("--levels", default="0,2", help="comma-separated optimization levels for aot/jit")
+    parser.add_argument("--scale", type=int, default=1, help="multiplier for the synthetic workload sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cc", default="clang", help="compiler driver used to link aot executables")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="baseline results to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression (default: 0.25)")
+    parser.add_argument("--noise-ms", type=float, default=1.0,
+                        help="ignore slowdowns smaller than this many milliseconds (default: 1.0)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backends = args.backends.split(",")
+    levels = args.levels.split(",")
+    results: Dict[str, Any] = {"scale": args.scale, "repeat": args.repeat, "cases": {}}
+
+    with tempfile.TemporaryDirectory(prefix="clownhead-bench-") as tmpdir:
+        for name, path in prepare_inputs(args.scale, tmpdir).items():
+            for backend in backends:
+                # The interpreter has no optimization levels
+                for level in (["-"] if backend == "interp" else levels):
+                    case = f"{name}/{backend}/O{level}"
+                    results["cases"][case] = run_case(path, backend, level, args.cc, args.repeat)
+                    print(format_case(case, results["cases"][case]), flush=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold, args.noise_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        run_worker(*sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,237 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import llvmlite
+
+# main.py imports this module for its defaults before it knows whether the
+# cache is used at all, so hashlib, shutil and tempfile are imported on use.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "clownhead")
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Any change to these files can change the generated code, so they are part of
+# the compiler version that goes into every cache key.
+COMPILER_SOURCES = ("main.py", "my_ast.py", "codegen.py", "optimize.py", "purity.py", "backend.py", "cache.py",
+                    "runtime/rinha.h", "runtime/rinha_int.c", "runtime/rinha_value.c", "runtime/rinha_output.c",
+                    "runtime/rinha_profile.c", "escape.py", "infer.py", "resolve.py", "incremental.py", "pgo.py",
+                    "cse.py")
+
+_COMPILER_VERSION: Optional[str] = None
+
+
+def compiler_version() -> str:
+    global _COMPILER_VERSION
+    if _COMPILER_VERSION is None:
+        import hashlib
+        digest = hashlib.sha256(llvmlite.__version__.encode("utf8"))
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        for source in COMPILER_SOURCES:
+            with open(os.path.join(base_dir, source), 'rb') as f:
+                digest.update(f.read())
+        _COMPILER_VERSION = digest.hexdigest()
+    return _COMPILER_VERSION
+
+
+def _is_metadata(key: str, value: Any) -> bool:
+    # File.name is a plain string, while Let.name is a Parameter that matters
+    return key in ("location", "filename") or (key == "name" and isinstance(value, str))
+
+
+def feed_normalized_ast(digest, data: Any):
+    # Streams a canonical JSON encoding of the AST into `digest`. Locations
+    # never reach the generated code, so reformatting the source (or renaming
+    # the file) must not invalidate the cache. The walk is iterative so deeply
+    # nested programs do not hit the recursion limit.
+    pending = [data]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, _Token):
+            digest.update(item.text)
+        elif isinstance(item, dict):
+            keys = sorted(key for key, value in item.items() if not _is_metadata(key, value))
+            parts: list = [_Token(b"{")]
+            for i, key in enumerate(keys):
+                prefix = b"," if i else b""
+                parts.append(_Token(prefix + json.dumps(key).encode("utf8") + b":"))
+                parts.append(item[key])
+            parts.append(_Token(b"}"))
+            pending.extend(reversed(parts))
+        elif isinstance(item, list):
+            parts = [_Token(b"[")]
+            for i, value in enumerate(item):
+                if i:
+                    parts.append(_Token(b","))
+                parts.append(value)
+            parts.append(_Token(b"]"))
+            pending.extend(reversed(parts))
+        else:
+            digest.update(json.dumps(item).encode("utf8"))
+
+
+class _Token:
+    __slots__ = ("text",)
+
+    def __init__(self, text: bytes):
+        self.text = text
+
+
+def cache_key(data: Dict[str, Any], **options: str) -> str:
+    import hashlib
+    digest = hashlib.sha256()
+    header = {"compiler": compiler_version(), "options": options}
+    digest.update(json.dumps(header, sort_keys=True, separators=(",", ":")).encode("utf8"))
+    feed_normalized_ast(digest, data)
+    return digest.hexdigest()
+
+
+class CompileCache:
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.objects_dir = os.path.join(directory, "objects")
+        self.stats_path = os.path.join(directory, "stats.json")
+        self.lock_path = os.path.join(directory, "lock")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.objects_dir, key)
+
+    def _entries(self):
+        for name in os.listdir(self.objects_dir):
+            # Skip in-flight temporary files from concurrent writers
+            if not name.startswith("."):
+                yield os.path.join(self.objects_dir, name)
+
+    def _read_stats(self) -> Dict[str, int]:
+        try:
+            with open(self.stats_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _bump(self, counter: str, amount: int = 1):
+        stats = self._read_stats()
+        stats[counter] = stats.get(counter, 0) + amount
+        _atomic_write(self.stats_path, json.dumps(stats, sort_keys=True).encode("utf8"), self.directory, 0o644)
+
+    def stats(self) -> Dict[str, int]:
+        with self._locked():
+            stats = self._read_stats()
+        entries = list(self._entries())
+        stats["entries"] = len(entries)
+        stats["size"] = sum(os.path.getsize(path) for path in entries if os.path.isfile(path))
+        return stats
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        return self.fetch_many([(key, output_path)])[0]
+
+    def fetch_many(self, requests: List[Tuple[str, str]], link: bool = False) -> List[bool]:
+        # Copies each (key, output path) entry that exists, taking the lock and
+        # updating the counters once for the whole batch. With `link`, outputs
+        # that are only read (and do not exist yet) are hard links when possible.
+        # Entries are linked or opened under the lock, so one that a concurrent
+        # store_many evicts afterwards is still copied in full.
+        hits = []
+        sources = []
+        with self._locked():
+            for key, output_path in requests:
+                source = self._claim(self._entry_path(key), output_path, link)
+                hits.append(source is not None)
+                sources.append(source if source is not True else None)
+            stats = self._read_stats()
+            stats["hits"] = stats.get("hits", 0) + sum(hits)
+            stats["misses"] = stats.get("misses", 0) + len(hits) - sum(hits)
+            _atomic_write(self.stats_path, json.dumps(stats, sort_keys=True).encode("utf8"), self.directory, 0o644)
+
+        for (_, output_path), source in zip(requests, sources):
+            if source is None:
+                continue
+            import shutil
+            import tempfile
+            with source:
+                output_dir = os.path.dirname(os.path.abspath(output_path))
+                fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=".clownhead-")
+                with os.fdopen(fd, 'wb') as output:
+                    shutil.copyfileobj(source, output)
+                    os.fchmod(output.fileno(), os.fstat(source.fileno()).st_mode & 0o777)
+                os.replace(tmp_path, output_path)
+        return hits
+
+    def _claim(self, entry: str, output_path: str, link: bool):
+        # Returns None for a miss, True once the entry is linked to output_path,
+        # or the entry opened for copying
+        try:
+            # Touching the entry keeps the mtime ordering usable for LRU eviction
+            os.utime(entry)
+            if link:
+                try:
+                    # Eviction only removes the cache's own name for the file
+                    os.link(entry, output_path)
+                    return True
+                except OSError:
+                    pass
+            return open(entry, 'rb')
+        except FileNotFoundError:
+            return None
+
+    def store(self, key: str, artifact_path: str):
+        self.store_many([(key, artifact_path)])
+
+    def store_many(self, artifacts: List[Tuple[str, str]]):
+        # Eviction scans the whole directory, so it runs once per batch
+        for key, artifact_path in artifacts:
+            with open(artifact_path, 'rb') as f:
+                contents = f.read()
+            mode = os.stat(artifact_path).st_mode & 0o777
+            _atomic_write(self._entry_path(key), contents, self.objects_dir, mode)
+        with self._locked():
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self._entries():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            self._bump("evictions", evicted)
+
+
+def _atomic_write(path: str, contents: bytes, directory: str, mode: Optional[int] = None):
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contents)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
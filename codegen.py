@@ -1,137 +1,485 @@
 from llvmlite import ir, binding
 from llvmlite.ir import values
-from typing import Dict, Tuple, Union, Optional
-from enum import Enum
+from typing import Dict, List, Sequence, Set, Tuple, Optional
 
-from my_ast import Binary, Call, Function, If, Print, Str, Var, Let, Int, BinaryOp
+import logging
 
-context = ir.Context()
-module = ir.Module(name="rinha")
+import instrument
+from my_ast import Binary, Call, Function, If, Print, Str, Var, Let, Int, Bool, BinaryOp, First, Second, Term
+from my_ast import Tuple as TupleTerm
+from infer import BOOL, CLOSURE, INT, STR, TUPLE
+from pgo import HOT_FRACTION, ProfileSummary, number_sites, program_digest
+
+# Frame layouts are only formatted when this logger is at DEBUG level
+logger = logging.getLogger("clownhead.codegen")
+
+# Reset for every module (see new_module), so a module names its anonymous
+# functions the same way whichever process generates it and whatever it
+# generated before; they are internal, so equal names in two modules never clash.
 ANONYMOUS_FUNCTION_COUNT = 0
+# String constants of the module being generated, by text, so each distinct
+# text is emitted once. Also reset for every module.
+STRING_POOL: Dict[str, ir.GlobalVariable] = {}
+# Functions compiled into objects of their own (see incremental.py), by the
+# symbol they are exported as. Modules only declare them, except the ones in
+# DEFINED_UNITS, which the module being generated defines; those in
+# LOCAL_UNITS are not referenced by any other module and stay internal.
+UNIT_SYMBOLS: Dict[Function, str] = {}
+DEFINED_UNITS: Set[Function] = set()
+LOCAL_UNITS: Set[Function] = set()
+# In instrumented builds, the counter array and the first counter of every
+# Function and If (see pgo.number_sites); empty otherwise
+PROFILE_COUNTERS: Optional[ir.GlobalVariable] = None
+PROFILE_SITES: Dict[Term, int] = {}
+# Summary of the profile the program is built with, if any (see pgo.py)
+PROFILE_SUMMARY: Optional[ProfileSummary] = None
+
+# Values are tagged 64-bit words (see runtime/rinha.h): small integers are
+# stored as value << 1, other words are a 16-byte aligned pointer or a boolean
+# with the kind in the low four bits. Inside a function, booleans and string
+# literals stay i1 and i8* until they are stored, passed or returned.
+INT_TYPE = ir.IntType(64)
+BOOL_TYPE = ir.IntType(1)
+STR_TYPE = ir.PointerType(ir.IntType(8))
+SMALL_INT_MIN = -(1 << 62)
+SMALL_INT_MAX = (1 << 62) - 1
+
+TAG_MASK = 15
+TAG_TUPLE = 3
+TAG_CLOSURE = 5
+TAG_STRING = 7
+FALSE_WORD = 0x09
+TRUE_WORD = 0x19
+OBJECT_ALIGNMENT = 16
+
+TUPLE_TYPE = ir.LiteralStructType([INT_TYPE, INT_TYPE])
+# Code pointer and arity, followed by the captured values
+CLOSURE_HEADER_TYPE = ir.LiteralStructType([STR_TYPE, INT_TYPE])
+
+# Native representation of each inferred type; anything else is a tagged word
+REPRESENTATIONS = {
+    BOOL: BOOL_TYPE,
+    STR: STR_TYPE,
+    TUPLE: TUPLE_TYPE.as_pointer(),
+    CLOSURE: CLOSURE_HEADER_TYPE.as_pointer(),
+}
+POINTER_TAGS = {
+    STR_TYPE: TAG_STRING,
+    TUPLE_TYPE.as_pointer(): TAG_TUPLE,
+    CLOSURE_HEADER_TYPE.as_pointer(): TAG_CLOSURE,
+}
 
-        
-class SymbolTable:
-    def __init__(self, parent: Optional['SymbolTable'] = None):
-        self.parent = parent
-        self.variables: Dict[str, values.Value] = {}
-        self.functions: Dict[str, ir.Function] = {}
-
-
-    def insert_variable(self, name: str, value: values.Value):
-        if name in self.functions:
-            raise ValueError(f"A function named '{name}' already exists in the current scope.")
-        self.variables[name] = value
-
-    def insert_function(self, name: str, func: ir.Function):
-        if name in self.variables:
-            raise ValueError(f"A variable named '{name}' already exists in the current scope.")
-        self.functions[name] = func
-
-    def lookup(self, name: str) -> Tuple[str, Union[values.Value, None]]:
-        if name in self.variables:
-            return ("variable", self.variables[name])
-        elif name in self.functions:
-            return ("function", self.functions[name])
-        elif self.parent:  
-            print(f"searching parent: {self.parent.functions}")
-            return self.parent.lookup(name)
-        else:
-            return ("none", None)
+# Slow paths for non-small operands and overflow, printing, the arena and errors
+RUNTIME_FUNCTIONS = {
+    "rinha_int_add": (INT_TYPE, [INT_TYPE, INT_TYPE]),
+    "rinha_int_sub": (INT_TYPE, [INT_TYPE, INT_TYPE]),
+    "rinha_int_mul": (INT_TYPE, [INT_TYPE, INT_TYPE]),
+    "rinha_int_div": (INT_TYPE, [INT_TYPE, INT_TYPE]),
+    "rinha_int_rem": (INT_TYPE, [INT_TYPE, INT_TYPE]),
+    "rinha_int_cmp": (ir.IntType(32), [INT_TYPE, INT_TYPE, STR_TYPE]),
+    "rinha_int_parse": (INT_TYPE, [STR_TYPE]),
+    "rinha_str_concat": (STR_TYPE, [INT_TYPE, INT_TYPE]),
+    "rinha_value_eq": (ir.IntType(32), [INT_TYPE, INT_TYPE, STR_TYPE]),
+    "rinha_print": (ir.VoidType(), [INT_TYPE]),
+    "rinha_print_str": (ir.VoidType(), [STR_TYPE]),
+    "rinha_flush": (ir.VoidType(), []),
+    "rinha_alloc_slow": (STR_TYPE, [INT_TYPE]),
+    "rinha_call_error": (ir.VoidType(), [INT_TYPE, INT_TYPE]),
+    "rinha_projection_error": (ir.VoidType(), [INT_TYPE, STR_TYPE]),
+    "rinha_condition_error": (ir.VoidType(), [INT_TYPE]),
+    "rinha_profile_start": (ir.VoidType(), [INT_TYPE.as_pointer(), INT_TYPE, STR_TYPE, STR_TYPE]),
+}
+RUNTIME_ERRORS = ("rinha_call_error", "rinha_projection_error", "rinha_condition_error")
+
+# Index for gep instructions
+ZERO = ir.Constant(ir.IntType(32), 0)
+
+# Branch weight of the small-integer path against the runtime call
+FAST_PATH_WEIGHT = 2000
+
+# Memo tables are direct-mapped: each argument tuple hashes to one slot and a
+# colliding call simply overwrites it, so memory stays bounded per function.
+MEMO_TABLE_SIZE = 1 << 12
+MEMO_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
 
-class SymbolType(str, Enum):
-    Function = "function"
-    Variable = "variable"
+        
+class FunctionValue:
+    # A function known at compile time, so calls to it are direct. `closure`
+    # is its closure object when it captures variables; the code then takes
+    # that object as its first argument.
+    def __init__(self, func: ir.Function, arity: int, closure: Optional[values.Value] = None):
+        self.func = func
+        self.arity = arity
+        self.closure = closure
 
 
 class CodeGenError(Exception):
     pass
 
 
-def emit_add(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    if builder:
-        return builder.add(lhs, rhs, name="addtmp")
+# Operators for which `x op f(...)` in tail position can be turned into a loop
+# by carrying a running accumulator (both are associative and commutative on
+# integers).
+ACCUMULATOR_IDENTITIES = {
+    BinaryOp.Add: 0,
+    BinaryOp.Mul: 1,
+}
+
+
+class FunctionContext:
+    def __init__(self, func: ir.Function, node: Function):
+        self.func = func
+        self.node = node
+        self.params = list(func.args)
+        self.loop_header: Optional[ir.Block] = None
+        self.accumulator_op: Optional[BinaryOp] = None
+        self.accumulator: Optional[values.Value] = None
+        self.memo_slot: Optional[values.Value] = None
+
+
+def runtime_function(module: ir.Module, name: str) -> ir.Function:
+    func = module.globals.get(name)
+    if func is None:
+        return_type, arg_types = RUNTIME_FUNCTIONS[name]
+        func = ir.Function(module, ir.FunctionType(return_type, arg_types), name=name)
+        if name in RUNTIME_ERRORS:
+            func.attributes.add("noreturn")
+            func.attributes.add("cold")
+    return func
+
+def runtime_global(module: ir.Module, name: str) -> ir.GlobalVariable:
+    variable = module.globals.get(name)
+    if variable is None:
+        variable = ir.GlobalVariable(module, STR_TYPE, name=name)
+    return variable
+
+def string_constant(module: ir.Module, text: str) -> ir.Constant:
+    # Literals, digits of big literals and names in runtime errors are interned
+    variable = STRING_POOL.get(text)
+    if variable is None:
+        variable = global_string(module, text, "str")
+        STRING_POOL[text] = variable
+    return variable.gep([ZERO, ZERO])
+
+def emit_profile_count(builder: ir.IRBuilder, node: Term, offset: int = 0):
+    site = PROFILE_SITES.get(node)
+    if site is not None:
+        counter = builder.gep(PROFILE_COUNTERS, [ZERO, ir.Constant(ir.IntType(32), site + offset)])
+        builder.store(builder.add(builder.load(counter), ir.Constant(INT_TYPE, 1)), counter)
+
+def set_entry_count(module: ir.Module, func: ir.Function, count: int):
+    func.set_metadata("prof", module.add_metadata(["function_entry_count", ir.Constant(INT_TYPE, count)]))
+
+def emit_profile_summary(module: ir.Module, summary: Optional[ProfileSummary]):
+    # Without the summary LLVM ignores entry counts and only branch weights
+    # have an effect; its layout is that of ProfileSummary::getMD
+    global PROFILE_SUMMARY
+    PROFILE_SUMMARY = summary
+    if summary is None:
+        return
+    i32 = ir.IntType(32)
+    fields = [("TotalCount", summary.total_count), ("MaxCount", summary.max_count),
+              ("MaxInternalCount", summary.max_internal_count), ("MaxFunctionCount", summary.max_function_count),
+              ("NumCounts", summary.num_counts), ("NumFunctions", summary.num_functions)]
+    detailed = [module.add_metadata([ir.Constant(i32, cutoff), ir.Constant(INT_TYPE, count), ir.Constant(i32, used)])
+                for cutoff, count, used in summary.detailed]
+    node = module.add_metadata([module.add_metadata(["ProfileFormat", "InstrProf"])] +
+                               [module.add_metadata([name, ir.Constant(INT_TYPE, value)]) for name, value in fields] +
+                               [module.add_metadata(["DetailedSummary", module.add_metadata(detailed)])])
+    module.add_named_metadata("llvm.module.flags", [ir.Constant(i32, 1), "ProfileSummary", node])
+
+def branch_weights(taken: int, not_taken: int) -> List[int]:
+    # Weights are 32-bit; a branch never taken in training keeps weight 1
+    scale = max(taken, not_taken) // (1 << 30) + 1
+    return [taken // scale + 1, not_taken // scale + 1]
+
+def emit_if_branch(builder: ir.IRBuilder, node: If, cond_val) -> Tuple[ir.Block, ir.Block]:
+    # With a profile the branch is weighted and the more frequent side laid
+    # out first; instrumented builds count both sides
+    func = builder.block.function
+    if node.profile is not None and node.profile[1] > node.profile[0]:
+        else_bb = func.append_basic_block(name="else")
+        then_bb = func.append_basic_block(name="then")
     else:
-        raise CodeGenError("Unsupported operand type for addition")
+        then_bb = func.append_basic_block(name="then")
+        else_bb = func.append_basic_block(name="else")
+    branch = builder.cbranch(cond_val, then_bb, else_bb)
+    if node.profile is not None:
+        branch.set_weights(branch_weights(*node.profile))
+    for block, offset in ((then_bb, 0), (else_bb, 1)):
+        with builder.goto_block(block):
+            emit_profile_count(builder, node, offset)
+    return then_bb, else_bb
+
+def emit_runtime_error(builder: ir.IRBuilder, name: str, args: list):
+    builder.call(runtime_function(builder.module, name), args)
+    builder.unreachable()
+
+def closure_word(builder: ir.IRBuilder, value: FunctionValue) -> values.Value:
+    if value.closure is not None:
+        return builder.add(builder.ptrtoint(value.closure, INT_TYPE), ir.Constant(INT_TYPE, TAG_CLOSURE))
+    return static_closure(builder.module, value).ptrtoint(INT_TYPE).add(ir.Constant(INT_TYPE, TAG_CLOSURE))
+
+def static_closure(module: ir.Module, value: FunctionValue) -> ir.GlobalVariable:
+    # Functions without captures become values through a constant closure
+    # whose code drops the closure argument and calls the function
+    name = f"{value.func.name}.closure"
+    closure = module.globals.get(name)
+    if closure is not None:
+        return closure
+
+    entry_type = ir.FunctionType(INT_TYPE, [STR_TYPE] + [INT_TYPE] * value.arity)
+    entry = ir.Function(module, entry_type, name=f"{value.func.name}.entry")
+    entry.linkage = 'internal'
+    entry_builder = ir.IRBuilder(entry.append_basic_block(name="entry"))
+    args = [to_representation(entry_builder, arg, param.type) for arg, param in zip(entry.args[1:], value.func.args)]
+    call = entry_builder.call(value.func, args)
+    call.tail = "tail"
+    entry_builder.ret(to_word(entry_builder, call))
+
+    closure = ir.GlobalVariable(module, CLOSURE_HEADER_TYPE, name=name)
+    closure.linkage = 'internal'
+    closure.global_constant = True
+    closure.align = OBJECT_ALIGNMENT
+    closure.initializer = ir.Constant(CLOSURE_HEADER_TYPE, [entry.bitcast(STR_TYPE), ir.Constant(INT_TYPE, value.arity)])
+    return closure
+
+def to_word(builder: ir.IRBuilder, value) -> values.Value:
+    # Boxes a value for storing, passing or returning it
+    if isinstance(value, FunctionValue):
+        return closure_word(builder, value)
+    if value.type == INT_TYPE:
+        return value
+    if value.type == BOOL_TYPE:
+        return builder.select(value, ir.Constant(INT_TYPE, TRUE_WORD), ir.Constant(INT_TYPE, FALSE_WORD))
+    if value.type in POINTER_TAGS:
+        return object_word(builder, value, POINTER_TAGS[value.type])
+    raise CodeGenError(f"Cannot box a value of type {value.type}")
+
+def from_word(builder: ir.IRBuilder, word: values.Value, representation: ir.Type) -> values.Value:
+    # Unboxes a word whose type inference has proven
+    if representation == BOOL_TYPE:
+        return builder.icmp_unsigned('==', word, ir.Constant(INT_TYPE, TRUE_WORD))
+    if representation in POINTER_TAGS:
+        return builder.inttoptr(builder.sub(word, ir.Constant(INT_TYPE, POINTER_TAGS[representation])), representation)
+    return word
+
+def to_representation(builder: ir.IRBuilder, value, representation: ir.Type) -> values.Value:
+    if not isinstance(value, FunctionValue) and value.type == representation:
+        return value
+    return from_word(builder, to_word(builder, value), representation)
+
+def representation(value_type: Optional[str]) -> ir.Type:
+    return REPRESENTATIONS.get(value_type, INT_TYPE)
+
+def to_bool(builder: ir.IRBuilder, value) -> values.Value:
+    if not isinstance(value, FunctionValue) and value.type == BOOL_TYPE:
+        return value
+    word = to_word(builder, value)
+    # FALSE_WORD and TRUE_WORD only differ in bit 4
+    is_bool = builder.icmp_unsigned('==', builder.or_(word, ir.Constant(INT_TYPE, 0x10)),
+                                    ir.Constant(INT_TYPE, TRUE_WORD), name="is_bool")
+    error_bb = builder.function.append_basic_block(name="condition.error")
+    ok_bb = builder.function.append_basic_block(name="condition.ok")
+    builder.cbranch(is_bool, ok_bb, error_bb).set_weights([FAST_PATH_WEIGHT, 1])
+    builder.position_at_end(error_bb)
+    emit_runtime_error(builder, "rinha_condition_error", [word])
+    builder.position_at_end(ok_bb)
+    return builder.icmp_unsigned('==', word, ir.Constant(INT_TYPE, TRUE_WORD), name="condition")
+
+def emit_arena_alloc(builder: ir.IRBuilder, size: int) -> values.Value:
+    # Inline bump allocation; rinha_alloc_slow starts a new arena chunk
+    module = builder.module
+    next_global = runtime_global(module, "rinha_arena_next")
+    next_ptr = builder.load(next_global, name="arena_next")
+    end_ptr = builder.load(runtime_global(module, "rinha_arena_end"), name="arena_end")
+    available = builder.sub(builder.ptrtoint(end_ptr, INT_TYPE), builder.ptrtoint(next_ptr, INT_TYPE))
+    size_val = ir.Constant(INT_TYPE, size)
+
+    func = builder.function
+    fast_bb = func.append_basic_block(name="alloc.fast")
+    slow_bb = func.append_basic_block(name="alloc.slow")
+    done_bb = func.append_basic_block(name="alloc.done")
+    builder.cbranch(builder.icmp_unsigned('>=', available, size_val), fast_bb, slow_bb).set_weights(
+        [FAST_PATH_WEIGHT, 1])
+
+    builder.position_at_end(fast_bb)
+    builder.store(builder.gep(next_ptr, [size_val]), next_global)
+    builder.branch(done_bb)
+
+    builder.position_at_end(slow_bb)
+    slow_ptr = builder.call(runtime_function(module, "rinha_alloc_slow"), [size_val])
+    builder.branch(done_bb)
+
+    builder.position_at_end(done_bb)
+    result = builder.phi(STR_TYPE, name="object")
+    result.add_incoming(next_ptr, fast_bb)
+    result.add_incoming(slow_ptr, slow_bb)
+    return result
+
+def emit_object_alloc(builder: ir.IRBuilder, object_type: ir.Type, words: int, escapes: bool) -> values.Value:
+    if not escapes:
+        # Allocas go in the entry block so a tail loop reuses one slot
+        if instrument.ENABLED:
+            instrument.count("codegen.stack_objects")
+        with builder.goto_block(builder.function.entry_basic_block):
+            slot = builder.alloca(object_type, name="stack_object")
+            slot.align = OBJECT_ALIGNMENT
+        return slot
+    if instrument.ENABLED:
+        instrument.count("codegen.heap_objects")
+    size = (words * 8 + OBJECT_ALIGNMENT - 1) // OBJECT_ALIGNMENT * OBJECT_ALIGNMENT
+    return builder.bitcast(emit_arena_alloc(builder, size), object_type.as_pointer())
+
+def object_word(builder: ir.IRBuilder, pointer: values.Value, tag: int) -> values.Value:
+    return builder.add(builder.ptrtoint(pointer, INT_TYPE), ir.Constant(INT_TYPE, tag))
+
+
+def emit_has_tag(builder: ir.IRBuilder, word: values.Value, tag: int) -> values.Value:
+    return builder.icmp_unsigned('==', builder.and_(word, ir.Constant(INT_TYPE, TAG_MASK)), ir.Constant(INT_TYPE, tag))
+
+def int_constant(value: int) -> ir.Constant:
+    return ir.Constant(INT_TYPE, value << 1)
+
+def emit_both_small(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
+    tags = builder.and_(builder.or_(lhs, rhs), ir.Constant(INT_TYPE, 1), name="tags")
+    return builder.icmp_unsigned('==', tags, ir.Constant(INT_TYPE, 0), name="both_small")
+
+def emit_checked_arith(builder: ir.IRBuilder, lhs, rhs, fast, slow_name: str,
+                       name: str, nonzero_rhs: bool = False) -> values.Value:
+    # Small operands take the native instruction in `fast`, which returns the
+    # tagged result and an overflow flag; BigInts, overflows and operands of
+    # the wrong type go to the runtime.
+    lhs, rhs = to_word(builder, lhs), to_word(builder, rhs)
+    func = builder.function
+    fast_bb = func.append_basic_block(name=f"{name}.fast")
+    slow_bb = func.append_basic_block(name=f"{name}.slow")
+    done_bb = func.append_basic_block(name=f"{name}.done")
+
+    condition = emit_both_small(builder, lhs, rhs)
+    if nonzero_rhs:
+        # Division by zero is reported by the runtime
+        condition = builder.and_(condition, builder.icmp_signed('!=', rhs, ir.Constant(INT_TYPE, 0)))
+    builder.cbranch(condition, fast_bb, slow_bb).set_weights([FAST_PATH_WEIGHT, 1])
+
+    builder.position_at_end(fast_bb)
+    fast_value, overflow = fast(builder, lhs, rhs)
+    fast_end = builder.block
+    builder.cbranch(overflow, slow_bb, done_bb).set_weights([1, FAST_PATH_WEIGHT])
+
+    builder.position_at_end(slow_bb)
+    slow_value = builder.call(runtime_function(builder.module, slow_name), [lhs, rhs], name=f"{name}.big")
+    builder.branch(done_bb)
+
+    builder.position_at_end(done_bb)
+    result = builder.phi(INT_TYPE, name=name)
+    result.add_incoming(fast_value, fast_end)
+    result.add_incoming(slow_value, slow_bb)
+    return result
+
+def split_overflow(builder: ir.IRBuilder, result: values.Value) -> Tuple[values.Value, values.Value]:
+    return builder.extract_value(result, 0), builder.extract_value(result, 1)
+
+def fast_add(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value):
+    # (a << 1) + (b << 1) == (a + b) << 1, so tagged values add directly
+    return split_overflow(builder, builder.sadd_with_overflow(lhs, rhs))
+
+def fast_sub(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value):
+    return split_overflow(builder, builder.ssub_with_overflow(lhs, rhs))
+
+def fast_mul(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value):
+    untagged = builder.ashr(lhs, ir.Constant(INT_TYPE, 1))
+    return split_overflow(builder, builder.smul_with_overflow(untagged, rhs))
+
+def fast_div(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value):
+    # (a << 1) / (b << 1) == a / b; the divisor is even, so never MIN / -1.
+    # Only -2^62 / -1 overflows, when the quotient is tagged again.
+    quotient = builder.sdiv(lhs, rhs, name="div_tmp")
+    return split_overflow(builder, builder.sadd_with_overflow(quotient, quotient))
+
+def fast_rem(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value):
+    # (a << 1) % (b << 1) == (a % b) << 1 and cannot overflow
+    return builder.srem(lhs, rhs, name="rem_tmp"), ir.Constant(ir.IntType(1), 0)
+
+def emit_add(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
+    if any(not isinstance(value, FunctionValue) and value.type == STR_TYPE for value in (lhs, rhs)):
+        # Known strings concatenate; the int slow path handles the others
+        concat = runtime_function(builder.module, "rinha_str_concat")
+        return builder.call(concat, [to_word(builder, lhs), to_word(builder, rhs)], name="concat")
+    return emit_checked_arith(builder, lhs, rhs, fast_add, "rinha_int_add", "addtmp")
 
 def emit_sub(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    if isinstance(lhs.type, ir.IntType):
-        return builder.sub(lhs, rhs, name="subtmp")
-    else:
-        raise CodeGenError("Unsupported operand type for subtraction")
+    return emit_checked_arith(builder, lhs, rhs, fast_sub, "rinha_int_sub", "subtmp")
 
 def emit_mul(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    return builder.mul(lhs, rhs, name="mul_tmp")
+    return emit_checked_arith(builder, lhs, rhs, fast_mul, "rinha_int_mul", "mul_tmp")
 
 def emit_div(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.sdiv(lhs, rhs, name="div_tmp")
-    else:
-        raise CodeGenError("Unsupported type for division")
+    return emit_checked_arith(builder, lhs, rhs, fast_div, "rinha_int_div", "div_tmp", nonzero_rhs=True)
 
 def emit_rem(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.srem(lhs, rhs, name="rem_tmp")
+    return emit_checked_arith(builder, lhs, rhs, fast_rem, "rinha_int_rem", "rem_tmp", nonzero_rhs=True)
+
+def is_bool_value(value) -> bool:
+    return not isinstance(value, FunctionValue) and value.type == BOOL_TYPE
+
+def emit_compare(builder: ir.IRBuilder, op: str, lhs, rhs, name: str, op_name: str) -> values.Value:
+    equality = op in ('==', '!=')
+    if equality and is_bool_value(lhs) and is_bool_value(rhs):
+        return builder.icmp_unsigned(op, lhs, rhs, name=name)
+    lhs, rhs = to_word(builder, lhs), to_word(builder, rhs)
+
+    # Tagging preserves order, so small values compare directly
+    func = builder.function
+    fast_bb = func.append_basic_block(name=f"{name}.fast")
+    slow_bb = func.append_basic_block(name=f"{name}.slow")
+    done_bb = func.append_basic_block(name=f"{name}.done")
+    builder.cbranch(emit_both_small(builder, lhs, rhs), fast_bb, slow_bb).set_weights([FAST_PATH_WEIGHT, 1])
+
+    builder.position_at_end(fast_bb)
+    fast_value = builder.icmp_signed(op, lhs, rhs)
+    builder.branch(done_bb)
+
+    builder.position_at_end(slow_bb)
+    # Strings and booleans can only be compared for equality
+    args = [lhs, rhs, string_constant(builder.module, op_name)]
+    if equality:
+        equal = builder.call(runtime_function(builder.module, "rinha_value_eq"), args)
+        slow_value = builder.icmp_signed('!=' if op == '==' else '==', equal, ir.Constant(ir.IntType(32), 0))
     else:
-        raise CodeGenError("Unsupported type for remainder")
+        order = builder.call(runtime_function(builder.module, "rinha_int_cmp"), args)
+        slow_value = builder.icmp_signed(op, order, ir.Constant(ir.IntType(32), 0))
+    builder.branch(done_bb)
+
+    builder.position_at_end(done_bb)
+    result = builder.phi(BOOL_TYPE, name=name)
+    result.add_incoming(fast_value, fast_bb)
+    result.add_incoming(slow_value, slow_bb)
+    return result
 
 def emit_eq(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.icmp_signed('==', lhs, rhs, name="eq_tmp")
-    else:
-        raise CodeGenError("Unsupported type for equality check")
+    return emit_compare(builder, '==', lhs, rhs, "eq_tmp", "Eq")
 
 def emit_neq(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.icmp_signed('!=', lhs, rhs, name="neq_tmp")
-    else:
-        raise CodeGenError("Unsupported type for not-equal check")
+    return emit_compare(builder, '!=', lhs, rhs, "neq_tmp", "Neq")
 
 def emit_lt(builder: ir.IRBuilder, lhs: values.Value, rhs: values.Value) -> values.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.icmp_signed('<', lhs, rhs, name="lt_tmp")
-    else:
-        print(f"lhs type: {lhs.type}, rhs type: {rhs.type}")
-        raise CodeGenError("Unsupported type for less-than check")
+    return emit_compare(builder, '<', lhs, rhs, "lt_tmp", "Lt")
 
 def emit_gt(builder: ir.IRBuilder, lhs: ir.Value, rhs: ir.Value) -> ir.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.icmp_signed('>', lhs, rhs, name="gt_tmp")
-    else:
-        raise CodeGenError("Unsupported type for greater-than check")
+    return emit_compare(builder, '>', lhs, rhs, "gt_tmp", "Gt")
 
 def emit_lte(builder: ir.IRBuilder, lhs: ir.Value, rhs: ir.Value) -> ir.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.icmp_signed('<=', lhs, rhs, name="lte_tmp")
-    else:
-        raise CodeGenError("Unsupported type for less-than or equal-to check")
+    return emit_compare(builder, '<=', lhs, rhs, "lte_tmp", "Lte")
 
 def emit_gte(builder: ir.IRBuilder, lhs: ir.Value, rhs: ir.Value) -> ir.Value:
-    int32_type = ir.IntType(32)
-    if lhs.type == int32_type and rhs.type == int32_type:
-        return builder.icmp_signed('>=', lhs, rhs, name="gte_tmp")
-    else:
-        raise CodeGenError("Unsupported type for greater-than or equal-to check")
+    return emit_compare(builder, '>=', lhs, rhs, "gte_tmp", "Gte")
 
 def emit_and(builder: ir.IRBuilder, lhs: ir.Value, rhs: ir.Value) -> ir.Value:
-    int1_type = ir.IntType(1)
-    if lhs.type == int1_type and rhs.type == int1_type:
-        return builder.and_(lhs, rhs, name="and_tmp")
-    else:
-        raise CodeGenError("Unsupported type for logical AND")
+    return builder.and_(to_bool(builder, lhs), to_bool(builder, rhs), name="and_tmp")
 
 def emit_or(builder: ir.IRBuilder, lhs: ir.Value, rhs: ir.Value) -> ir.Value:
-    int1_type = ir.IntType(1)
-    if lhs.type == int1_type and rhs.type == int1_type:
-        return builder.or_(lhs, rhs, name="or_tmp")
-    else:
-        raise CodeGenError("Unsupported type for logical OR")
+    return builder.or_(to_bool(builder, lhs), to_bool(builder, rhs), name="or_tmp")
 
 BINARY_OP_DISPATCH = {
     BinaryOp.Add: emit_add,
@@ -149,39 +497,43 @@ BINARY_OP_DISPATCH = {
     BinaryOp.Or: emit_or
 }
 
-def codegen(node, module, current_symtab, builder):
+def count_node(node):
+    instrument.count("codegen.nodes." + type(node).__name__)
+
+def codegen(node, module, frame, builder):
+    if instrument.ENABLED:
+        count_node(node)
     if isinstance(node, Let):
-        return codegen_let(node, module, current_symtab, builder)
+        return codegen_let(node, module, frame, builder)
     elif isinstance(node, Binary):
-        return codegen_binary(node, module, current_symtab, builder)
+        return codegen_binary(node, module, frame, builder)
     elif isinstance(node, Var):
-        return codegen_var(node, module, current_symtab, builder)
+        return codegen_var(node, module, frame, builder)
     elif isinstance(node, Function):
-        return codegen_function(node, module, current_symtab, builder)
+        return codegen_function(node, module, frame, builder)
     elif isinstance(node, If):
-        return codegen_if(node, module, current_symtab, builder)
+        return codegen_if(node, module, frame, builder)
     elif isinstance(node, Call):
-        return codegen_call(node, module, current_symtab, builder)
+        return codegen_call(node, module, frame, builder)
     elif isinstance(node, Print):
-        return codegen_print(node, module, current_symtab, builder)
+        return codegen_print(node, module, frame, builder)
     elif isinstance(node, Int):
-        return codegen_int(node, module, current_symtab)
+        return codegen_int(node, module, frame, builder)
     elif isinstance(node, Str):
-        return codegen_str(node, module, current_symtab, builder)
+        return codegen_str(node, module, frame, builder)
+    elif isinstance(node, Bool):
+        return codegen_bool(node, module, frame)
+    elif isinstance(node, TupleTerm):
+        return codegen_tuple(node, module, frame, builder)
+    elif isinstance(node, (First, Second)):
+        return codegen_projection(node, module, frame, builder)
     else:
         raise CodeGenError(f"Unsupported node type: {type(node)}")
 
-def codegen_binary(node, module, current_symtab, builder):
-    lhs_val = codegen(node.lhs, module, current_symtab, builder)
-    rhs_val = codegen(node.rhs, module, current_symtab, builder)
-
-    if isinstance(lhs_val, ir.Argument) and isinstance(rhs_val, ir.Constant) and isinstance(rhs_val.type, ir.IntType):
-        lhs_val = builder.bitcast(lhs_val, rhs_val.type, name="cast_lhs")
-    elif isinstance(rhs_val, ir.Argument) and isinstance(lhs_val, ir.Constant) and isinstance(lhs_val.type, ir.IntType):
-        rhs_val = builder.bitcast(rhs_val, lhs_val.type, name="cast_rhs")
-
-    if lhs_val.type != rhs_val.type:
-        raise CodeGenError(f"Type mismatch in binary operation. lhs: {lhs_val.type}, rhs: {rhs_val.type}")
+def codegen_binary(node, module, frame, builder):
+    # Operands of the wrong type are reported at run time, like the interpreter
+    lhs_val = codegen(node.lhs, module, frame, builder)
+    rhs_val = codegen(node.rhs, module, frame, builder)
 
     emit_func = None
     if node.op in BINARY_OP_DISPATCH.keys():
@@ -192,175 +544,542 @@ def codegen_binary(node, module, current_symtab, builder):
     return emit_func(builder, lhs_val, rhs_val)
 
 
-def codegen_int(node, module, current_symtab):
-    int_type = ir.IntType(32)
-    return ir.Constant(int_type, node.value)
+def codegen_int(node, module, frame, builder):
+    if SMALL_INT_MIN <= node.value <= SMALL_INT_MAX:
+        return int_constant(node.value)
+    # Literals outside the small range are built by the runtime from their digits
+    digits = string_constant(module, str(node.value))
+    return builder.call(runtime_function(module, "rinha_int_parse"), [digits])
+
+def codegen_bool(node, module, frame):
+    bool_type = ir.IntType(1)
+    return ir.Constant(bool_type, int(node.value))
 
-def codegen_str(node, module, current_symtab, builder):
-    str_val = bytearray(node.value, 'utf8')
+def global_string(module, text: str, name: str) -> ir.GlobalVariable:
+    str_val = bytearray(text, 'utf8')
     str_val.append(0)
     string_type = ir.ArrayType(ir.IntType(8), len(str_val))
     string_const = ir.Constant(string_type, str_val)
-    global_string = ir.GlobalVariable(module, string_type, name="str_const")
-    global_string.linkage = 'internal'
-    global_string.global_constant = True
-    global_string.initializer = string_const
-
+    string_global = ir.GlobalVariable(module, string_type, name=module.get_unique_name(name))
+    string_global.linkage = 'internal'
+    string_global.global_constant = True
+    string_global.initializer = string_const
+    # Strings are boxed by tagging their address
+    string_global.align = OBJECT_ALIGNMENT
+    return string_global
+
+def codegen_str(node, module, frame, builder):
     # Return a pointer to the first character of the string
-    zero = ir.Constant(ir.IntType(32), 0)  # Index for the gep instruction
-    return builder.gep(global_string, [zero, zero])
-
-
-def codegen_call(node, module, current_symtab, builder):
-    func_type, func = current_symtab.lookup(node.callee.text)
-    print(f"Looking up {node.callee.text} in symtab:", current_symtab.lookup(node.callee.text))
+    return string_constant(module, node.value)
 
-    if func_type != "function":
-        raise CodeGenError(f"Expected function but found {func_type}: {node.callee.text}")
 
-    if not func:
-        raise CodeGenError(f"Undefined function: {node.callee.text}")
-
-    callee_value = func
-    if not isinstance(callee_value, ir.Function):
-        raise CodeGenError(f"Callee is not a callable entity: {node.callee.text}")
-
-    arg_values = [codegen(arg, module, current_symtab, builder) for arg in node.arguments]
-
-    return builder.call(callee_value, arg_values)
-
-def codegen_let(let_expr, module, current_symtab, builder):
-    value = codegen(let_expr.value, module, current_symtab, builder)  
-    if isinstance(value, ir.Function):
-        current_symtab.insert_function(let_expr.name.text, value)
+def codegen_call(node, module, frame, builder):
+    if isinstance(node.callee, Var):
+        callee = frame[node.callee.slot]
     else:
-        current_symtab.insert_variable(let_expr.name.text, value)
-    
-    return codegen(let_expr.next, module, current_symtab, builder)
-
-def codegen_function(node, module, current_symtab, builder):
+        callee = codegen(node.callee, module, frame, builder)
+
+    arg_values = [codegen(arg, module, frame, builder) for arg in node.arguments]
+
+    # An arity mismatch is reported at run time by the indirect call
+    if isinstance(callee, FunctionValue) and len(arg_values) == callee.arity:
+        params = callee.func.args[1:] if callee.closure is not None else callee.func.args
+        arg_values = [to_representation(builder, value, param.type) for value, param in zip(arg_values, params)]
+        if callee.closure is not None:
+            arg_values.insert(0, callee.closure)
+        return builder.call(callee.func, arg_values)
+    return emit_closure_call(builder, callee, [to_word(builder, value) for value in arg_values])
+
+def emit_closure_call(builder: ir.IRBuilder, callee, arg_values: List[values.Value]) -> values.Value:
+    func = builder.function
+    arity_bb = func.append_basic_block(name="call.arity")
+    call_bb = func.append_basic_block(name="call.indirect")
+    error_bb = func.append_basic_block(name="call.error")
+    count = ir.Constant(INT_TYPE, len(arg_values))
+
+    closure_type = CLOSURE_HEADER_TYPE.as_pointer()
+    if not isinstance(callee, FunctionValue) and callee.type == closure_type:
+        # Inferred to be a closure, so only the arity is checked
+        closure = callee
+        callee = to_word(builder, closure)
+        builder.branch(arity_bb)
+        builder.position_at_end(arity_bb)
+    else:
+        callee = to_word(builder, callee)
+        builder.cbranch(emit_has_tag(builder, callee, TAG_CLOSURE), arity_bb, error_bb).set_weights([FAST_PATH_WEIGHT, 1])
+        builder.position_at_end(arity_bb)
+        closure = from_word(builder, callee, closure_type)
+    arity = builder.load(builder.gep(closure, [ZERO, ir.Constant(ir.IntType(32), 1)]), name="arity")
+    builder.cbranch(builder.icmp_signed('==', arity, count), call_bb, error_bb).set_weights([FAST_PATH_WEIGHT, 1])
+
+    builder.position_at_end(error_bb)
+    emit_runtime_error(builder, "rinha_call_error", [callee, count])
+
+    builder.position_at_end(call_bb)
+    code = builder.load(builder.gep(closure, [ZERO, ZERO]), name="code")
+    code_type = ir.FunctionType(INT_TYPE, [STR_TYPE] + [INT_TYPE] * len(arg_values))
+    code = builder.bitcast(code, code_type.as_pointer())
+    return builder.call(code, [builder.bitcast(closure, STR_TYPE)] + arg_values)
+
+def codegen_let(let_expr, module, frame, builder):
+    frame[let_expr.slot] = codegen(let_expr.value, module, frame, builder)
+    return codegen(let_expr.next, module, frame, builder)
+
+def codegen_function(node, module, frame, builder):
     global ANONYMOUS_FUNCTION_COUNT
 
-    int_type = ir.IntType(32)
-    param_types = [int_type for _ in node.parameters]
-    func_type = ir.FunctionType(int_type, param_types)
-    function_symtab = SymbolTable(parent=current_symtab)    
+    function_frame = [None] * node.frame_size
+    captured_values = []
+    for outer_slot, slot in node.captures:
+        value = frame[outer_slot]
+        if isinstance(value, FunctionValue) and value.closure is None:
+            # Functions without captures are referenced directly instead
+            function_frame[slot] = value
+        else:
+            captured_type = CLOSURE_HEADER_TYPE.as_pointer() if isinstance(value, FunctionValue) else value.type
+            captured_values.append((slot, to_word(builder, value), captured_type))
+
+    arity = len(node.parameters)
+    func_type = function_type(node, bool(captured_values))
+    symbol = UNIT_SYMBOLS.get(node)
+    if symbol is not None and node not in DEFINED_UNITS:
+        return declare_unit(module, node, symbol)
     func_name = node.name if node.name else f"anonymous_function_{ANONYMOUS_FUNCTION_COUNT}"
 
     ANONYMOUS_FUNCTION_COUNT += 1  
 
-    func = ir.Function(module, func_type, name=func_name)    
-
-    current_symtab.insert_function(func_name, func)
-    print(f"Inserted function {func_name} into symtab. Current functions: {current_symtab.functions}")
+    if symbol is not None:
+        func = ir.Function(module, func_type, name=symbol)
+        if node in LOCAL_UNITS:
+            func.linkage = 'internal'
+    else:
+        # Shadowing can give two functions the same name
+        func = ir.Function(module, func_type, name=module.get_unique_name(func_name))
+        func.linkage = 'internal'
+    if node.profile is not None:
+        set_entry_count(module, func, node.profile)
+        if node.profile == 0:
+            # Never entered in training: keep it out of its callers
+            func.attributes.add("cold")
+            func.attributes.add("noinline")
+        elif node.profile >= PROFILE_SUMMARY.max_function_count * HOT_FRACTION:
+            func.attributes.add("inlinehint")
+    if instrument.ENABLED:
+        instrument.count("codegen.functions")
+
+    closure = None
+    if captured_values:
+        # The closure object is built where the function is defined
+        closure_type = ir.LiteralStructType([STR_TYPE, INT_TYPE, ir.ArrayType(INT_TYPE, len(captured_values))])
+        closure = emit_object_alloc(builder, closure_type, 2 + len(captured_values), node.escapes)
+        index = ir.Constant(ir.IntType(32), 0)
+        builder.store(func.bitcast(STR_TYPE), builder.gep(closure, [ZERO, index]))
+        builder.store(ir.Constant(INT_TYPE, arity), builder.gep(closure, [ZERO, ir.Constant(ir.IntType(32), 1)]))
+        for i, (_, value, _) in enumerate(captured_values):
+            builder.store(value, builder.gep(closure, [ZERO, ir.Constant(ir.IntType(32), 2), ir.Constant(ir.IntType(32), i)]))
+        closure = builder.bitcast(closure, STR_TYPE)
 
     entry_block = func.append_basic_block(name="entry")
     builder = ir.IRBuilder(entry_block)
-    
-    for arg, param in zip(func.args, node.parameters):
+    emit_profile_count(builder, node)
+
+    params = list(func.args)
+    if captured_values:
+        params[0].name = "closure"
+        own_closure = params.pop(0)
+        # Captured values are read once, before any tail loop
+        closure_ptr = builder.bitcast(own_closure, ir.LiteralStructType(
+            [STR_TYPE, INT_TYPE, ir.ArrayType(INT_TYPE, len(captured_values))]).as_pointer())
+        for i, (slot, _, captured_type) in enumerate(captured_values):
+            pointer = builder.gep(closure_ptr, [ZERO, ir.Constant(ir.IntType(32), 2), ir.Constant(ir.IntType(32), i)])
+            function_frame[slot] = from_word(builder, builder.load(pointer, name=f"capture.{slot}"), captured_type)
+
+    if node.self_slot is not None:
+        function_frame[node.self_slot] = FunctionValue(func, arity, own_closure if captured_values else None)
+
+    for arg, param in zip(params, node.parameters):
         arg.name = param.text
-        function_symtab.insert_variable(param.text, arg)
-
-    print(function_symtab.variables)
-    print(function_symtab.functions)
-    print(current_symtab.variables)
-    print(current_symtab.functions)
-
-    ret_val = codegen(node.value, module, function_symtab, builder)
-    builder.ret(ret_val)
-    print("Current symtab:", function_symtab.functions)
-
-    return func
 
+    ctx = FunctionContext(func, node)
+    ctx.params = params
+    has_self_tail_calls, accumulator_op = scan_tail_calls(node)
+    if has_self_tail_calls:
+        # Self tail calls jump back here with new arguments instead of recursing
+        ctx.loop_header = func.append_basic_block(name="tailrecurse")
+        builder.branch(ctx.loop_header)
+        builder.position_at_end(ctx.loop_header)
+        ctx.params = []
+        for arg in params:
+            phi = builder.phi(arg.type, name=f"{arg.name}.tr")
+            phi.add_incoming(arg, entry_block)
+            ctx.params.append(phi)
+        if accumulator_op is not None:
+            ctx.accumulator_op = accumulator_op
+            ctx.accumulator = builder.phi(INT_TYPE, name="accumulator.tr")
+            ctx.accumulator.add_incoming(int_constant(ACCUMULATOR_IDENTITIES[accumulator_op]), entry_block)
+
+    # Parameters take the first slots of the frame
+    function_frame[:arity] = ctx.params
+    logger.debug("%s: frame of %d slots, captures %s", func_name, node.frame_size, node.captures)
+
+    # Memo tables are global and keyed by words, so they only fit functions
+    # without captures over tagged values
+    if node.memoize and not captured_values and all(arg.type == INT_TYPE for arg in params) \
+            and func_type.return_type == INT_TYPE:
+        ctx.memo_slot = emit_memo_lookup(module, builder, ctx)
+
+    codegen_tail(node.value, module, function_frame, builder, ctx)
+
+    return FunctionValue(func, arity, closure)
+
+
+def function_type(node: Function, has_captures: bool) -> ir.FunctionType:
+    param_types = [representation(param_type) for param_type in node.param_types or [None] * len(node.parameters)]
+    if has_captures:
+        param_types.insert(0, STR_TYPE)
+    return ir.FunctionType(representation(node.result_type), param_types)
+
+
+def declare_unit(module: ir.Module, node: Function, symbol: str) -> FunctionValue:
+    # Units never capture anything but other units
+    func = module.globals.get(symbol)
+    if func is None:
+        func = ir.Function(module, function_type(node, False), name=symbol)
+    return FunctionValue(func, len(node.parameters))
+
+
+def scan_tail_calls(node: Function) -> Tuple[bool, Optional[BinaryOp]]:
+    # Finds self calls in tail position and, if every accumulating one
+    # (`x op f(...)` with a pure `x`) uses the same operator, returns it.
+    if node.self_slot is None:
+        return False, None
+    sites = []
+    collect_self_tail_calls(node.value, node, sites)
+    # `+` on strings is neither associative with ints nor commutative
+    if node.result_type != INT:
+        sites = [op for op in sites if op is None]
+    accumulator_ops = {op for op in sites if op is not None}
+    accumulator_op = accumulator_ops.pop() if len(accumulator_ops) == 1 else None
+    has_loop = any(op is None or op == accumulator_op for op in sites)
+    return has_loop, accumulator_op
+
+
+def is_self_call(node, function: Function) -> bool:
+    # Only meaningful in `function`'s own body, where its frame is the current one
+    return (isinstance(node, Call) and isinstance(node.callee, Var) and function.self_slot is not None
+            and node.callee.slot == function.self_slot and len(node.arguments) == len(function.parameters))
+
+
+def is_accumulated_operand(node, function: Function) -> bool:
+    # The operand is evaluated and applied to the accumulator before the self
+    # call runs, so it must neither print nor fail: an Int literal or an Int
+    # parameter, as the interpreter's loops only move literals and variables
+    if isinstance(node, Int):
+        return True
+    return (isinstance(node, Var) and node.slot < len(function.parameters)
+            and function.param_types is not None and function.param_types[node.slot] == INT)
+
+
+def accumulating_self_call(node, function: Function) -> Optional[Call]:
+    if not isinstance(node, Binary) or node.op not in ACCUMULATOR_IDENTITIES:
+        return None
+    if is_self_call(node.rhs, function) and is_accumulated_operand(node.lhs, function):
+        return node.rhs
+    if is_self_call(node.lhs, function) and is_accumulated_operand(node.rhs, function):
+        return node.lhs
+    return None
+
+
+def collect_self_tail_calls(node, function: Function, sites: list):
+    if isinstance(node, If):
+        collect_self_tail_calls(node.then, function, sites)
+        collect_self_tail_calls(node.otherwise, function, sites)
+    elif isinstance(node, Let):
+        collect_self_tail_calls(node.next, function, sites)
+    elif is_self_call(node, function):
+        sites.append(None)
+    elif accumulating_self_call(node, function) is not None:
+        sites.append(node.op)
+
+
+def codegen_tail(node, module, frame, builder, ctx: FunctionContext):
+    # Generates `node` in tail position: every path ends in a return or, for
+    # self calls, in a jump back to the loop header. Nodes handled here
+    # rather than by codegen() are counted here.
+    if instrument.ENABLED and isinstance(node, (If, Let)):
+        count_node(node)
+    if isinstance(node, If):
+        cond_val = to_bool(builder, codegen(node.condition, module, frame, builder))
+        then_bb, else_bb = emit_if_branch(builder, node, cond_val)
+        builder.position_at_end(then_bb)
+        codegen_tail(node.then, module, frame, builder, ctx)
+        builder.position_at_end(else_bb)
+        codegen_tail(node.otherwise, module, frame, builder, ctx)
+        return
 
-def codegen_if(node, module, current_symtab, builder):
-    cond_val = codegen(node.condition, module, current_symtab, builder)
-    func = builder.block.function
+    if isinstance(node, Let):
+        frame[node.slot] = codegen(node.value, module, frame, builder)
+        codegen_tail(node.next, module, frame, builder, ctx)
+        return
+
+    if ctx.loop_header is not None:
+        if is_self_call(node, ctx.node):
+            emit_tail_jump(node, module, frame, builder, ctx, ctx.accumulator)
+            return
+        call = accumulating_self_call(node, ctx.node)
+        if call is not None and node.op == ctx.accumulator_op:
+            other = node.lhs if call is node.rhs else node.rhs
+            if instrument.ENABLED:
+                count_node(node)
+            other_val = codegen(other, module, frame, builder)
+            accumulated = BINARY_OP_DISPATCH[ctx.accumulator_op](builder, ctx.accumulator, other_val)
+            emit_tail_jump(call, module, frame, builder, ctx, accumulated)
+            return
+
+    if isinstance(node, Call) and ctx.accumulator is None and ctx.memo_slot is None:
+        if instrument.ENABLED:
+            count_node(node)
+        call = codegen_call(node, module, frame, builder)
+        if call.type != ctx.func.ftype.return_type:
+            emit_return(builder, ctx, call)
+            return
+        if isinstance(call.callee, ir.Function) and call.callee.ftype == ctx.func.ftype:
+            call.tail = "musttail"
+        builder.ret(call)
+        return
+
+    emit_return(builder, ctx, codegen(node, module, frame, builder))
+
+
+def emit_tail_jump(call, module, frame, builder, ctx: FunctionContext, accumulator):
+    if instrument.ENABLED:
+        count_node(call)
+    arg_values = [codegen(arg, module, frame, builder) for arg in call.arguments]
+    arg_values = [to_representation(builder, value, phi.type) for phi, value in zip(ctx.params, arg_values)]
+    for phi, value in zip(ctx.params, arg_values):
+        phi.add_incoming(value, builder.block)
+    if ctx.accumulator is not None:
+        ctx.accumulator.add_incoming(accumulator, builder.block)
+    builder.branch(ctx.loop_header)
+
+
+def emit_return(builder, ctx: FunctionContext, value):
+    value = to_representation(builder, value, ctx.func.ftype.return_type)
+    if isinstance(value, ir.CallInstr) and not value.tail:
+        value.tail = "tail"
+    if ctx.memo_slot is not None:
+        emit_memo_store(builder, ctx, value)
+    if ctx.accumulator is not None:
+        value = BINARY_OP_DISPATCH[ctx.accumulator_op](builder, ctx.accumulator, value)
+    builder.ret(value)
+
+
+def emit_memo_lookup(module, builder, ctx: FunctionContext):
+    int_type = ir.IntType(32)
+    entry_type = ir.LiteralStructType([BOOL_TYPE, INT_TYPE, ir.ArrayType(INT_TYPE, len(ctx.params))])
+    table_type = ir.ArrayType(entry_type, MEMO_TABLE_SIZE)
+    table = ir.GlobalVariable(module, table_type, name=f"{ctx.func.name}.memo")
+    table.linkage = 'internal'
+    table.initializer = ir.Constant(table_type, None)
+
+    hash_val = ir.Constant(INT_TYPE, 0)
+    for param in ctx.params:
+        hash_val = builder.xor(hash_val, param, name="memo_hash")
+        hash_val = builder.mul(hash_val, ir.Constant(INT_TYPE, MEMO_HASH_MULTIPLIER), name="memo_hash")
+    hash_val = builder.xor(hash_val, builder.lshr(hash_val, ir.Constant(INT_TYPE, 32)), name="memo_hash")
+    index = builder.and_(hash_val, ir.Constant(INT_TYPE, MEMO_TABLE_SIZE - 1), name="memo_index")
+
+    zero = ir.Constant(int_type, 0)
+    slot = builder.gep(table, [zero, index], name="memo_slot")
+    valid_ptr = builder.gep(slot, [zero, ir.Constant(int_type, 0)])
+    hit = builder.load(valid_ptr, name="memo_valid")
+    for i, param in enumerate(ctx.params):
+        key_ptr = builder.gep(slot, [zero, ir.Constant(int_type, 2), ir.Constant(int_type, i)])
+        key = builder.load(key_ptr, name="memo_key")
+        hit = builder.and_(hit, builder.icmp_signed('==', key, param), name="memo_hit")
+
+    hit_bb = ctx.func.append_basic_block(name="memo_hit")
+    miss_bb = ctx.func.append_basic_block(name="memo_miss")
+    builder.cbranch(hit, hit_bb, miss_bb)
+
+    builder.position_at_end(hit_bb)
+    value_ptr = builder.gep(slot, [zero, ir.Constant(int_type, 1)])
+    value = builder.load(value_ptr, name="memo_value")
+    if ctx.accumulator is not None:
+        value = BINARY_OP_DISPATCH[ctx.accumulator_op](builder, ctx.accumulator, value)
+    builder.ret(value)
+
+    builder.position_at_end(miss_bb)
+    return slot
+
+
+def emit_memo_store(builder, ctx: FunctionContext, value):
+    # Keys are the current (post tail-jump) arguments, whose result is `value`
+    int_type = ir.IntType(32)
+    zero = ir.Constant(int_type, 0)
+    slot = ctx.memo_slot
+    for i, param in enumerate(ctx.params):
+        key_ptr = builder.gep(slot, [zero, ir.Constant(int_type, 2), ir.Constant(int_type, i)])
+        builder.store(param, key_ptr)
+    builder.store(value, builder.gep(slot, [zero, ir.Constant(int_type, 1)]))
+    builder.store(ir.Constant(BOOL_TYPE, 1), builder.gep(slot, [zero, ir.Constant(int_type, 0)]))
 
-    then_bb = func.append_basic_block(name="then")
-    else_bb = func.append_basic_block(name="else")
-    merge_bb = func.append_basic_block(name="ifcont")
 
-    builder.cbranch(cond_val, then_bb, else_bb)
+def codegen_if(node, module, frame, builder):
+    cond_val = to_bool(builder, codegen(node.condition, module, frame, builder))
+    then_bb, else_bb = emit_if_branch(builder, node, cond_val)
+    merge_bb = builder.block.function.append_basic_block(name="ifcont")
 
     builder.position_at_end(then_bb)
-    then_val = codegen(node.then, module, current_symtab, builder)
+    then_val = codegen(node.then, module, frame, builder)
     builder.branch(merge_bb)
     then_bb = builder.block
 
     builder.position_at_end(else_bb)
-    else_val = codegen(node.otherwise, module, current_symtab, builder)
+    else_val = codegen(node.otherwise, module, frame, builder)
     builder.branch(merge_bb)
     else_bb = builder.block
 
+    if isinstance(then_val, FunctionValue) or isinstance(else_val, FunctionValue) or then_val.type != else_val.type:
+        # Branches of different kinds meet as words
+        with builder.goto_block(then_bb):
+            then_val = to_word(builder, then_val)
+        with builder.goto_block(else_bb):
+            else_val = to_word(builder, else_val)
+
     builder.position_at_end(merge_bb)
-    int_type = ir.IntType(32)
-    phi = builder.phi(int_type, name="iftmp")
+    phi = builder.phi(then_val.type, name="iftmp")
     phi.add_incoming(then_val, then_bb)
     phi.add_incoming(else_val, else_bb)
 
     return phi
 
-def codegen_var(node, module, current_symtab, builder):
-    var_type, value = current_symtab.lookup(node.text)
-    if var_type == SymbolType.Variable:
-        if not value:
-            raise CodeGenError(f"Undefined variable: {node.text}")
-        return value
-    elif var_type == SymbolType.Function:
-        raise CodeGenError(f"Expected variable but found function: {node.text}")
+def codegen_var(node, module, frame, builder):
+    # Functions are boxed into a closure by to_word only where used as a value
+    return frame[node.slot]
+
+def codegen_print(node, module, frame, builder):
+    value = codegen(node.value, module, frame, builder)
+
+    # Output is buffered by the runtime and flushed when main returns
+    if isinstance(value, FunctionValue) or value.type != STR_TYPE:
+        builder.call(runtime_function(module, "rinha_print"), [to_word(builder, value)])
     else:
-        raise CodeGenError(f"Undefined reference: {node.text}")
+        builder.call(runtime_function(module, "rinha_print_str"), [value])
+    # Print evaluates to its argument
+    return value
+
+def codegen_tuple(node, module, frame, builder):
+    first = to_word(builder, codegen(node.first, module, frame, builder))
+    second = to_word(builder, codegen(node.second, module, frame, builder))
+    tuple_ptr = emit_object_alloc(builder, TUPLE_TYPE, 2, node.escapes)
+    builder.store(first, builder.gep(tuple_ptr, [ZERO, ZERO]))
+    builder.store(second, builder.gep(tuple_ptr, [ZERO, ir.Constant(ir.IntType(32), 1)]))
+    return tuple_ptr
+
+def codegen_projection(node, module, frame, builder):
+    kind = "first" if isinstance(node, First) else "second"
+    value = codegen(node.value, module, frame, builder)
+    tuple_type = TUPLE_TYPE.as_pointer()
+
+    if isinstance(value, FunctionValue) or value.type != tuple_type:
+        value = to_word(builder, value)
+        func = builder.function
+        ok_bb = func.append_basic_block(name=f"{kind}.ok")
+        error_bb = func.append_basic_block(name=f"{kind}.error")
+        builder.cbranch(emit_has_tag(builder, value, TAG_TUPLE), ok_bb, error_bb).set_weights([FAST_PATH_WEIGHT, 1])
+        builder.position_at_end(error_bb)
+        emit_runtime_error(builder, "rinha_projection_error", [value, string_constant(module, kind)])
+        builder.position_at_end(ok_bb)
+        value = from_word(builder, value, tuple_type)
+
+    index = ir.Constant(ir.IntType(32), 0 if kind == "first" else 1)
+    return builder.load(builder.gep(value, [ZERO, index]), name=kind)
+
+def new_module(target_machine: Optional[binding.TargetMachine], units: Optional[Dict[Function, str]],
+               defined: Sequence[Function], local: Sequence[Function] = ()) -> ir.Module:
+    global ANONYMOUS_FUNCTION_COUNT, PROFILE_COUNTERS, PROFILE_SUMMARY
+    ANONYMOUS_FUNCTION_COUNT = 0
+    PROFILE_SUMMARY = None
+    STRING_POOL.clear()
+    PROFILE_COUNTERS = None
+    PROFILE_SITES.clear()
+    UNIT_SYMBOLS.clear()
+    UNIT_SYMBOLS.update(units or {})
+    DEFINED_UNITS.clear()
+    DEFINED_UNITS.update(defined)
+    LOCAL_UNITS.clear()
+    LOCAL_UNITS.update(local)
 
-def declare_printf(module):
-    int_type = ir.IntType(32)
-    printf_arg_types = [ir.PointerType(ir.IntType(8))]
-    printf_type = ir.FunctionType(int_type, printf_arg_types, var_arg=True)
-    printf_func = ir.Function(module, printf_type, name="printf")
-    return printf_func
-
-def codegen_print(node, module, current_symtab, builder):
-    printf_func = declare_printf(module)
-    value = codegen(node.value, module, current_symtab, builder)
-
-    # Determine the format string based on the type of the value
-    if isinstance(value.type, ir.IntType) and value.type.width == 32:
-        format_str = "%d\n"
-    elif isinstance(value.type, ir.PointerType) and isinstance(value.type.pointee, ir.IntType) and value.type.pointee.width == 8:
-        format_str = "%s\n"
+    context = ir.Context()
+    module = ir.Module(name="rinha", context=context)
+    # Set the target triple and data layout for the module, defaulting to the host
+    if target_machine is not None:
+        module.triple = target_machine.triple
+        module.data_layout = str(target_machine.target_data)
     else:
-        raise CodeGenError("Unsupported type for print operation")
+        module.triple = binding.get_process_triple()
+    return module
 
-    # Create a global constant for the format string
-    format_const = ir.Constant(ir.ArrayType(ir.IntType(8), len(format_str)), bytearray(format_str.encode("utf8")))
-    format_global = ir.GlobalVariable(module, format_const.type, name=".str")
-    format_global.linkage = 'private'
-    format_global.global_constant = True
-    format_global.initializer = format_const
 
-    # Get a reference to the start of the format string
-    zero = ir.Constant(ir.IntType(32), 0)
-    var_ref = format_global.gep([zero, zero])
+def count_blocks(module: ir.Module):
+    if instrument.ENABLED:
+        instrument.count("codegen.blocks", sum(len(func.blocks) for func in module.functions))
 
-    return builder.call(printf_func, [var_ref, value])
 
-def generate_code(ast):
-    context = ir.Context()
-    module = ir.Module(name="rinha", context=context)
-    current_symtab = SymbolTable()
-    
-    func_type = ir.FunctionType(ir.VoidType(), [])
+def generate_code(ast, target_machine: Optional[binding.TargetMachine] = None,
+                  units: Optional[Dict[Function, str]] = None, profile_path: Optional[str] = None):
+    # With `units`, those functions are only declared; see generate_unit_code.
+    # With `profile_path`, the program is instrumented to write its profile
+    # there when it exits; instrumented builds are always a single module.
+    global PROFILE_COUNTERS
+    module = new_module(target_machine, units, ())
+    frame = [None] * ast.frame_size
+
+    # Returns 0, as a C main does; run-time errors exit(1) from the runtime
+    func_type = ir.FunctionType(ir.IntType(32), [])
     main_func = ir.Function(module, func_type, name="main")
     entry_block = main_func.append_basic_block(name="entry")
-    
+
     builder = ir.IRBuilder(entry_block)
-    
-    codegen(ast.expression, module, current_symtab, builder)
 
-    builder.ret_void()
+    emit_profile_summary(module, ast.profile)
+    if ast.profile is not None:
+        set_entry_count(module, main_func, 1)
+    if profile_path is not None:
+        sites, count = number_sites(ast)
+        PROFILE_SITES.update(sites)
+        counters_type = ir.ArrayType(INT_TYPE, count)
+        PROFILE_COUNTERS = ir.GlobalVariable(module, counters_type, name="rinha.profile")
+        PROFILE_COUNTERS.linkage = 'internal'
+        PROFILE_COUNTERS.initializer = ir.Constant(counters_type, None)
+        builder.call(runtime_function(module, "rinha_profile_start"),
+                     [PROFILE_COUNTERS.gep([ZERO, ZERO]), ir.Constant(INT_TYPE, count),
+                      string_constant(module, profile_path), string_constant(module, program_digest(ast))])
+
+    codegen(ast.expression, module, frame, builder)
+
+    builder.call(runtime_function(module, "rinha_flush"), [])
+    builder.ret(ZERO)
+
+    count_blocks(module)
+    return module
+
 
-    # Set the target triple and data layout for the module
-    module.triple = "x86_64-pc-linux-gnu"
-    module.data_layout = "e-m:e-i64:64-f80:128-n8:16:32:64-S128"
-   
+def generate_unit_code(ast, nodes: Sequence[Function], units: Dict[Function, str], unit_slots: Dict[int, Function],
+                       target_machine: Optional[binding.TargetMachine] = None, local: Sequence[Function] = ()):
+    # A module defining only the top-level functions `nodes`, in program
+    # order; `unit_slots` maps top-level frame slots to the units bound there,
+    # which they may capture. A unit only captures earlier ones, so a captured
+    # unit this module defines has already been generated. The `local` ones
+    # are not exported.
+    module = new_module(target_machine, units, nodes, local)
+    emit_profile_summary(module, ast.profile)
+    frame = [None] * ast.frame_size
+    for node in nodes:
+        for outer_slot, _ in node.captures:
+            frame[outer_slot] = declare_unit(module, unit_slots[outer_slot], units[unit_slots[outer_slot]])
+        codegen_function(node, module, frame, None)
+
+    count_blocks(module)
     return module
@@ -0,0 +1,360 @@
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple as Pair
+
+from my_ast import Binary, Bool, Call, File, First, Function, If, Int, Let, Parameter, Print, Second, Str, Term, Tuple, Var
+from purity import collect_functions, collect_visible_names, pure_call_graph
+
+# Common subexpression elimination by hash-consing. Within one function body
+# (or the top-level expression) every effect-free node gets a number from a
+# table of structures, where a Var stands for the Let, parameter or function
+# that binds it, so equal numbers mean equal values. A Binary, or a call to a
+# function purity.py proves pure, whose number occurs more than once is bound
+# by a Let at the outermost node that computes it on every path before any
+# effect, and its occurrences read the Let. Nested functions are scopes of
+# their own.
+#
+# A recursive function that is not memoized evaluates its loop-invariant pure
+# calls, those only reading the parameters every self-call passes through
+# unchanged and names from outside, on every iteration. Such a function
+# becomes a wrapper that evaluates them once and hands the recursion to an
+# inner function taking the other parameters.
+#
+# Nothing is moved past a Print or a call that may print, or onto a path that
+# did not evaluate it, so the output is unchanged; of two expressions that
+# both fail, a different one may be the first to report it.
+
+Env = Dict[str, Term]
+
+
+def children(node: Term) -> List[Term]:
+    # Subterms in evaluation order; a function body is another scope
+    if isinstance(node, Binary):
+        return [node.lhs, node.rhs]
+    elif isinstance(node, If):
+        return [node.condition, node.then, node.otherwise]
+    elif isinstance(node, Let):
+        return [node.value, node.next]
+    elif isinstance(node, Call):
+        return [node.callee] + node.arguments
+    elif isinstance(node, (Print, First, Second)):
+        return [node.value]
+    elif isinstance(node, Tuple):
+        return [node.first, node.second]
+    return []
+
+
+def map_children(node: Term, transform: Callable[[Term], Term]):
+    if isinstance(node, Binary):
+        node.lhs = transform(node.lhs)
+        node.rhs = transform(node.rhs)
+    elif isinstance(node, If):
+        node.condition = transform(node.condition)
+        node.then = transform(node.then)
+        node.otherwise = transform(node.otherwise)
+    elif isinstance(node, Let):
+        node.value = transform(node.value)
+        node.next = transform(node.next)
+    elif isinstance(node, Call):
+        node.callee = transform(node.callee)
+        node.arguments = [transform(arg) for arg in node.arguments]
+    elif isinstance(node, (Print, First, Second)):
+        node.value = transform(node.value)
+    elif isinstance(node, Tuple):
+        node.first = transform(node.first)
+        node.second = transform(node.second)
+
+
+def subterms(node: Term) -> Iterator[Term]:
+    yield node
+    for child in children(node):
+        yield from subterms(child)
+
+
+class Scope:
+    def __init__(self, table: Dict[tuple, int], pure_functions: Set[int], env: Env, own: Optional[Function]):
+        self.table = table
+        self.pure_functions = pure_functions
+        self.env = env
+        self.own = own
+        # Numbers of the Binary nodes and pure calls, by node id
+        self.numbers: Dict[int, int] = {}
+        self.counts: Dict[int, int] = {}
+        self.sizes: Dict[int, int] = {}
+        self.first: Dict[int, Term] = {}
+        # Binder of each Var, by node id
+        self.binders: Dict[int, int] = {}
+        self.pure_calls: Set[int] = set()
+        self.lets: Set[int] = set()
+        self.self_calls: List[Call] = []
+        self.functions: List[Pair[Function, Env]] = []
+
+    def intern(self, structure: tuple) -> int:
+        return self.table.setdefault(structure, len(self.table))
+
+    def record(self, node: Term, structure: tuple, size: int) -> int:
+        number = self.intern(structure)
+        self.numbers[id(node)] = number
+        self.counts[number] = self.counts.get(number, 0) + 1
+        self.sizes[number] = size
+        self.first.setdefault(number, node)
+        return number
+
+    def is_pure(self, binder: Optional[Term]) -> bool:
+        if isinstance(binder, Let):
+            return id(binder.value) in self.pure_functions
+        return isinstance(binder, Function) and id(binder) in self.pure_functions
+
+    def number(self, node: Term) -> Pair[Optional[int], int]:
+        # Returns the number of `node`, None when it has effects, allocates or
+        # binds names, and its size
+        if isinstance(node, Int):
+            return self.intern(("Int", node.value)), 1
+
+        elif isinstance(node, Str):
+            return self.intern(("Str", node.value)), 1
+
+        elif isinstance(node, Bool):
+            return self.intern(("Bool", node.value)), 1
+
+        elif isinstance(node, Var):
+            binder = self.env.get(node.text)
+            if binder is None:
+                # Reported by resolve.py
+                return self.intern(("Free", node.text)), 1
+            self.binders[id(node)] = id(binder)
+            return self.intern(("Var", id(binder))), 1
+
+        elif isinstance(node, Binary):
+            lhs, lhs_size = self.number(node.lhs)
+            rhs, rhs_size = self.number(node.rhs)
+            size = lhs_size + rhs_size + 1
+            if lhs is None or rhs is None:
+                return None, size
+            return self.record(node, ("Binary", node.op, lhs, rhs), size), size
+
+        elif isinstance(node, If):
+            parts = [self.number(part) for part in children(node)]
+            size = sum(part_size for _, part_size in parts) + 1
+            if any(number is None for number, _ in parts):
+                return None, size
+            return self.intern(("If",) + tuple(number for number, _ in parts)), size
+
+        elif isinstance(node, Let):
+            self.lets.add(id(node))
+            _, value_size = self.number(node.value)
+            shadowed = self.env.get(node.name.text)
+            self.env[node.name.text] = node
+            _, next_size = self.number(node.next)
+            if shadowed is None:
+                del self.env[node.name.text]
+            else:
+                self.env[node.name.text] = shadowed
+            return None, value_size + next_size + 1
+
+        elif isinstance(node, Call):
+            parts = [self.number(part) for part in children(node)]
+            size = sum(part_size for _, part_size in parts) + 1
+            binder = self.env.get(node.callee.text) if isinstance(node.callee, Var) else None
+            if binder is not None and binder is self.own:
+                self.self_calls.append(node)
+            if not self.is_pure(binder):
+                return None, size
+            self.pure_calls.add(id(node))
+            if any(number is None for number, _ in parts):
+                return None, size
+            return self.record(node, ("Call",) + tuple(number for number, _ in parts), size), size
+
+        elif isinstance(node, Function):
+            self.functions.append((node, dict(self.env)))
+            return None, 1
+
+        elif isinstance(node, (First, Second)):
+            value, size = self.number(node.value)
+            if value is None:
+                return None, size + 1
+            return self.intern((type(node).__name__, value)), size + 1
+
+        # Print has an effect and Tuple allocates
+        return None, sum(self.number(child)[1] for child in children(node)) + 1
+
+
+def analyze(node: Term, key: int, scope: Scope, bound: Set[int],
+            marks: Dict[int, Pair[bool, int]]) -> Pair[bool, int, bool]:
+    # Returns whether `key` is computed on every path through `node` before
+    # any effect, how often it occurs under `node` and whether `node` may have
+    # an effect; `bound` holds the binders `key` reads. Nodes with occurrences
+    # are recorded in marks.
+    if scope.numbers.get(id(node)) == key:
+        marks[id(node)] = (True, 1)
+        return True, 1, False
+
+    elif isinstance(node, If):
+        cond_ready, cond_count, cond_effect = analyze(node.condition, key, scope, bound, marks)
+        then_ready, then_count, then_effect = analyze(node.then, key, scope, bound, marks)
+        else_ready, else_count, else_effect = analyze(node.otherwise, key, scope, bound, marks)
+        ready = cond_ready or (not cond_effect and then_ready and else_ready)
+        result = ready, cond_count + then_count + else_count, cond_effect or then_effect or else_effect
+
+    elif isinstance(node, Let):
+        value_ready, value_count, value_effect = analyze(node.value, key, scope, bound, marks)
+        next_ready, next_count, next_effect = analyze(node.next, key, scope, bound, marks)
+        # A value reading the Let's own name cannot be computed above it
+        ready = value_ready or (not value_effect and next_ready and id(node) not in bound)
+        result = ready, value_count + next_count, value_effect or next_effect
+
+    elif isinstance(node, Function):
+        return False, 0, False
+
+    else:
+        ready, count, effect = False, 0, False
+        for child in children(node):
+            child_ready, child_count, child_effect = analyze(child, key, scope, bound, marks)
+            ready = ready or (child_ready and not effect)
+            count += child_count
+            effect = effect or child_effect
+        if isinstance(node, Print) or (isinstance(node, Call) and id(node) not in scope.pure_calls):
+            effect = True
+        result = ready, count, effect
+
+    if result[1]:
+        marks[id(node)] = result[:2]
+    return result
+
+
+def substitute(node: Term, names: Dict[int, str], scope: Scope, first: Dict[int, Term]) -> Term:
+    # Replaces the occurrences of the numbers in `names` by their Var; the
+    # first occurrence of each goes in `first`
+    number = scope.numbers.get(id(node))
+    if number in names:
+        first.setdefault(number, node)
+        return Var(names[number], node.location)
+    if not isinstance(node, Function):
+        map_children(node, lambda child: substitute(child, names, scope, first))
+    return node
+
+
+def binders_read(node: Term, scope: Scope) -> Set[int]:
+    return {scope.binders[id(term)] for term in subterms(node) if id(term) in scope.binders}
+
+
+class Elimination:
+    def __init__(self, pure_functions: Set[int]):
+        self.table: Dict[tuple, int] = {}
+        self.pure_functions = pure_functions
+        self.temporaries = 0
+        self.eliminated = 0
+        self.hoisted = 0
+
+    def fresh(self) -> str:
+        # Not a valid identifier in the source language
+        self.temporaries += 1
+        return f"cse.{self.temporaries}"
+
+    def scope(self, body: Term, env: Env, own: Optional[Function]) -> Scope:
+        scope = Scope(self.table, self.pure_functions, env, own)
+        scope.number(body)
+        return scope
+
+    def place(self, node: Term, key: int, scope: Scope, marks: Dict[int, Pair[bool, int]], name: str) -> Term:
+        # Binds `key` above the outermost nodes that compute it more than once
+        mark = marks.get(id(node))
+        if mark is None or mark[1] < 2:
+            return node
+        ready, count = mark
+        if not ready:
+            map_children(node, lambda child: self.place(child, key, scope, marks, name))
+            return node
+        first: Dict[int, Term] = {}
+        body = substitute(node, {key: name}, scope, first)
+        value = first[key]
+        self.eliminated += (count - 1) * scope.sizes[key]
+        return Let(Parameter(name, value.location), value, body, value.location)
+
+    def share(self, body: Term, scope: Scope) -> Pair[Term, Scope]:
+        tried: Set[int] = set()
+        while True:
+            repeated = [number for number, count in scope.counts.items() if count > 1 and number not in tried]
+            # Largest first, so a repeated expression is shared as a whole
+            repeated.sort(key=lambda number: (-scope.sizes[number], number))
+            for key in repeated:
+                tried.add(key)
+                marks: Dict[int, Pair[bool, int]] = {}
+                analyze(body, key, scope, binders_read(scope.first[key], scope), marks)
+                eliminated = self.eliminated
+                name = self.fresh()
+                body = self.place(body, key, scope, marks, name)
+                if self.eliminated != eliminated:
+                    break
+                self.temporaries -= 1
+            else:
+                return body, scope
+            scope = self.scope(body, scope.env, scope.own)
+
+    def hoist_invariant_calls(self, function: Function, body: Term, scope: Scope) -> Term:
+        parameters = function.parameters
+        if not scope.self_calls or any(len(call.arguments) != len(parameters) for call in scope.self_calls):
+            return body
+        invariant = [all(scope.binders.get(id(call.arguments[index])) == id(param) for call in scope.self_calls)
+                     for index, param in enumerate(parameters)]
+        if all(invariant) or not any(invariant):
+            return body
+
+        variant = [param for param, fixed in zip(parameters, invariant) if not fixed]
+        changing = {id(function)} | scope.lets | {id(param) for param in variant}
+        calls = {scope.numbers[id(node)] for node in scope.first.values() if id(node) in scope.pure_calls}
+        chosen: List[int] = []
+        covered: Set[int] = set()
+        for key in sorted(calls, key=lambda number: (-scope.sizes[number], number)):
+            bound = binders_read(scope.first[key], scope)
+            if key in covered or not bound.isdisjoint(changing):
+                continue
+            if analyze(body, key, scope, bound, {})[0]:
+                chosen.append(key)
+                covered.update(scope.numbers.get(id(term)) for term in subterms(scope.first[key]))
+        if not chosen:
+            return body
+
+        names = {key: self.fresh() for key in chosen}
+        first: Dict[int, Term] = {}
+        body = substitute(body, names, scope, first)
+        location = function.location
+        loop_name = f"{function.name}.loop"
+        for call in scope.self_calls:
+            call.callee = Var(loop_name, call.callee.location)
+            call.arguments = [arg for arg, fixed in zip(call.arguments, invariant) if not fixed]
+        loop = Function(variant, body, location, loop_name)
+        function.parameters = [Parameter(param.text, param.location) for param in parameters]
+        start = Call(Var(loop_name, location), [Var(param.text, param.location) for param in variant], location)
+        result: Term = Let(Parameter(loop_name, location), loop, start, location)
+        for key in reversed(chosen):
+            result = Let(Parameter(names[key], first[key].location), first[key], result, first[key].location)
+        self.hoisted += len(chosen)
+        return result
+
+    def optimize(self, body: Term, env: Env, own: Optional[Function]) -> Term:
+        # Memoized functions keep their recursion on the memo table
+        scope = self.scope(body, env, own)
+        if own is not None and own.name and not own.memoize:
+            hoisted = self.hoist_invariant_calls(own, body, scope)
+            if hoisted is not body:
+                body, scope = hoisted, self.scope(hoisted, env, own)
+        body, scope = self.share(body, scope)
+        for function, outer in scope.functions:
+            inner = dict(outer)
+            if function.name:
+                inner[function.name] = function
+            for param in function.parameters:
+                inner[param.text] = param
+            function.value = self.optimize(function.value, inner, function)
+        return body
+
+
+def eliminate_common_subexpressions(ast: File) -> Pair[int, int]:
+    # Returns the number of nodes no longer evaluated and of calls hoisted out of recursion
+    functions: Dict[str, List[Function]] = {}
+    collect_functions(ast.expression, functions)
+    visible: Dict[Function, Dict[str, Term]] = {}
+    collect_visible_names(ast.expression, {}, visible)
+    pure = pure_call_graph(functions, visible)
+    elimination = Elimination({id(functions[name][0]) for name in pure})
+    ast.expression = elimination.optimize(ast.expression, {}, None)
+    return elimination.eliminated, elimination.hoisted
@@ -0,0 +1,115 @@
+from typing import Dict, List, Optional, Set, Tuple as Pair
+
+from my_ast import Binary, Bool, Call, File, First, Function, If, Int, Let, Print, Second, Str, Term, Tuple, Var
+
+# Tuples and closures are allocated by the function call that builds them. One
+# that is never returned, passed as an argument, stored in another object or
+# captured cannot outlive that call, so codegen puts it on the call's stack
+# instead of the arena. Reading fields, printing and calling do not escape,
+# except that a call in tail position gets LLVM's `tail` or `musttail`, which
+# promises the callee never reads the caller's stack: a closure called there
+# (it is passed as the callee's environment) escapes too.
+# The top-level program is never left before the process exits, so nothing it
+# builds directly needs the arena.
+
+Sources = List[Term]
+
+
+class Frame:
+    def __init__(self, parent: Optional['Frame']):
+        self.parent = parent
+        # Allocation sites each visible name may hold
+        self.names: Dict[str, Sources] = {}
+
+    def lookup(self, name: str, escaped: Set[Term]) -> Sources:
+        sources = self.names.get(name)
+        if sources is not None:
+            return sources
+        frame = self.parent
+        while frame is not None:
+            sources = frame.names.get(name)
+            if sources is not None:
+                # Free variables are copied into the closure
+                escaped.update(sources)
+                return []
+            frame = frame.parent
+        return []
+
+
+def visit(node: Term, frame: Frame, escaped: Set[Term], allocations: List[Pair[Term, Frame]],
+          tail: bool = False) -> Sources:
+    # Returns the allocation sites the value of `node` may be; `tail` is set
+    # where codegen may emit a call as a tail call (see codegen.emit_return)
+    if isinstance(node, (Int, Str, Bool)):
+        return []
+
+    elif isinstance(node, Var):
+        return frame.lookup(node.text, escaped)
+
+    elif isinstance(node, Tuple):
+        escaped.update(visit(node.first, frame, escaped, allocations))
+        escaped.update(visit(node.second, frame, escaped, allocations))
+        allocations.append((node, frame))
+        return [node]
+
+    elif isinstance(node, Function):
+        inner = Frame(frame)
+        if node.name:
+            inner.names[node.name] = [node]
+        for param in node.parameters:
+            inner.names[param.text] = []
+        escaped.update(visit(node.value, inner, escaped, allocations, True))
+        allocations.append((node, frame))
+        return [node]
+
+    elif isinstance(node, Let):
+        sources = visit(node.value, frame, escaped, allocations)
+        name = node.name.text
+        shadowed = frame.names.get(name)
+        frame.names[name] = sources
+        result = visit(node.next, frame, escaped, allocations, tail)
+        if shadowed is None:
+            del frame.names[name]
+        else:
+            frame.names[name] = shadowed
+        return result
+
+    elif isinstance(node, If):
+        visit(node.condition, frame, escaped, allocations)
+        return (visit(node.then, frame, escaped, allocations, tail)
+                + visit(node.otherwise, frame, escaped, allocations, tail))
+
+    elif isinstance(node, Binary):
+        visit(node.lhs, frame, escaped, allocations)
+        visit(node.rhs, frame, escaped, allocations)
+        return []
+
+    elif isinstance(node, Call):
+        callee = visit(node.callee, frame, escaped, allocations)
+        if tail:
+            escaped.update(callee)
+        for arg in node.arguments:
+            escaped.update(visit(arg, frame, escaped, allocations))
+        return []
+
+    elif isinstance(node, Print):
+        # Print evaluates to its argument, so a call there is returned as is
+        return visit(node.value, frame, escaped, allocations, tail)
+
+    elif isinstance(node, (First, Second)):
+        visit(node.value, frame, escaped, allocations)
+        return []
+
+    return []
+
+
+def mark_escaping_allocations(ast: File) -> int:
+    escaped: Set[Term] = set()
+    allocations: List[Pair[Term, Frame]] = []
+    visit(ast.expression, Frame(None), escaped, allocations)
+
+    stack_allocated = 0
+    for node, frame in allocations:
+        node.escapes = frame.parent is not None and node in escaped
+        stack_allocated += not node.escapes
+    return stack_allocated
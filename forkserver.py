@@ -0,0 +1,175 @@
+"""Keep the compiler loaded in one process and fork it for every run of main.py.
+
+    python forkserver.py /tmp/clownhead.sock [--cc clang] &
+    CLOWNHEAD_FORKSERVER=/tmp/clownhead.sock python main.py example.json
+
+The server imports the compiler and llvmlite, initializes LLVM and builds the
+runtime once. When CLOWNHEAD_FORKSERVER names a socket a server listens on,
+main.py sends it its arguments, environment, working directory and standard
+streams before importing anything else; the server forks a child that runs
+main.main on them, so output, artifacts and the exit status are those of a
+local run. Without a server on the socket, main.py runs locally.
+"""
+import marshal
+import os
+import signal
+import socket
+import sys
+
+# main.py imports this module ahead of everything else, so the client side
+# sticks to cheap modules: no typing, json or argparse.
+
+SERVER_ENV = "CLOWNHEAD_FORKSERVER"
+MAX_FDS = 3
+
+
+def send_message(connection: socket.socket, value, fds=()):
+    # A length-prefixed marshal payload, with any file descriptors attached to its first bytes
+    data = marshal.dumps(value)
+    data = len(data).to_bytes(4, "little") + data
+    sent = socket.send_fds(connection, [data], list(fds))
+    if sent < len(data):
+        connection.sendall(data[sent:])
+
+
+def receive_message(connection: socket.socket):
+    # Returns the value and the file descriptors sent with it, or (None, [])
+    # when the peer closed the connection first
+    data, fds, _, _ = socket.recv_fds(connection, 1 << 16, MAX_FDS)
+    while len(data) < 4 or len(data) < 4 + int.from_bytes(data[:4], "little"):
+        chunk = connection.recv(1 << 16)
+        if not chunk:
+            return None, fds
+        data += chunk
+    return marshal.loads(data[4:]), fds
+
+
+def forward(path: str, argv: list) -> "int | None":
+    # Runs main.py's argv on the server at `path` and returns its exit status,
+    # or None when no server is listening there
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    with client:
+        send_message(client, {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}, [0, 1, 2])
+        # The child first names itself, so interrupting the client interrupts the compile
+        pid, _ = receive_message(client)
+        if pid is None:
+            return 1
+        forward_signal = lambda signum, frame: os.kill(pid, signum)
+        signal.signal(signal.SIGINT, forward_signal)
+        signal.signal(signal.SIGTERM, forward_signal)
+        status, _ = receive_message(client)
+    # The child died without reporting, e.g. on an LLVM abort, whose message went to our stderr
+    return 1 if status is None else status
+
+
+def run_child(connection: socket.socket):
+    # Runs in the forked child: takes over the client's streams, environment
+    # and working directory, then runs main.main as main.py would
+    import main
+
+    request, fds = receive_message(connection)
+    if request is None:
+        return
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.environ.clear()
+    os.environ.update(request["env"])
+    os.environ.pop(SERVER_ENV, None)
+    os.chdir(request["cwd"])
+    sys.argv = request["argv"]
+    send_message(connection, os.getpid())
+
+    status = 0
+    try:
+        main.main(sys.argv[1:])
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+        status = 1 if isinstance(e.code, str) else e.code or 0
+    except KeyboardInterrupt:
+        status = 128 + signal.SIGINT
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    send_message(connection, status)
+
+
+def prewarm(cc: str):
+    # Everything a run would otherwise load first: the lazily imported
+    # modules, LLVM's native target and the compiled runtime
+    import codegen  # noqa: F401
+    import incremental  # noqa: F401
+    import main  # noqa: F401
+    import pgo  # noqa: F401
+    from backend import BackendError, build_runtime, create_target_machine, load_runtime
+
+    create_target_machine()
+    try:
+        build_runtime(cc)
+        load_runtime(cc)
+    except BackendError as e:
+        print(f"Runtime not prebuilt: {e}", file=sys.stderr)
+
+
+def serve(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    # Children are never waited for; each reports its own status to its client
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    print(f"Listening on {path}", file=sys.stderr)
+    try:
+        while True:
+            connection, _ = server.accept()
+            # Nothing buffered may be written twice
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                server.close()
+                try:
+                    run_child(connection)
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+                finally:
+                    os._exit(0)
+            connection.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(path)
+
+
+def stop_serving(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    import argparse
+    from main import default_compiler
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("socket", help="Unix socket to listen on")
+    parser.add_argument("--cc", default=default_compiler(),
+                        help="compiler driver whose runtime build is prepared (default: clang, or cc if clang is not "
+                             "installed)")
+    args = parser.parse_args(argv)
+    prewarm(args.cc)
+    signal.signal(signal.SIGTERM, stop_serving)
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
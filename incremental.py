@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+from enum import Enum
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import instrument
+from cache import CompileCache, compiler_version
+from my_ast import File, Function, Let, Parameter, Term, Var
+
+# Incremental compilation: every top-level Let-bound function that captures
+# nothing but other such functions is a unit, compiled into an object of its
+# own and exported under a unique symbol. The top level, with everything else,
+# is one more object that only declares the units. Each object is cached under
+# a hash of its annotated AST and the signatures of the units it references,
+# so editing one function only regenerates that function, plus the units whose
+# view of its signature changed, before relinking.
+#
+# The same split lets a build use several processes: objects that have to be
+# built are generated, optimized and emitted on a pool of forked workers, and
+# only the link is serial. Without the cache, units are grouped into one
+# object per worker rather than one each, so there are fewer objects to emit
+# and link and calls within a group can still be inlined.
+
+# Name of the top-level object in reports; unit symbols never take it
+MAIN_UNIT = "main"
+
+
+class Unit(NamedTuple):
+    symbol: str
+    let: Let
+    function: Function
+
+
+class UnitReport(NamedTuple):
+    reused: List[str]
+    compiled: List[str]
+
+
+def find_units(ast: File) -> List[Unit]:
+    units: List[Unit] = []
+    unit_slots: Dict[int, Function] = {}
+    taken = {MAIN_UNIT}
+    node = ast.expression
+    while isinstance(node, Let):
+        function = node.value
+        if isinstance(function, Function) and function.name \
+                and all(outer in unit_slots for outer, _ in function.captures):
+            # Symbols are unique across objects and stay clear of the runtime's
+            symbol, suffix = function.name, 0
+            while symbol in taken or symbol.startswith("rinha_"):
+                suffix += 1
+                symbol = f"{function.name}.{suffix}"
+            taken.add(symbol)
+            units.append(Unit(symbol, node, function))
+            unit_slots[node.slot] = function
+        node = node.next
+    return units
+
+
+def signature(unit: Unit) -> bytes:
+    function = unit.function
+    fields = [unit.symbol, len(function.parameters), function.param_types, function.result_type]
+    return json.dumps(fields).encode("utf8")
+
+
+def feed_term(digest, root, replaced: Dict[Function, bytes]):
+    # Streams every field codegen reads, annotations included, but not
+    # locations. Functions in `replaced` contribute their signature only. The
+    # walk is iterative, like cache.feed_normalized_ast.
+    pending = [root]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, bytes):
+            digest.update(item)
+        elif isinstance(item, (Term, Parameter)):
+            if isinstance(item, Function) and item in replaced:
+                digest.update(replaced[item])
+                continue
+            parts: list = [type(item).__name__.encode("utf8") + b"("]
+            for name in type(item).__slots__:
+                if name != "location":
+                    parts.append(name.encode("utf8") + b"=")
+                    parts.append(getattr(item, name))
+                    parts.append(b";")
+            parts.append(b")")
+            pending.extend(reversed(parts))
+        elif isinstance(item, (list, tuple)):
+            parts = [b"["]
+            for value in item:
+                parts.append(value)
+                parts.append(b",")
+            parts.append(b"]")
+            pending.extend(reversed(parts))
+        elif isinstance(item, Enum):
+            digest.update(repr(item.value).encode("utf8"))
+        else:
+            # Only None, bools, ints and strings are left, whose repr is exact
+            digest.update(repr(item).encode("utf8"))
+
+
+def unit_key(root, name: str, replaced: Dict[Function, bytes], **options: str) -> str:
+    digest = hashlib.sha256()
+    header = {"compiler": compiler_version(), "options": options, "unit": name}
+    digest.update(json.dumps(header, sort_keys=True, separators=(",", ":")).encode("utf8"))
+    feed_term(digest, root, replaced)
+    return digest.hexdigest()
+
+
+def term_size(root) -> int:
+    size = 0
+    pending = [root]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, Term):
+            size += 1
+            pending.extend(getattr(item, name) for name in type(item).__slots__)
+        elif isinstance(item, list):
+            pending.extend(item)
+    return size
+
+
+def partition(units: List[Unit], count: int) -> List[Tuple[int, ...]]:
+    # Splits the units, in program order, into at most `count` runs of about
+    # the same number of AST nodes
+    sizes = [term_size(unit.function) for unit in units]
+    share = sum(sizes) / count
+    parts: List[Tuple[int, ...]] = []
+    current: List[int] = []
+    filled = 0
+    for index, size in enumerate(sizes):
+        current.append(index)
+        filled += size
+        if filled >= share * (len(parts) + 1) and len(parts) < count - 1:
+            parts.append(tuple(current))
+            current = []
+    if current:
+        parts.append(tuple(current))
+    return parts
+
+
+def top_level_slots(ast: File, units: List[Unit]) -> Set[int]:
+    # Top-level frame slots read outside the units: by Vars at the top level
+    # and through the captures of its other functions
+    unit_functions = {unit.function for unit in units}
+    slots: Set[int] = set()
+    pending = [ast.expression]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, Function):
+            if item not in unit_functions:
+                slots.update(outer for outer, _ in item.captures)
+        elif isinstance(item, Var):
+            slots.add(item.slot)
+        elif isinstance(item, Term):
+            pending.extend(getattr(item, name) for name in type(item).__slots__)
+        elif isinstance(item, list):
+            pending.extend(item)
+    return slots
+
+
+def local_units(ast: File, units: List[Unit], parts: List[Tuple[int, ...]]) -> List[Tuple[int, ...]]:
+    # For each part, the units no other object references, which can be
+    # internal there: left exported, the inliner would keep a copy of every
+    # call chain running through the part
+    unit_index = {unit.let.slot: index for index, unit in enumerate(units)}
+    part_of = {index: number for number, indices in enumerate(parts) for index in indices}
+    exported = {unit_index[slot] for slot in top_level_slots(ast, units) if slot in unit_index}
+    for index, unit in enumerate(units):
+        for outer, _ in unit.function.captures:
+            if part_of[unit_index[outer]] != part_of[index]:
+                exported.add(unit_index[outer])
+    return [tuple(index for index in indices if index not in exported) for indices in parts]
+
+
+# What build_object needs besides its task. Set before the worker pool is
+# started, so forked workers inherit the AST instead of unpickling it per task.
+BUILD_STATE: Optional[tuple] = None
+BUILD_TARGET_MACHINE = None
+
+
+def initialize_build_worker():
+    # A fresh target machine rather than the parent's copy
+    global BUILD_TARGET_MACHINE
+    from backend import create_target_machine
+    BUILD_TARGET_MACHINE = create_target_machine()
+
+
+def build_object(task: Tuple[Optional[Tuple[int, ...]], Tuple[int, ...], str]):
+    # Generates, optimizes and emits one object: the top level when the task's
+    # unit indices are None, otherwise the module defining those units, of
+    # which the second indices are not exported
+    from backend import emit_object, optimize_module, parse_module
+    from codegen import generate_code, generate_unit_code
+
+    indices, local, object_path = task
+    ast, units, symbols, unit_slots, opt_level = BUILD_STATE
+    with instrument.phase("generate_code"):
+        if indices is None:
+            mod = generate_code(ast, BUILD_TARGET_MACHINE, symbols)
+        else:
+            nodes = [units[index].function for index in indices]
+            mod = generate_unit_code(ast, nodes, symbols, unit_slots, BUILD_TARGET_MACHINE,
+                                     [units[index].function for index in local])
+    llvm_mod = parse_module(mod, BUILD_TARGET_MACHINE)
+    optimize_module(llvm_mod, BUILD_TARGET_MACHINE, opt_level)
+    with open(object_path, 'wb') as f:
+        f.write(emit_object(llvm_mod, BUILD_TARGET_MACHINE))
+
+
+def build_objects(tasks: List[tuple], target_machine, jobs: int):
+    global BUILD_TARGET_MACHINE
+    # Imported here, where it is used: multiprocessing alone doubles the import time of this module
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Workers are forked; where fork is unavailable the objects are built here
+    if jobs <= 1 or len(tasks) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        BUILD_TARGET_MACHINE = target_machine
+        for task in tasks:
+            build_object(task)
+        return
+    workers = min(jobs, len(tasks))
+    with instrument.phase("build_workers"):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=initialize_build_worker) as pool:
+            # Several small tasks per message, but enough messages to balance
+            list(pool.map(build_object, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+
+def compile_units(ast: File, target_machine, output_path: str, opt_level: str, linker: str,
+                  cache: Optional[CompileCache] = None, jobs: int = 1, **options: str) -> UnitReport:
+    # `ast` has been through optimize_ast. With a cache, every unit is an
+    # object of its own, looked up under a key that includes `options`;
+    # without one, the units are grouped into one object per job. The objects
+    # are built on `jobs` worker processes.
+    global BUILD_STATE
+    import tempfile
+    from backend import link_executable
+
+    units = find_units(ast)
+    symbols = {unit.function: unit.symbol for unit in units}
+    unit_slots = {unit.let.slot: unit.function for unit in units}
+
+    # (report names, cache key, unit indices, internal unit indices) per object
+    pending: List[tuple] = []
+    if cache is None:
+        pending.append(([MAIN_UNIT], None, None, ()))
+        parts = partition(units, jobs) if units else []
+        for indices, local in zip(parts, local_units(ast, units, parts)):
+            pending.append(([units[index].symbol for index in indices], None, indices, local))
+    else:
+        # The top level only sees the units' signatures; a unit also sees
+        # those of the units it captures
+        signatures = {unit.function: signature(unit) for unit in units}
+        options = dict(options, opt_level=opt_level)
+        pending.append(([MAIN_UNIT], unit_key([ast.frame_size, ast.expression], MAIN_UNIT, signatures, **options),
+                        None, ()))
+        for index, unit in enumerate(units):
+            captured = {unit_slots[outer]: signatures[unit_slots[outer]] for outer, _ in unit.function.captures}
+            pending.append(([unit.symbol], unit_key(unit.function, unit.symbol, captured, **options), (index,), ()))
+
+    report = UnitReport([], [])
+    with tempfile.TemporaryDirectory(prefix="clownhead-") as tmpdir:
+        object_paths = [os.path.join(tmpdir, f"unit{i}.o") for i in range(len(pending))]
+        hits = [False] * len(pending)
+        if cache is not None:
+            # A hit is already linked or copied into tmpdir, so a concurrent
+            # build evicting it before link_executable does not matter
+            with instrument.phase("cache_lookup"):
+                hits = cache.fetch_many([(key, path) for (_, key, _, _), path in zip(pending, object_paths)],
+                                        link=True)
+        tasks = []
+        for (names, _, indices, local), object_path, hit in zip(pending, object_paths, hits):
+            (report.reused if hit else report.compiled).extend(names)
+            if not hit:
+                tasks.append((indices, local, object_path))
+
+        BUILD_STATE = (ast, units, symbols, unit_slots, opt_level)
+        try:
+            build_objects(tasks, target_machine, jobs)
+        finally:
+            BUILD_STATE = None
+
+        if cache is not None:
+            with instrument.phase("cache_store"):
+                cache.store_many([(key, path) for (_, key, _, _), path, hit in zip(pending, object_paths, hits)
+                                  if not hit])
+        link_executable(object_paths, output_path, linker)
+
+    if instrument.ENABLED:
+        instrument.count("incremental.reused", len(report.reused))
+        instrument.count("incremental.compiled", len(report.compiled))
+    return report
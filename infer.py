@@ -0,0 +1,297 @@
+from typing import Dict, List, Optional, Set, Tuple as Pair, Union
+
+from my_ast import Binary, BinaryOp, Bool, Call, File, First, Function, If, Int, Let, Print, Second, Str, Term, Tuple, Var
+
+# Flow-based type inference. Every expression gets one of the types below, or
+# None while nothing has flowed into it yet. A function that is only called
+# directly takes the join of the argument types at its call sites as parameter
+# types; one used as a value can be called from anywhere, so its parameters
+# are Dynamic. Codegen keeps values of a known type in their native
+# representation and only boxes them into tagged words where they meet
+# Dynamic code.
+
+INT = "Int"
+BOOL = "Bool"
+STR = "Str"
+TUPLE = "Tuple"
+CLOSURE = "Closure"
+DYNAMIC = "Dynamic"
+
+# A Function node stands for a function known at compile time, which codegen
+# calls directly. Wherever it is used as a value it becomes a Closure.
+Value = Union[str, Function, None]
+
+BOOL_RESULTS = {BinaryOp.Eq, BinaryOp.Neq, BinaryOp.Lt, BinaryOp.Gt, BinaryOp.Lte, BinaryOp.Gte,
+                BinaryOp.And, BinaryOp.Or}
+
+MISSING = object()
+
+
+def join(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+    return DYNAMIC
+
+
+def binary_type(op: BinaryOp, lhs: Optional[str], rhs: Optional[str]) -> Optional[str]:
+    if op in BOOL_RESULTS:
+        return BOOL
+    if op != BinaryOp.Add:
+        return INT
+    if lhs is None or rhs is None:
+        return None
+    if lhs == INT and rhs == INT:
+        return INT
+    # Concatenation if it succeeds at all
+    if STR in (lhs, rhs):
+        return STR
+    return DYNAMIC
+
+
+def free_variables(node: Function) -> List[str]:
+    # Names the body reads from enclosing scopes, in order of first use
+    bound: Dict[str, int] = {}
+    names: Dict[str, None] = {}
+    collect_free_variables(node, bound, names)
+    return list(names)
+
+
+def collect_free_variables(node, bound: Dict[str, int], names: Dict[str, None]):
+    # `bound` counts the enclosing bindings of each name inside the function
+    def bind(name: str):
+        bound[name] = bound.get(name, 0) + 1
+
+    def unbind(name: str):
+        bound[name] -= 1
+        if not bound[name]:
+            del bound[name]
+
+    if isinstance(node, Var):
+        if node.text not in bound:
+            names.setdefault(node.text)
+    elif isinstance(node, Function):
+        inner = [param.text for param in node.parameters] + ([node.name] if node.name else [])
+        for name in inner:
+            bind(name)
+        collect_free_variables(node.value, bound, names)
+        for name in inner:
+            unbind(name)
+    elif isinstance(node, Let):
+        collect_free_variables(node.value, bound, names)
+        bind(node.name.text)
+        collect_free_variables(node.next, bound, names)
+        unbind(node.name.text)
+    elif isinstance(node, Binary):
+        collect_free_variables(node.lhs, bound, names)
+        collect_free_variables(node.rhs, bound, names)
+    elif isinstance(node, If):
+        collect_free_variables(node.condition, bound, names)
+        collect_free_variables(node.then, bound, names)
+        collect_free_variables(node.otherwise, bound, names)
+    elif isinstance(node, Call):
+        collect_free_variables(node.callee, bound, names)
+        for arg in node.arguments:
+            collect_free_variables(arg, bound, names)
+    elif isinstance(node, (Print, First, Second)):
+        collect_free_variables(node.value, bound, names)
+    elif isinstance(node, Tuple):
+        collect_free_variables(node.first, bound, names)
+        collect_free_variables(node.second, bound, names)
+
+
+class Frame:
+    def __init__(self, parent: Optional['Frame'], function: Optional[Function]):
+        self.parent = parent
+        # The function whose body this frame is, None for the top level
+        self.function = function
+        self.names: Dict[str, Value] = {}
+
+    def find(self, name: str):
+        # Returns the value bound to `name` and whether a function boundary was crossed
+        frame, crossed = self, False
+        while frame is not None:
+            value = frame.names.get(name, MISSING)
+            if value is not MISSING:
+                return value, crossed
+            crossed = crossed or frame.function is not None
+            frame = frame.parent
+        return MISSING, crossed
+
+
+class Inference:
+    def __init__(self):
+        self.params: Dict[Function, List[Optional[str]]] = {}
+        self.results: Dict[Function, Optional[str]] = {}
+        self.free: Dict[Function, List[str]] = {}
+        # Whether a function needs a closure object for its free variables
+        self.captures: Dict[Function, bool] = {}
+        self.first_class: Set[Function] = set()
+        # Free variables as seen where each function is defined, so its body
+        # can be visited again on its own
+        self.scopes: Dict[Function, Frame] = {}
+        # Functions (None for the top level) to visit again when a callee's result changes
+        self.callers: Dict[Function, Set[Optional[Function]]] = {}
+        self.pending: List[Optional[Function]] = []
+        self.queued: Set[Optional[Function]] = set()
+        # Type of each Binary operand as of the last visit of its body
+        self.operands: Dict[Term, Optional[str]] = {}
+
+    def schedule(self, owner: Optional[Function]):
+        if owner not in self.queued:
+            self.queued.add(owner)
+            self.pending.append(owner)
+
+    def result_changed(self, function: Function):
+        for caller in self.callers.get(function, ()):
+            self.schedule(caller)
+
+    def box(self, value: Value) -> Optional[str]:
+        if isinstance(value, Function):
+            if value not in self.first_class:
+                self.first_class.add(value)
+                self.schedule(value)
+                self.result_changed(value)
+            return CLOSURE
+        return value
+
+    def result_type(self, function: Function) -> Optional[str]:
+        result = self.results.get(function)
+        # Closures are called through a uniform word signature
+        if function in self.first_class and result not in (None, INT):
+            return DYNAMIC
+        return result
+
+    def lookup(self, name: str, frame: Frame) -> Value:
+        value, crossed = frame.find(name)
+        if value is MISSING:
+            return DYNAMIC
+        if crossed and isinstance(value, Function) and self.captures[value]:
+            # Closures are copied into the closures that use them as words
+            return self.box(value)
+        return value
+
+    def define(self, node: Function, frame: Frame):
+        if node not in self.captures:
+            self.free[node] = free_variables(node)
+            # Functions without captures are referenced directly by nested ones
+            self.captures[node] = any(not isinstance(value, Function) or self.captures[value]
+                                      for value in (frame.find(name)[0] for name in self.free[node]))
+        scope = Frame(None, None)
+        for name in self.free[node]:
+            value, _ = frame.find(name)
+            if value is not MISSING:
+                scope.names[name] = value
+        self.scopes[node] = scope
+        self.visit_function(node)
+
+    def visit_function(self, node: Function):
+        params = self.params.setdefault(node, [None] * len(node.parameters))
+        inner = Frame(self.scopes[node], node)
+        if node.name:
+            inner.names[node.name] = node
+        first_class = node in self.first_class
+        for param, param_type in zip(node.parameters, params):
+            inner.names[param.text] = DYNAMIC if first_class else param_type
+
+        body = self.box(self.visit(node.value, inner))
+        result = join(self.results.get(node), body)
+        if result != self.results.get(node):
+            self.results[node] = result
+            self.result_changed(node)
+
+    def call(self, callee: Value, args: List[Optional[str]], owner: Optional[Function]) -> Optional[str]:
+        if not isinstance(callee, Function) or len(args) != len(callee.parameters):
+            self.box(callee)
+            return DYNAMIC
+        self.callers.setdefault(callee, set()).add(owner)
+        params = self.params.setdefault(callee, [None] * len(args))
+        for i, arg in enumerate(args):
+            param = join(params[i], arg)
+            if param != params[i]:
+                params[i] = param
+                self.schedule(callee)
+        return self.result_type(callee)
+
+    def visit(self, node: Term, frame: Frame) -> Value:
+        if isinstance(node, Int):
+            return INT
+        elif isinstance(node, Str):
+            return STR
+        elif isinstance(node, Bool):
+            return BOOL
+        elif isinstance(node, Var):
+            return self.lookup(node.text, frame)
+        elif isinstance(node, Function):
+            self.define(node, frame)
+            return node
+        elif isinstance(node, Let):
+            value = self.visit(node.value, frame)
+            name = node.name.text
+            shadowed = frame.names.get(name, MISSING)
+            frame.names[name] = value
+            result = self.visit(node.next, frame)
+            if shadowed is MISSING:
+                del frame.names[name]
+            else:
+                frame.names[name] = shadowed
+            return result
+        elif isinstance(node, If):
+            self.box(self.visit(node.condition, frame))
+            then = self.box(self.visit(node.then, frame))
+            return join(then, self.box(self.visit(node.otherwise, frame)))
+        elif isinstance(node, Binary):
+            lhs = self.operands[node.lhs] = self.box(self.visit(node.lhs, frame))
+            rhs = self.operands[node.rhs] = self.box(self.visit(node.rhs, frame))
+            return binary_type(node.op, lhs, rhs)
+        elif isinstance(node, Call):
+            callee = self.visit(node.callee, frame)
+            args = [self.box(self.visit(arg, frame)) for arg in node.arguments]
+            return self.call(callee, args, frame.function)
+        elif isinstance(node, Print):
+            # Print evaluates to its argument, but prints it as a value
+            value = self.visit(node.value, frame)
+            self.box(value)
+            return value
+        elif isinstance(node, Tuple):
+            self.box(self.visit(node.first, frame))
+            self.box(self.visit(node.second, frame))
+            return TUPLE
+        elif isinstance(node, (First, Second)):
+            self.box(self.visit(node.value, frame))
+            return DYNAMIC
+        return DYNAMIC
+
+
+def run_inference(ast: File) -> Pair[Inference, int]:
+    # Runs to a fixed point; also returns how many bodies were visited
+    inference = Inference()
+    inference.schedule(None)
+    visits = 0
+    while inference.pending:
+        owner = inference.pending.pop()
+        inference.queued.discard(owner)
+        if owner is None:
+            inference.visit(ast.expression, Frame(None, None))
+        else:
+            inference.visit_function(owner)
+        visits += 1
+    return inference, visits
+
+
+def infer_types(ast: File) -> int:
+    inference, visits = run_inference(ast)
+    for node, params in inference.params.items():
+        first_class = node in inference.first_class
+        # A parameter nothing flows into belongs to a function that never runs
+        node.param_types = [DYNAMIC if first_class or param is None else param for param in params]
+        node.result_type = inference.result_type(node) or DYNAMIC
+    return visits
+
+
+def infer_operand_types(ast: File) -> Dict[Term, Optional[str]]:
+    # The type each Binary operand has whenever its evaluation succeeds; None
+    # for operands of code nothing reaches
+    inference, _ = run_inference(ast)
+    return inference.operands
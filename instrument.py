@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+# Hot paths check this flag before touching STATS, so a disabled build only
+# pays for one global lookup per instrumentation point.
+ENABLED = False
+STATS: Optional['Stats'] = None
+
+_DISABLED_PHASE = nullcontext()
+
+
+class Stats:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.timers: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.maxima: Dict[str, int] = {}
+        # (name, start, duration) in seconds since origin, for the trace export
+        self.events: List[tuple] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.timers[name] = self.timers.get(name, 0.0) + (end - start)
+            self.events.append((name, start - self.origin, end - start))
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_max(self, name: str, value: int):
+        if value > self.maxima.get(name, value - 1):
+            self.maxima[name] = value
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "timers_ms": {name: round(elapsed * 1000, 3) for name, elapsed in self.timers.items()},
+            "counters": dict(sorted(self.counters.items())),
+            "maxima": dict(sorted(self.maxima.items())),
+        }
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        # Complete ("X") events nest by time range in chrome://tracing and Perfetto
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [{"name": name, "ph": "X", "ts": round(start * 1e6, 3), "dur": round(duration * 1e6, 3),
+                   "pid": pid, "tid": tid, "cat": "phase"}
+                  for name, start, duration in self.events]
+        counters = {**self.counters, **{f"{name}.max": value for name, value in self.maxima.items()}}
+        events.append({"name": "counters", "ph": "C", "ts": round((time.perf_counter() - self.origin) * 1e6, 3),
+                       "pid": pid, "tid": tid, "args": counters})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def format(self) -> str:
+        lines = ["Phase timings:"]
+        for name, elapsed in self.timers.items():
+            lines.append(f"  {name:32} {elapsed * 1000:10.3f} ms")
+        if self.counters or self.maxima:
+            lines.append("Counters:")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"  {name:32} {value:10}")
+            for name, value in sorted(self.maxima.items()):
+                lines.append(f"  {name + ' (max)':32} {value:10}")
+        return "\n".join(lines)
+
+
+def enable() -> Stats:
+    global ENABLED, STATS
+    STATS = Stats()
+    ENABLED = True
+    return STATS
+
+
+def disable():
+    global ENABLED, STATS
+    ENABLED = False
+    STATS = None
+
+
+def phase(name: str):
+    if not ENABLED:
+        return _DISABLED_PHASE
+    return STATS.phase(name)
+
+
+def count(name: str, amount: int = 1):
+    if ENABLED:
+        STATS.count(name, amount)
+
+
+def record_max(name: str, value: int):
+    if ENABLED:
+        STATS.record_max(name, value)
+
+
+def write_json(path: str, data: Dict[str, Any]):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
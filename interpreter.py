@@ -0,0 +1,393 @@
+import sys
+from typing import Callable, Dict, List, Optional, Set, TextIO
+
+from my_ast import Binary, Bool, Call, File, First, Function, If, Int, Let, Print, Second, Str, Term, Tuple, Var
+from optimize import BINARY_OP_EVAL, RinhaError, is_pure, type_name
+from purity import is_recursive
+
+# In --auto mode, programs up to this many nodes that never recurse are
+# interpreted; anything bigger or with a loop is worth LLVM's startup cost.
+INTERPRETER_NODE_LIMIT = 2000
+
+# Every node is compiled ahead of time into a Python closure taking the
+# current frame, so evaluation never dispatches on node types.
+Code = Callable[[list], object]
+
+
+class Closure:
+    __slots__ = ("body", "arity", "padding", "captured", "name")
+
+    def __init__(self, body: Code, arity: int, padding: tuple, captured: list, name: Optional[str]):
+        self.body = body
+        self.arity = arity
+        self.padding = padding
+        self.captured = captured
+        self.name = name
+
+
+class Scope:
+    # Frame layout of one function: its parameters, then the running Closure
+    # (for self calls and captured values), then one slot per Let.
+    def __init__(self, parent: Optional['Scope'], parameters: List[str], name: Optional[str]):
+        self.parent = parent
+        self.name = name
+        self.locals: Dict[str, int] = {param: i for i, param in enumerate(parameters)}
+        self.self_slot = len(parameters)
+        self.size = len(parameters) + 1
+        self.captures: Dict[str, int] = {}
+        self.capture_reads: List[Code] = []
+
+    def allocate(self) -> int:
+        self.size += 1
+        return self.size - 1
+
+    def resolve(self, name: str) -> Code:
+        slot = self.locals.get(name)
+        if slot is not None:
+            return lambda frame: frame[slot]
+        self_slot = self.self_slot
+        if name == self.name:
+            return lambda frame: frame[self_slot]
+
+        index = self.captures.get(name)
+        if index is None:
+            if self.parent is None:
+                def unbound(frame):
+                    raise RinhaError(f"Unbound variable '{name}'")
+                return unbound
+            # Values are immutable, so closures capture them by value when created
+            index = len(self.capture_reads)
+            self.captures[name] = index
+            self.capture_reads.append(self.parent.resolve(name))
+        return lambda frame: frame[self_slot].captured[index]
+
+
+def format_value(value) -> str:
+    if type(value) is bool:
+        return "true" if value else "false"
+    if type(value) is tuple:
+        return f"({format_value(value[0])}, {format_value(value[1])})"
+    if type(value) is Closure:
+        return "<#closure>"
+    return str(value)
+
+
+def compile_node(node: Term, scope: Scope, write: Callable[[str], object]) -> Code:
+    if isinstance(node, (Int, Str, Bool)):
+        constant = node.value
+        return lambda frame: constant
+
+    elif isinstance(node, Var):
+        return scope.resolve(node.text)
+
+    elif isinstance(node, Binary):
+        evaluate = BINARY_OP_EVAL[node.op]
+        lhs = compile_node(node.lhs, scope, write)
+        if isinstance(node.rhs, (Int, Str, Bool)):
+            # `n - 1`, `n < 2`... skip one closure call per evaluation
+            rhs_constant = node.rhs.value
+            return lambda frame: evaluate(lhs(frame), rhs_constant)
+        rhs = compile_node(node.rhs, scope, write)
+        return lambda frame: evaluate(lhs(frame), rhs(frame))
+
+    elif isinstance(node, If):
+        condition = compile_node(node.condition, scope, write)
+        then = compile_node(node.then, scope, write)
+        otherwise = compile_node(node.otherwise, scope, write)
+
+        def run_if(frame):
+            value = condition(frame)
+            if value is True:
+                return then(frame)
+            if value is False:
+                return otherwise(frame)
+            raise RinhaError(f"If condition must be a Bool, got {type_name(value)}")
+        return run_if
+
+    elif isinstance(node, Let):
+        return compile_let(node, scope, write, compile_node)
+
+    elif isinstance(node, Function):
+        return compile_function(node, scope, write)
+
+    elif isinstance(node, Call):
+        return compile_call(node, scope, write)
+
+    elif isinstance(node, Print):
+        value = compile_node(node.value, scope, write)
+
+        def run_print(frame):
+            result = value(frame)
+            write(format_value(result) + "\n")
+            return result
+        return run_print
+
+    elif isinstance(node, Tuple):
+        first = compile_node(node.first, scope, write)
+        second = compile_node(node.second, scope, write)
+        return lambda frame: (first(frame), second(frame))
+
+    elif isinstance(node, (First, Second)):
+        value = compile_node(node.value, scope, write)
+        index = 0 if isinstance(node, First) else 1
+        kind = type(node).__name__.lower()
+
+        def run_projection(frame):
+            pair = value(frame)
+            if type(pair) is not tuple:
+                raise RinhaError(f"Cannot take {kind} of {type_name(pair)}")
+            return pair[index]
+        return run_projection
+
+    raise RinhaError(f"Unsupported node type: {type(node).__name__}")
+
+
+def compile_let(node: Let, scope: Scope, write: Callable[[str], object], compile_next) -> Code:
+    value = compile_node(node.value, scope, write)
+    slot = scope.allocate()
+    name = node.name.text
+    shadowed = scope.locals.get(name)
+    scope.locals[name] = slot
+    next_expr = compile_next(node.next, scope, write)
+    if shadowed is None:
+        del scope.locals[name]
+    else:
+        scope.locals[name] = shadowed
+
+    def run_let(frame):
+        frame[slot] = value(frame)
+        return next_expr(frame)
+    return run_let
+
+
+# Returned by a self tail call once it has stored its arguments in the frame,
+# telling the function's loop to run the body again instead of recursing.
+TAIL_CALL = object()
+
+
+def is_self_call(node: Term, scope: Scope) -> bool:
+    # The name may be shadowed by a parameter or a Let in between
+    return (isinstance(node, Call) and isinstance(node.callee, Var) and scope.name is not None
+            and node.callee.text == scope.name and node.callee.text not in scope.locals
+            and len(node.arguments) == scope.self_slot)
+
+
+def has_self_tail_calls(node: Term, scope: Scope) -> bool:
+    if isinstance(node, If):
+        return has_self_tail_calls(node.then, scope) or has_self_tail_calls(node.otherwise, scope)
+    if isinstance(node, Let):
+        if node.name.text == scope.name:
+            return False
+        return has_self_tail_calls(node.next, scope)
+    return is_self_call(node, scope) or accumulating_self_call(node, scope) is not None
+
+
+def accumulating_self_call(node: Term, scope: Scope) -> Optional[Call]:
+    # `x op f(...)` evaluates x first anyway, but with calls in x (as in fib)
+    # the recursion is a tree and a loop saves nothing; in `f(...) op x`, x is
+    # only moved before the call if reading it is harmless
+    if not isinstance(node, Binary):
+        return None
+    if is_self_call(node.rhs, scope) and is_pure(node.lhs):
+        return node.rhs
+    if is_self_call(node.lhs, scope) and isinstance(node.rhs, (Int, Str, Bool, Var)):
+        return node.lhs
+    return None
+
+
+def compile_tail(node: Term, scope: Scope, write: Callable[[str], object], pending_slot: int) -> Code:
+    # Compiles `node` in tail position of the function owning `scope`: a
+    # self call stores its arguments and returns TAIL_CALL, and `x op f(...)`
+    # also pushes the pending operation onto the list in `pending_slot`,
+    # which the loop in compile_function folds into the final result.
+    if isinstance(node, If):
+        condition = compile_node(node.condition, scope, write)
+        then = compile_tail(node.then, scope, write, pending_slot)
+        otherwise = compile_tail(node.otherwise, scope, write, pending_slot)
+
+        def run_if(frame):
+            value = condition(frame)
+            if value is True:
+                return then(frame)
+            if value is False:
+                return otherwise(frame)
+            raise RinhaError(f"If condition must be a Bool, got {type_name(value)}")
+        return run_if
+
+    elif isinstance(node, Let):
+        return compile_let(node, scope, write,
+                           lambda next_node, scope, write: compile_tail(next_node, scope, write, pending_slot))
+
+    elif is_self_call(node, scope):
+        return compile_tail_call(node, scope, write)
+
+    call = accumulating_self_call(node, scope)
+    if call is None:
+        return compile_node(node, scope, write)
+    evaluate = BINARY_OP_EVAL[node.op]
+    if call is node.rhs:
+        other = compile_node(node.lhs, scope, write)
+        combine = evaluate
+    else:
+        other = compile_node(node.rhs, scope, write)
+
+        def combine(operand, result):
+            return evaluate(result, operand)
+    jump = compile_tail_call(call, scope, write)
+
+    def run_accumulate(frame):
+        operand = other(frame)
+        pending = frame[pending_slot]
+        if pending is None:
+            pending = frame[pending_slot] = []
+        pending.append(combine)
+        pending.append(operand)
+        return jump(frame)
+    return run_accumulate
+
+
+def compile_tail_call(node: Call, scope: Scope, write: Callable[[str], object]) -> Code:
+    arguments = [compile_node(arg, scope, write) for arg in node.arguments]
+    if len(arguments) == 1:
+        (arg,) = arguments
+
+        def run_tail_call(frame):
+            frame[0] = arg(frame)
+            return TAIL_CALL
+        return run_tail_call
+
+    count = len(arguments)
+
+    def run_tail_call(frame):
+        # Every argument is evaluated before any parameter is overwritten
+        frame[:count] = [arg(frame) for arg in arguments]
+        return TAIL_CALL
+    return run_tail_call
+
+
+def compile_function(node: Function, scope: Scope, write: Callable[[str], object]) -> Code:
+    inner = Scope(scope, [param.text for param in node.parameters], node.name)
+    if has_self_tail_calls(node.value, inner):
+        body = compile_loop(node, inner, write)
+    else:
+        body = compile_node(node.value, inner, write)
+    arity = len(node.parameters)
+    padding = (None,) * (inner.size - arity - 1)
+    capture_reads = inner.capture_reads
+    name = node.name
+
+    if not capture_reads:
+        return lambda frame: Closure(body, arity, padding, [], name)
+    return lambda frame: Closure(body, arity, padding, [read(frame) for read in capture_reads], name)
+
+
+def compile_loop(node: Function, scope: Scope, write: Callable[[str], object]) -> Code:
+    # Self tail calls run the body again in the same frame, so loops written
+    # as recursion do not grow the Python stack
+    pending_slot = scope.allocate()
+    body = compile_tail(node.value, scope, write, pending_slot)
+
+    def run_loop(frame):
+        result = body(frame)
+        while result is TAIL_CALL:
+            result = body(frame)
+        pending = frame[pending_slot]
+        if pending is not None:
+            # Innermost operation first, as the recursion would have returned
+            for i in range(len(pending) - 2, -1, -2):
+                result = pending[i](pending[i + 1], result)
+        return result
+    return run_loop
+
+
+def compile_call(node: Call, scope: Scope, write: Callable[[str], object]) -> Code:
+    callee = compile_node(node.callee, scope, write)
+    arguments = [compile_node(arg, scope, write) for arg in node.arguments]
+    count = len(arguments)
+
+    def check(closure):
+        if type(closure) is not Closure:
+            raise RinhaError(f"Cannot call a value of type {type_name(closure)}")
+        if closure.arity != count:
+            raise RinhaError(f"Function '{closure.name or '<anonymous>'}' expects {closure.arity} arguments, "
+                             f"got {count}")
+
+    # Most calls pass one or two arguments; building those frames directly
+    # avoids a list comprehension per call.
+    if count == 1:
+        (arg,) = arguments
+
+        def run_call(frame):
+            closure = callee(frame)
+            check(closure)
+            return closure.body([arg(frame), closure, *closure.padding])
+    elif count == 2:
+        first, second = arguments
+
+        def run_call(frame):
+            closure = callee(frame)
+            check(closure)
+            return closure.body([first(frame), second(frame), closure, *closure.padding])
+    else:
+        def run_call(frame):
+            closure = callee(frame)
+            check(closure)
+            new_frame = [arg(frame) for arg in arguments]
+            new_frame.append(closure)
+            new_frame.extend(closure.padding)
+            return closure.body(new_frame)
+    return run_call
+
+
+def compile_program(ast: File, out: Optional[TextIO] = None) -> Callable[[], object]:
+    write = (out or sys.stdout).write
+    scope = Scope(None, [], None)
+    body = compile_node(ast.expression, scope, write)
+    size = scope.size
+    return lambda: body([None] * size)
+
+
+def interpret(ast: File, out: Optional[TextIO] = None):
+    # Every Rinha call nests a few Python calls, so deep recursion needs the
+    # caller to raise the recursion limit (see main.call_with_deep_stack).
+    return compile_program(ast, out)()
+
+
+def program_shape(ast: File, limit: int = INTERPRETER_NODE_LIMIT):
+    # Counts nodes (stopping past `limit`) and builds the call graph of Let-bound functions
+    count = 0
+    call_graph: Dict[Optional[str], Set[str]] = {}
+    pending = [(ast.expression, None)]
+    while pending and count <= limit:
+        node, owner = pending.pop()
+        count += 1
+        if isinstance(node, Let):
+            if isinstance(node.value, Function):
+                pending.append((node.value, node.name.text))
+            else:
+                pending.append((node.value, owner))
+            pending.append((node.next, owner))
+        elif isinstance(node, Function):
+            pending.append((node.value, owner))
+        elif isinstance(node, Binary):
+            pending.extend(((node.lhs, owner), (node.rhs, owner)))
+        elif isinstance(node, If):
+            pending.extend(((node.condition, owner), (node.then, owner), (node.otherwise, owner)))
+        elif isinstance(node, Call):
+            if isinstance(node.callee, Var):
+                call_graph.setdefault(owner, set()).add(node.callee.text)
+            pending.append((node.callee, owner))
+            pending.extend((arg, owner) for arg in node.arguments)
+        elif isinstance(node, (Print, First, Second)):
+            pending.append((node.value, owner))
+        elif isinstance(node, Tuple):
+            pending.extend(((node.first, owner), (node.second, owner)))
+    return count, call_graph
+
+
+def prefers_interpreter(ast: File) -> bool:
+    count, call_graph = program_shape(ast)
+    if count > INTERPRETER_NODE_LIMIT:
+        return False
+    # Without recursion the run time is bounded by the program size
+    return not any(is_recursive(name, call_graph) for name in call_graph if name is not None)
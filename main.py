@@ -1,15 +1,80 @@
-import json
-from my_ast import File, Loc, Parameter, Function, If, Print, Let, Binary, Var, Call, Int, BinaryOp, Str
-from codegen import generate_code
-from typing import Dict, Any
-import subprocess
-from llvmlite import binding
 import os
 import sys
 
+# With a prewarmed server (forkserver.py) listening on $CLOWNHEAD_FORKSERVER,
+# the whole command runs in a fork of it. Checked before any other import,
+# since the client needs none of them.
+if __name__ == "__main__" and os.environ.get("CLOWNHEAD_FORKSERVER"):
+    from forkserver import forward
+    forwarded = forward(os.environ["CLOWNHEAD_FORKSERVER"], sys.argv)
+    if forwarded is not None:
+        sys.exit(forwarded)
+
+import json
+import instrument
+from my_ast import File, Loc, Parameter, Function, If, Print, Let, Binary, Var, Call, Int, Bool, BinaryOp, Str
+from my_ast import First, Second, Tuple as TupleTerm
+from optimize import RinhaError, fold_constants
+from purity import mark_memoizable_functions
+from cse import eliminate_common_subexpressions
+from escape import mark_escaping_allocations
+from infer import infer_types
+from resolve import resolve_names
+from interpreter import interpret, prefers_interpreter
+from cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE, CompileCache, cache_key
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+import argparse
+import shutil
+import threading
+import time
+
+# codegen and backend pull in llvmlite, which takes longer to import than most
+# interpreted programs take to run, so they are only imported on the LLVM path.
+# So are the modules only executables need (incremental brings multiprocessing
+# along) and logging, which nothing on the interpreter path writes to.
+if TYPE_CHECKING:
+    from incremental import UnitReport
+OPT_LEVEL_CHOICES = ["0", "1", "2", "3", "s", "z"]
+
+# json's C decoder recurses once per nesting level, and so does the interpreter
+# per Rinha call. Deep inputs run on a worker thread with a large stack and a
+# raised recursion limit.
+DEEP_STACK_SIZE = 1 << 30
+DEEP_RECURSION_LIMIT = 10_000_000
+
+def call_with_deep_stack(func, *args) -> Any:
+    result: Dict[str, Any] = {}
+
+    def run():
+        try:
+            result["value"] = func(*args)
+        except BaseException as e:
+            result["error"] = e
+
+    old_limit = sys.getrecursionlimit()
+    old_stack_size = threading.stack_size(DEEP_STACK_SIZE)
+    sys.setrecursionlimit(DEEP_RECURSION_LIMIT)
+    try:
+        worker = threading.Thread(target=run)
+        worker.start()
+        worker.join()
+    finally:
+        threading.stack_size(old_stack_size)
+        sys.setrecursionlimit(old_limit)
+
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+def load_json(text: str, object_hook=None) -> Any:
+    try:
+        return json.loads(text, object_hook=object_hook)
+    except RecursionError:
+        return call_with_deep_stack(lambda: json.loads(text, object_hook=object_hook))
+
 def parse_ast_from_json(filename: str) -> Dict[str, Any]:
-    with open(filename, 'r') as f:
-        return json.load(f)
+    with instrument.phase("json_parse"), open(filename, 'r') as f:
+        return load_json(f.read())
 
 def convert_operator(op_str: str) -> BinaryOp:
     op_mapping = {
@@ -33,99 +98,450 @@ def convert_operator(op_str: str) -> BinaryOp:
     
     return op_mapping[op_str]
 
-def convert_expression(data: Dict[str, Any]) -> Any:
+def expression_children(data: Dict[str, Any]) -> List[Any]:
+    kind = data["kind"]
+    if kind == "Let":
+        return [data["value"], data["next"]]
+    elif kind == "Function":
+        return [data["value"]]
+    elif kind == "If":
+        return [data["condition"], data["then"], data["otherwise"]]
+    elif kind == "Binary":
+        return [data["lhs"], data["rhs"]]
+    elif kind == "Call":
+        return [data["callee"], *data["arguments"]]
+    elif kind in ("Print", "First", "Second"):
+        return [data["value"]]
+    elif kind == "Tuple":
+        return [data["first"], data["second"]]
+    elif kind in ("Var", "Int", "Bool", "Str"):
+        return []
+    else:
+        raise ValueError(f"Unknown node type: {kind}")
+
+def build_expression(data: Dict[str, Any], children: List[Any]) -> Any:
+    # `children` are the already converted nodes listed by expression_children
     kind = data["kind"]
-    location = convert_location(data["location"])
+    location = as_location(data["location"])
 
     if kind == "Let":
-        name_text = data["name"]["text"]
-        name = Parameter(name_text, convert_location(data["name"]["location"]))
-        value_data = data["value"]
-        if value_data["kind"] == "Function":
-            parameters = [Parameter(param["text"], convert_location(param["location"])) for param in value_data["parameters"]]
-            value_expr = convert_expression(value_data["value"])
-            value = Function(parameters, value_expr, location, name=name_text)
-        else:
-            value = convert_expression(value_data)
-        next_expr = convert_expression(data["next"])
+        name = as_parameter(data["name"])
+        value, next_expr = children
+        if isinstance(value, Function):
+            value.name = name.text
+            value.location = location
         return Let(name, value, next_expr, location)
 
     elif kind == "Function":
         # Since we handle named functions in the Let node, this block will now only deal with anonymous functions
-        parameters = [Parameter(param["text"], convert_location(param["location"])) for param in data["parameters"]]
-        value = convert_expression(data["value"])
-        return Function(parameters, value, location, None)
+        parameters = [as_parameter(param) for param in data["parameters"]]
+        return Function(parameters, children[0], location, None)
 
     elif kind == "If":
-        condition = convert_expression(data["condition"])
-        then_expr = convert_expression(data["then"])
-        otherwise_expr = convert_expression(data["otherwise"])
+        condition, then_expr, otherwise_expr = children
         return If(condition, then_expr, otherwise_expr, location)
 
     elif kind == "Binary":
-        lhs = convert_expression(data["lhs"])
-        rhs = convert_expression(data["rhs"])
+        lhs, rhs = children
         op = convert_operator(data["op"])
         return Binary(lhs, rhs, op, location)
 
     elif kind == "Call":
-        callee = convert_expression(data["callee"])
-        arguments = [convert_expression(arg) for arg in data["arguments"]]
-        return Call(callee, arguments, location)
+        return Call(children[0], children[1:], location)
 
     elif kind == "Var":
         return Var(data["text"], location)
 
-
     elif kind == "Int":
         return Int(data["value"], location)
 
+    elif kind == "Bool":
+        return Bool(data["value"], location)
+
     elif kind == "Print":
-        value = convert_expression(data["value"])
-        return Print(value, location)
+        return Print(children[0], location)
+
     elif kind == "Str":
-        return Str(value=data["value"], location=convert_location(data["location"]))
+        return Str(value=data["value"], location=location)
 
+    elif kind == "Tuple":
+        first, second = children
+        return TupleTerm(first, second, location)
+
+    elif kind == "First":
+        return First(children[0], location)
+
+    elif kind == "Second":
+        return Second(children[0], location)
 
     else:
         raise ValueError(f"Unknown node type: {kind}")
 
+def convert_expression(data: Dict[str, Any]) -> Any:
+    # Post-order walk with an explicit stack so nesting depth is not bounded
+    # by Python's recursion limit.
+    work = [(data, False)]
+    results: List[Any] = []
+    while work:
+        node, expanded = work.pop()
+        if expanded:
+            count = len(expression_children(node))
+            children = results[len(results) - count:] if count else []
+            del results[len(results) - count:]
+            results.append(build_expression(node, children))
+        else:
+            work.append((node, True))
+            work.extend((child, False) for child in reversed(expression_children(node)))
+    return results[0]
+
 def convert_location(data: Dict[str, Any]) -> Loc:
-    return Loc(data["start"], data["end"], data["filename"])
+    # Interning leaves a single filename string shared by every Loc of a File
+    return Loc(data["start"], data["end"], sys.intern(data["filename"]))
 
-def dict_to_ast(data: Dict[str, Any]) -> File:
-    expression = convert_expression(data["expression"])
-    
-    location = convert_location(data["location"])
+def as_location(value: Any) -> Loc:
+    return value if isinstance(value, Loc) else convert_location(value)
+
+def as_parameter(value: Any) -> Parameter:
+    return value if isinstance(value, Parameter) else Parameter(value["text"], as_location(value["location"]))
+
+def build_file(data: Dict[str, Any], expression: Any) -> File:
+    location = as_location(data["location"])
 
     # Extract the filename from the location data or use a placeholder
     filename = location.filename if location and hasattr(location, "filename") else "unknown_file"
 
     return File(filename, expression, location)
 
-def main():
-    try:
-        filename = "/var/rinha/source.rinha.json"  # Hardcoded path to the input file
-        output_name = os.path.basename(filename).split('.')[0]
+def dict_to_ast(data: Dict[str, Any]) -> File:
+    with instrument.phase("dict_to_ast"):
+        expression = convert_expression(data["expression"])
+        return build_file(data, expression)
 
-        # Convert JSON to AST and then to LLVM IR
-        data = parse_ast_from_json(filename)
-        ast = dict_to_ast(data)
-        mod = generate_code(ast)
+def ast_object_hook(obj: Dict[str, Any]) -> Any:
+    # The decoder closes objects bottom-up, so every child is already converted
+    if "kind" in obj:
+        return build_expression(obj, expression_children(obj))
+    if "filename" in obj:
+        return convert_location(obj)
+    if "text" in obj:
+        return as_parameter(obj)
+    if "expression" in obj:
+        return build_file(obj, obj["expression"])
+    return obj
+
+def read_ast_from_json(filename: str) -> File:
+    # Builds the AST while decoding, without materializing the JSON dict tree
+    with instrument.phase("read_ast"), open(filename, 'r') as f:
+        return load_json(f.read(), object_hook=ast_object_hook)
+
+def default_compiler() -> str:
+    # The runtime (also the JIT's) needs a C compiler; cc where clang is missing
+    return "clang" if shutil.which("clang") or not shutil.which("cc") else "cc"
+
+def add_compile_options(parser: argparse.ArgumentParser):
+    parser.add_argument("-O", dest="opt_level", choices=OPT_LEVEL_CHOICES, default="2",
+                        help="optimization level: 0-3 for speed, s/z for size (default: 2)")
+    parser.add_argument("--time-passes", action="store_true",
+                        help="report per-pass timings and instruction counts before/after optimization")
+    parser.add_argument("--no-memoize", action="store_true",
+                        help="do not add memo tables to pure recursive functions")
+    parser.add_argument("--emit", choices=["exe", "obj", "bc"], default="exe",
+                        help="artifact to produce: linked executable, native object or LLVM bitcode (default: exe)")
+    parser.add_argument("--emit-llvm", action="store_true",
+                        help="also write the optimized LLVM-IR to <output>.ll for debugging")
+    parser.add_argument("--cc", default=default_compiler(),
+                        help="compiler driver that builds the runtime and links executables "
+                             "(default: clang, or cc if clang is not installed)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always recompile instead of reusing cached artifacts")
+    parser.add_argument("--cache-dir", default=os.environ.get("CLOWNHEAD_CACHE_DIR", DEFAULT_CACHE_DIR),
+                        help=f"compile cache directory (default: $CLOWNHEAD_CACHE_DIR or {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="maximum cache size in bytes before least recently used entries are evicted")
+    parser.add_argument("--incremental", action="store_true",
+                        help="compile each top-level function into its own cached object and relink, "
+                             "so only changed functions are recompiled (executables only)")
+    parser.add_argument("--codegen-jobs", type=int, default=1, metavar="N",
+                        help="generate, optimize and emit top-level functions in N processes, as one object each "
+                             "with --incremental or grouped into N objects otherwise (executables only; default: 1)")
+    profile = parser.add_mutually_exclusive_group()
+    profile.add_argument("--profile-generate", metavar="PATH",
+                         help="build an executable that counts branches and function entries and writes the "
+                              "profile to PATH when it exits")
+    profile.add_argument("--profile-use", metavar="PATH",
+                         help="optimize with a profile written by a --profile-generate build of the same program "
+                              "and options")
+    profile.add_argument("--pgo", action="store_true",
+                         help="build with --profile-generate, run the program once to train, then rebuild with "
+                              "--profile-use (executables only)")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="print cache hit/miss counters after compiling")
+    parser.add_argument("--log-level", choices=["debug", "info", "warning", "error"], default="warning",
+                        help="log level for compiler diagnostics on stderr; debug dumps frame layouts (default: warning)")
+
+def configure_logging(level: str):
+    import logging
+    logging.basicConfig(stream=sys.stderr, level=getattr(logging, level.upper()), format="%(name)s: %(message)s")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compile a Rinha JSON AST with LLVM")
+    parser.add_argument("filename", nargs="?", default="/var/rinha/source.rinha.json",
+                        help="path to the JSON AST (default: /var/rinha/source.rinha.json)")
+    run_mode = parser.add_mutually_exclusive_group()
+    run_mode.add_argument("--jit", action="store_true",
+                          help="compile in process with MCJIT and run main directly instead of building an executable")
+    run_mode.add_argument("--interp", action="store_true",
+                          help="run the program with the interpreter, without loading LLVM at all")
+    run_mode.add_argument("--auto", action="store_true",
+                          help="run the program, interpreting small non-recursive programs and using --jit otherwise")
+    add_compile_options(parser)
+    parser.add_argument("--stats", action="store_true",
+                        help="print phase timings and compiler counters to stderr")
+    parser.add_argument("--stats-json", metavar="PATH", help="write phase timings and counters as JSON")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome trace (chrome://tracing, Perfetto) of the compiler phases")
+    args = parser.parse_args(argv)
+    if (args.profile_generate or args.pgo) and (args.jit or args.interp or args.auto or args.emit != "exe"):
+        parser.error("--profile-generate and --pgo build executables")
+    return args
+
+ARTIFACT_SUFFIXES = {"exe": "", "obj": ".o", "bc": ".bc"}
+
+def optimize_ast(ast: File, args: argparse.Namespace) -> File:
+    # -O0 keeps the AST untouched so the IR mirrors the source one-to-one
+    if args.opt_level != "0":
+        with instrument.phase("fold_constants"):
+            ast = fold_constants(ast)
+        if not args.no_memoize:
+            with instrument.phase("memoize_analysis"):
+                mark_memoizable_functions(ast)
+        # After memoization, which it must not take loops away from
+        with instrument.phase("cse"):
+            eliminated, hoisted = eliminate_common_subexpressions(ast)
+            if instrument.ENABLED:
+                instrument.count("cse.eliminated_nodes", eliminated)
+                instrument.count("cse.hoisted_calls", hoisted)
+        with instrument.phase("escape_analysis"):
+            stack_allocated = mark_escaping_allocations(ast)
+            if instrument.ENABLED:
+                instrument.count("escape.stack_allocations", stack_allocated)
+    # Only annotates functions, and the accumulator rewrite depends on it
+    with instrument.phase("type_inference"):
+        visits = infer_types(ast)
+        if instrument.ENABLED:
+            instrument.count("infer.visits", visits)
+    # Last, since folding drops Lets and captures; reports unbound names
+    with instrument.phase("resolve_names"):
+        resolve_names(ast)
+    # Profiles are keyed by the AST as it is now
+    if args.profile_use:
+        from pgo import apply_profile
+        with instrument.phase("apply_profile"):
+            entries = apply_profile(ast, args.profile_use)
+            if instrument.ENABLED:
+                instrument.count("pgo.function_entries", entries)
+    return ast
+
+def run_interpreter(ast: File):
+    start = time.perf_counter()
+    with instrument.phase("interpret"):
+        try:
+            call_with_deep_stack(interpret, ast)
+        except RinhaError as e:
+            # Reported like the runtime's rinha_fail in compiled code
+            sys.stdout.flush()
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.flush()
+    print(f"Interpreter run time: {(time.perf_counter() - start) * 1000:.3f} ms", file=sys.stderr)
+
+def run_jit_mode(ast: File, args: argparse.Namespace):
+    from backend import create_target_machine, format_opt_stats, run_jit
+    from codegen import generate_code
+
+    target_machine = create_target_machine()
+    ast = optimize_ast(ast, args)
+    with instrument.phase("generate_code"):
+        mod = generate_code(ast, target_machine)
+    result = run_jit(mod, target_machine, args.opt_level, args.time_passes, args.cc)
+    if args.time_passes:
+        print(format_opt_stats(result.opt_stats), file=sys.stderr)
+    print(f"JIT compile time: {result.compile_time * 1000:.3f} ms", file=sys.stderr)
+    print(f"JIT run time: {result.run_time * 1000:.3f} ms", file=sys.stderr)
+
+def compile_artifact(ast: File, args: argparse.Namespace, target_machine, output_name: str, output_path: str):
+    from backend import build_executable, emit_bitcode, emit_object, format_opt_stats, optimize_module, parse_module
+    from codegen import generate_code
+
+    ast = optimize_ast(ast, args)
+    with instrument.phase("generate_code"):
+        profile_path = os.path.abspath(args.profile_generate) if args.profile_generate else None
+        mod = generate_code(ast, target_machine, profile_path=profile_path)
+
+    llvm_mod = parse_module(mod, target_machine)
+    opt_stats = optimize_module(llvm_mod, target_machine, args.opt_level, args.time_passes)
+    if args.time_passes:
+        print(format_opt_stats(opt_stats), file=sys.stderr)
+
+    if args.emit_llvm:
+        with open(output_name + ".ll", 'w') as f:
+            f.write(str(llvm_mod))
+
+    if args.emit == "obj":
+        with open(output_path, 'wb') as f:
+            f.write(emit_object(llvm_mod, target_machine))
+    elif args.emit == "bc":
+        with open(output_path, 'wb') as f:
+            f.write(emit_bitcode(llvm_mod))
+    else:
+        build_executable(llvm_mod, target_machine, output_path, args.cc)
+
+def profile_option(args: argparse.Namespace) -> str:
+    # What the profile options contribute to the whole-file cache key
+    if args.profile_use:
+        import hashlib
+        from pgo import ProfileError
+        try:
+            with open(args.profile_use, 'rb') as f:
+                return "use:" + hashlib.sha256(f.read()).hexdigest()
+        except OSError as e:
+            raise ProfileError(f"Cannot read profile '{args.profile_use}': {e.strerror}")
+    if args.profile_generate:
+        return "generate:" + os.path.abspath(args.profile_generate)
+    return "pgo" if args.pgo else ""
+
+def train_profile(filename: str, args: argparse.Namespace, target_machine, directory: str) -> argparse.Namespace:
+    # Builds an instrumented executable in `directory`, runs it once with its
+    # output discarded, and returns `args` set up to use the profile
+    import subprocess
+    from backend import BackendError
+    from pgo import ProfileError
+
+    profile_path = os.path.join(directory, "training.profile")
+    training_args = argparse.Namespace(**dict(vars(args), pgo=False, profile_generate=profile_path, no_cache=True))
+    executable, _, _ = build_artifact(filename, training_args, target_machine, os.path.join(directory, "training"))
+    with instrument.phase("training_run"):
+        status = subprocess.run([executable], stdout=subprocess.DEVNULL).returncode
+    if status != 0:
+        raise ProfileError(f"The training run failed with exit status {status}")
+    if not os.path.exists(profile_path):
+        raise BackendError("The training run did not write a profile")
+    return argparse.Namespace(**dict(vars(args), pgo=False, profile_use=profile_path))
+
+def compile_program(ast: File, args: argparse.Namespace, target_machine, output_name: str, output_path: str,
+                    cache: Optional[CompileCache]) -> Optional['UnitReport']:
+    incremental = cache is not None and args.incremental
+    # --emit-llvm wants the whole program in one module, and so do instrumented builds
+    if args.emit == "exe" and not args.profile_generate and \
+            (incremental or (args.codegen_jobs > 1 and not args.emit_llvm)):
+        from backend import target_id
+        from incremental import compile_units
+        ast = optimize_ast(ast, args)
+        report = compile_units(ast, target_machine, output_path, args.opt_level, args.cc,
+                               cache if incremental else None, args.codegen_jobs,
+                               memoize=str(not args.no_memoize), target=target_id(target_machine),
+                               profile=profile_option(args))
+        return report if incremental else None
+    compile_artifact(ast, args, target_machine, output_name, output_path)
+    return None
 
-        llvm_ir_filename = output_name + ".ll"
+def build_artifact(filename: str, args: argparse.Namespace, target_machine,
+                   output_name: str) -> Tuple[str, Optional[str], Optional['UnitReport']]:
+    # Returns the output path, the cache key when the artifact was copied from
+    # the cache and, for --incremental builds, which units were reused
+    from backend import target_id
 
-        # Print and save the LLVM-IR to an .ll file
-        with open(llvm_ir_filename, 'w') as f:
-            f.write(str(mod))
+    output_path = output_name + ARTIFACT_SUFFIXES[args.emit]
+
+    # --emit-llvm needs the whole pipeline to run, so it bypasses the cache
+    cache = None
+    data = None
+    if not args.no_cache and not args.emit_llvm:
+        cache = CompileCache(args.cache_dir, args.cache_size)
+        data = parse_ast_from_json(filename)
+        with instrument.phase("cache_lookup"):
+            key = cache_key(data, opt_level=args.opt_level, memoize=str(not args.no_memoize), emit=args.emit,
+                            linker=args.cc, target=target_id(target_machine), incremental=str(args.incremental),
+                            codegen_jobs=str(args.codegen_jobs), profile=profile_option(args))
+            hit = cache.fetch(key, output_path)
+        if hit:
+            return output_path, key, None
+
+    ast = dict_to_ast(data) if data is not None else read_ast_from_json(filename)
+    if args.pgo:
+        import tempfile
+        # A cache hit above skips the training run as well
+        with tempfile.TemporaryDirectory(prefix="clownhead-pgo-") as tmpdir:
+            profile_args = train_profile(filename, args, target_machine, tmpdir)
+            report = compile_program(ast, profile_args, target_machine, output_name, output_path, cache)
+    else:
+        report = compile_program(ast, args, target_machine, output_name, output_path, cache)
+    if cache:
+        with instrument.phase("cache_store"):
+            cache.store(key, output_path)
+    return output_path, None, report
 
-        os.system(f"clang {llvm_ir_filename} -o {output_name}")
-        print(f"Executable generated as '{output_name}'")
+def report_stats(args: argparse.Namespace):
+    stats = instrument.STATS
+    if args.stats:
+        print(stats.format(), file=sys.stderr)
+    if args.stats_json:
+        instrument.write_json(args.stats_json, stats.to_json())
+    if args.trace:
+        instrument.write_json(args.trace, stats.to_chrome_trace())
 
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if not args.interp:
+        configure_logging(args.log_level)
+    if args.stats or args.stats_json or args.trace:
+        instrument.enable()
+    try:
+        with instrument.phase("main"):
+            run(args)
     except Exception as e:
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
+        # A failed build must not look like a success to make or a script
+        sys.exit(1)
+    finally:
+        if instrument.ENABLED:
+            report_stats(args)
+
+def run(args: argparse.Namespace):
+    filename = args.filename
+    output_name = os.path.basename(filename).split('.')[0]
+
+    if args.jit or args.interp or args.auto:
+        ast = read_ast_from_json(filename)
+        if args.interp or (args.auto and prefers_interpreter(ast)):
+            run_interpreter(ast)
+        else:
+            run_jit_mode(ast, args)
+        return
+
+    from backend import create_target_machine
+    target_machine = create_target_machine()
+
+    output_path, hit_key, report = build_artifact(filename, args, target_machine, output_name)
+    if hit_key:
+        print(f"Cache hit: reused '{output_path}' ({hit_key[:12]})")
+    if report:
+        print(f"Reused {len(report.reused)} of {len(report.reused) + len(report.compiled)} units: "
+              f"{', '.join(report.reused) or '-'}; recompiled: {', '.join(report.compiled) or '-'}")
+
+    if args.emit == "obj":
+        print(f"Object file generated as '{output_path}'")
+    elif args.emit == "bc":
+        print(f"Bitcode generated as '{output_path}'")
+    else:
+        print(f"Executable generated as '{output_path}'")
+
+    if args.cache_stats and not args.no_cache and not args.emit_llvm:
+        stats = CompileCache(args.cache_dir, args.cache_size).stats()
+        print(f"Cache stats: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+              f"{stats['entries']} entries ({stats['size']} bytes)")
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,9 @@
 from enum import Enum, auto
-from typing import List, Union, Optional
+from typing import List, Union, Optional, Tuple as Pair
 
 class Loc:
+    __slots__ = ("start", "end_pos", "filename")
+
     def __init__(self, start: int, end_pos: int, filename: str):
         self.start = start
         self.end_pos = end_pos
@@ -23,29 +25,39 @@ class BinaryOp(Enum):
     Or  = "Or"
 
 class Parameter:
+    __slots__ = ("text", "location")
+
     def __init__(self, text: str, location: Loc):
         self.text = text
         self.location = location
 
 class Term:
-    pass
+    __slots__ = ()
 
 class Int(Term):
+    __slots__ = ("value", "location")
+
     def __init__(self, value: int, location: Loc):
         self.value = value
         self.location = location
 
 class Str(Term):
+    __slots__ = ("value", "location")
+
     def __init__(self, value: str, location: Loc):
         self.value = value
         self.location = location
 
 class Bool(Term):
+    __slots__ = ("value", "location")
+
     def __init__(self, value: bool, location: Loc):
         self.value = value
         self.location = location
 
 class Binary(Term):
+    __slots__ = ("lhs", "rhs", "op", "location")
+
     def __init__(self, lhs: Term, rhs: Term, op: BinaryOp, location: Loc):
         self.lhs = lhs
         self.rhs = rhs
@@ -53,60 +65,103 @@ class Binary(Term):
         self.location = location
 
 class Var(Term):
+    __slots__ = ("text", "location", "slot")
+
     def __init__(self, text: str, location: Loc):
         self.text = text
         self.location = location
+        # Index in the enclosing function's frame, filled in by resolve.py
+        self.slot: Optional[int] = None
 
 class If(Term):
+    __slots__ = ("condition", "then", "otherwise", "location", "profile")
+
     def __init__(self, condition: Term, then: Term, otherwise: Term, location: Loc):
         self.condition = condition
         self.then = then
         self.otherwise = otherwise
         self.location = location
+        # Filled in by pgo.py: how often each branch was taken in training
+        self.profile: Optional[Pair[int, int]] = None
 
 class Let(Term):
+    __slots__ = ("name", "value", "next", "location", "slot")
+
     def __init__(self, name: Parameter, value: Term, next: Term, location: Loc):
         self.name = name
         self.value = value
         self.next = next
         self.location = location
+        self.slot: Optional[int] = None
 
 class Call(Term):
+    __slots__ = ("callee", "arguments", "location")
+
     def __init__(self, callee: Term, arguments: List[Term], location: Loc):
         self.callee = callee
         self.arguments = arguments
         self.location = location
 
 class Function(Term):
-    def __init__(self, parameters: List[Parameter], value: Term, location: Loc, name: Optional[str]):
+    __slots__ = ("parameters", "value", "location", "name", "memoize", "escapes", "param_types", "result_type",
+                 "captures", "self_slot", "frame_size", "profile")
+
+    def __init__(self, parameters: List[Parameter], value: Term, location: Loc, name: Optional[str], memoize: bool = False,
+                 escapes: bool = True, param_types: Optional[List[str]] = None, result_type: Optional[str] = None):
         self.parameters = parameters
         self.value = value
         self.location = location
         self.name = name
+        self.memoize = memoize
+        self.escapes = escapes
+        # Filled in by infer.py; None means nothing is known
+        self.param_types = param_types
+        self.result_type = result_type
+        # Filled in by resolve.py: (slot outside, slot inside) of each captured
+        # value, the slot holding the function itself and the frame size
+        self.captures: List[Pair[int, int]] = []
+        self.self_slot: Optional[int] = None
+        self.frame_size = 0
+        # Filled in by pgo.py: how often the function was entered in training
+        self.profile: Optional[int] = None
 
 class Print(Term):
+    __slots__ = ("value", "location")
+
     def __init__(self, value: Term, location: Loc):
         self.value = value
         self.location = location
 
 class First(Term):
+    __slots__ = ("value", "location")
+
     def __init__(self, value: Term, location: Loc):
         self.value = value
         self.location = location
 
 class Second(Term):
+    __slots__ = ("value", "location")
+
     def __init__(self, value: Term, location: Loc):
         self.value = value
         self.location = location
 
 class Tuple(Term):
-    def __init__(self, first: Term, second: Term, location: Loc):
+    __slots__ = ("first", "second", "location", "escapes")
+
+    def __init__(self, first: Term, second: Term, location: Loc, escapes: bool = True):
         self.first = first
         self.second = second
         self.location = location
+        self.escapes = escapes
 
 class File:
+    __slots__ = ("name", "expression", "location", "frame_size", "profile")
+
     def __init__(self, name: str, expression: Term, location: Loc):
         self.name = name
         self.expression = expression
         self.location = location
+        self.frame_size = 0
+        # Filled in by pgo.py: the pgo.ProfileSummary of the training run
+        self.profile = None
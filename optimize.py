@@ -0,0 +1,245 @@
+import operator
+from typing import Any, Callable, Dict, Optional, Union
+
+from infer import BOOL, INT, infer_operand_types
+from my_ast import Binary, BinaryOp, Bool, Call, File, First, Function, If, Int, Let, Print, Second, Str, Term, Tuple, Var
+
+Constant = Union[Int, Bool]
+
+
+def is_constant(node: Term) -> bool:
+    return isinstance(node, (Int, Bool))
+
+
+def is_pure(node: Term) -> bool:
+    # Anything that may print (directly or through a call) must be kept
+    if isinstance(node, (Int, Str, Bool, Var, Function)):
+        return True
+    if isinstance(node, Binary):
+        return is_pure(node.lhs) and is_pure(node.rhs)
+    if isinstance(node, If):
+        return is_pure(node.condition) and is_pure(node.then) and is_pure(node.otherwise)
+    if isinstance(node, Let):
+        return is_pure(node.value) and is_pure(node.next)
+    if isinstance(node, Tuple):
+        return is_pure(node.first) and is_pure(node.second)
+    if isinstance(node, (First, Second)):
+        return is_pure(node.value)
+    return False
+
+
+class RinhaError(Exception):
+    pass
+
+
+def type_name(value) -> str:
+    if type(value) is bool:
+        return "Bool"
+    if type(value) is int:
+        return "Int"
+    if type(value) is str:
+        return "Str"
+    if type(value) is tuple:
+        return "Tuple"
+    return "Closure"
+
+
+def operand_error(op: BinaryOp, lhs, rhs) -> RinhaError:
+    return RinhaError(f"Invalid operands for {op.value}: {type_name(lhs)} and {type_name(rhs)}")
+
+
+def int_op(op: BinaryOp, func: Callable[[int, int], Any]) -> Callable[[Any, Any], Any]:
+    # `type(...) is int` keeps bools out, since bool is a subclass of int
+    def evaluate(lhs, rhs):
+        if type(lhs) is not int or type(rhs) is not int:
+            raise operand_error(op, lhs, rhs)
+        return func(lhs, rhs)
+    return evaluate
+
+
+def bool_op(op: BinaryOp, func: Callable[[bool, bool], bool]) -> Callable[[Any, Any], Any]:
+    def evaluate(lhs, rhs):
+        if type(lhs) is not bool or type(rhs) is not bool:
+            raise operand_error(op, lhs, rhs)
+        return func(lhs, rhs)
+    return evaluate
+
+
+def eval_add(lhs, rhs):
+    if type(lhs) is int and type(rhs) is int:
+        return lhs + rhs
+    if type(lhs) in (int, str) and type(rhs) in (int, str):
+        # At least one side is a string here, so this is a concatenation
+        return str(lhs) + str(rhs)
+    raise operand_error(BinaryOp.Add, lhs, rhs)
+
+
+def truncating_div(lhs: int, rhs: int) -> int:
+    # Division by zero is a runtime error in Rinha. Integers are arbitrary
+    # precision (BigInts past 63 bits natively), so nothing overflows.
+    if rhs == 0:
+        raise RinhaError("Division by zero")
+    # sdiv/srem truncate towards zero, unlike Python's floor division
+    quotient = abs(lhs) // abs(rhs)
+    if (lhs < 0) != (rhs < 0):
+        quotient = -quotient
+    return quotient
+
+
+def eval_equality(op: BinaryOp, func: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    def evaluate(lhs, rhs):
+        if type(lhs) is not type(rhs) or type(lhs) not in (int, bool, str):
+            raise operand_error(op, lhs, rhs)
+        return func(lhs, rhs)
+    return evaluate
+
+
+# Reference semantics of every operator in codegen.BINARY_OP_DISPATCH, on
+# Python values: used to fold constants and by the interpreter backend.
+BINARY_OP_EVAL: Dict[BinaryOp, Callable[[Any, Any], Any]] = {
+    BinaryOp.Add: eval_add,
+    BinaryOp.Sub: int_op(BinaryOp.Sub, operator.sub),
+    BinaryOp.Mul: int_op(BinaryOp.Mul, operator.mul),
+    BinaryOp.Div: int_op(BinaryOp.Div, truncating_div),
+    BinaryOp.Rem: int_op(BinaryOp.Rem, lambda lhs, rhs: lhs - truncating_div(lhs, rhs) * rhs),
+    BinaryOp.Eq: eval_equality(BinaryOp.Eq, operator.eq),
+    BinaryOp.Neq: eval_equality(BinaryOp.Neq, operator.ne),
+    BinaryOp.Lt: int_op(BinaryOp.Lt, operator.lt),
+    BinaryOp.Gt: int_op(BinaryOp.Gt, operator.gt),
+    BinaryOp.Lte: int_op(BinaryOp.Lte, operator.le),
+    BinaryOp.Gte: int_op(BinaryOp.Gte, operator.ge),
+    BinaryOp.And: bool_op(BinaryOp.And, operator.and_),
+    BinaryOp.Or: bool_op(BinaryOp.Or, operator.or_),
+}
+
+
+def make_constant(value: Union[int, bool, str], node: Term) -> Term:
+    if isinstance(value, bool):
+        return Bool(value, node.location)
+    if isinstance(value, str):
+        return Str(value, node.location)
+    return Int(value, node.location)
+
+
+def fold_binary(node: Binary, types: Dict[Term, Optional[str]]) -> Term:
+    lhs, rhs, op = node.lhs, node.rhs, node.op
+
+    if isinstance(lhs, (Int, Bool, Str)) and isinstance(rhs, (Int, Bool, Str)):
+        try:
+            return make_constant(BINARY_OP_EVAL[op](lhs.value, rhs.value), node)
+        except RinhaError:
+            # Left for the program to hit at run time
+            pass
+
+    return simplify_binary(node, types)
+
+
+def simplify_binary(node: Binary, types: Dict[Term, Optional[str]]) -> Term:
+    # An operand is only kept on its own if it has the type the operator needs
+    # whenever it succeeds (so `s + 0` still concatenates), and only dropped if
+    # evaluating it cannot fail at all (so `(5 / z) * 0` still divides)
+    lhs, rhs, op = node.lhs, node.rhs, node.op
+    literal = {INT: Int, BOOL: Bool}
+
+    def is_int(term: Term, value: int) -> bool:
+        return isinstance(term, Int) and term.value == value
+
+    def has_type(term: Term, kind: str) -> bool:
+        return isinstance(term, literal[kind]) or types.get(term) == kind
+
+    def never_fails(term: Term, kind: str) -> bool:
+        return isinstance(term, literal[kind]) or (isinstance(term, Var) and types.get(term) == kind)
+
+    if op in (BinaryOp.Add, BinaryOp.Sub, BinaryOp.Mul, BinaryOp.Div):
+        identity = 1 if op in (BinaryOp.Mul, BinaryOp.Div) else 0
+        if is_int(rhs, identity) and has_type(lhs, INT):
+            return lhs
+        if op in (BinaryOp.Add, BinaryOp.Mul) and is_int(lhs, identity) and has_type(rhs, INT):
+            return rhs
+        if op == BinaryOp.Mul:
+            if (is_int(rhs, 0) and never_fails(lhs, INT)) or (is_int(lhs, 0) and never_fails(rhs, INT)):
+                return Int(0, node.location)
+    elif op in (BinaryOp.And, BinaryOp.Or):
+        # `true && x` is x, `false && x` is false; the other way round for ||
+        keeps = op == BinaryOp.And
+        if isinstance(lhs, Bool):
+            if lhs.value == keeps and has_type(rhs, BOOL):
+                return rhs
+            if lhs.value != keeps and never_fails(rhs, BOOL):
+                return lhs
+        if isinstance(rhs, Bool):
+            if rhs.value == keeps and has_type(lhs, BOOL):
+                return lhs
+            if rhs.value != keeps and never_fails(lhs, BOOL):
+                return rhs
+
+    return node
+
+
+def fold(node: Term, env: Dict[str, Constant], types: Dict[Term, Optional[str]]) -> Term:
+    if isinstance(node, (Int, Str, Bool)):
+        return node
+
+    elif isinstance(node, Var):
+        constant = env.get(node.text)
+        if constant is not None:
+            return make_constant(constant.value, node)
+        return node
+
+    elif isinstance(node, Binary):
+        node.lhs = fold(node.lhs, env, types)
+        node.rhs = fold(node.rhs, env, types)
+        return fold_binary(node, types)
+
+    elif isinstance(node, If):
+        node.condition = fold(node.condition, env, types)
+        if isinstance(node.condition, Bool):
+            return fold(node.then if node.condition.value else node.otherwise, env, types)
+        node.then = fold(node.then, env, types)
+        node.otherwise = fold(node.otherwise, env, types)
+        return node
+
+    elif isinstance(node, Let):
+        node.value = fold(node.value, env, types)
+        inner_env = {name: value for name, value in env.items() if name != node.name.text}
+        if is_constant(node.value):
+            # Every use is replaced below, so the binding itself is dead
+            inner_env[node.name.text] = node.value
+            return fold(node.next, inner_env, types)
+        node.next = fold(node.next, inner_env, types)
+        return node
+
+    elif isinstance(node, Function):
+        shadowed = {param.text for param in node.parameters}
+        if node.name:
+            shadowed.add(node.name)
+        inner_env = {name: value for name, value in env.items() if name not in shadowed}
+        node.value = fold(node.value, inner_env, types)
+        return node
+
+    elif isinstance(node, Call):
+        node.callee = fold(node.callee, env, types)
+        node.arguments = [fold(arg, env, types) for arg in node.arguments]
+        return node
+
+    elif isinstance(node, Print):
+        node.value = fold(node.value, env, types)
+        return node
+
+    elif isinstance(node, Tuple):
+        node.first = fold(node.first, env, types)
+        node.second = fold(node.second, env, types)
+        return node
+
+    elif isinstance(node, (First, Second)):
+        node.value = fold(node.value, env, types)
+        return node
+
+    return node
+
+
+def fold_constants(ast: File) -> File:
+    # Types are taken from the program as written; folding only replaces
+    # operands by constants or by other operands with the same value
+    ast.expression = fold(ast.expression, {}, infer_operand_types(ast))
+    return ast
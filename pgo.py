@@ -0,0 +1,123 @@
+import hashlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from incremental import feed_term
+from my_ast import File, Function, If, Term
+
+# Profile-guided optimization. An instrumented build counts how often every
+# function is entered and every If branch is taken, and writes the counts to a
+# file when the program exits. A later build of the same program attaches them
+# to the AST. Codegen turns them into branch weights, the order of the
+# branches' blocks, function entry counts and a profile summary, which is
+# what LLVM's inliner and block placement read, and marks functions as hot
+# (worth inlining) or cold (never entered). Counters are numbered by walking
+# the AST after optimize_ast, so both builds have to run the same AST passes;
+# the profile carries a digest of that AST and is refused when it does not
+# match.
+
+# A function is hot when it was entered at least this fraction of the times
+# the most frequently entered one was
+HOT_FRACTION = 0.1
+# Cutoffs of the detailed summary, in millionths of all counts, as
+# llvm-profdata writes them
+SUMMARY_CUTOFFS = (10000, 100000, 200000, 300000, 400000, 500000, 600000, 700000, 800000, 900000, 950000,
+                   990000, 999000, 999900, 999990, 999999)
+
+PROFILE_MAGIC = "rinha-profile"
+
+
+class ProfileError(Exception):
+    pass
+
+
+class ProfileSummary(NamedTuple):
+    total_count: int
+    max_count: int
+    max_internal_count: int
+    max_function_count: int
+    num_counts: int
+    num_functions: int
+    # (cutoff, smallest count needed to reach it, number of counts needed)
+    detailed: List[Tuple[int, int, int]]
+
+
+def summarize(entries: List[int], branches: List[int]) -> Optional[ProfileSummary]:
+    # None when nothing was counted, which LLVM would reject as a summary
+    ordered = sorted((count for count in entries + branches if count), reverse=True)
+    if not ordered:
+        return None
+    total = sum(ordered)
+    detailed = []
+    covered = 0
+    used = 0
+    for cutoff in SUMMARY_CUTOFFS:
+        while used < len(ordered) and covered * 1000000 < total * cutoff:
+            covered += ordered[used]
+            used += 1
+        if used:
+            detailed.append((cutoff, ordered[used - 1], used))
+    return ProfileSummary(total, ordered[0], max(branches, default=0), max(entries, default=0),
+                          len(entries) + len(branches), len(entries), detailed)
+
+
+def number_sites(ast: File) -> Tuple[Dict[Term, int], int]:
+    # One counter per Function, then two per If: then and else. Returns the
+    # first counter of every node and the number of counters.
+    sites: Dict[Term, int] = {}
+    count = 0
+    pending = [ast.expression]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, Term):
+            if isinstance(item, (Function, If)):
+                sites[item] = count
+                count += 1 if isinstance(item, Function) else 2
+            pending.extend(reversed([getattr(item, name) for name in type(item).__slots__]))
+        elif isinstance(item, list):
+            pending.extend(reversed(item))
+    return sites, count
+
+
+def program_digest(ast: File) -> str:
+    digest = hashlib.sha256()
+    feed_term(digest, [ast.frame_size, ast.expression], {})
+    return digest.hexdigest()
+
+
+def read_profile(path: str) -> Tuple[str, List[int]]:
+    # A header line with the magic, the program digest and the number of
+    # counters, then one count per line; see runtime/rinha_profile.c
+    try:
+        with open(path) as f:
+            header = f.readline().split()
+            counts = [int(line) for line in f]
+    except OSError as e:
+        raise ProfileError(f"Cannot read profile '{path}': {e.strerror}")
+    except ValueError:
+        raise ProfileError(f"Malformed profile '{path}'")
+    if len(header) != 3 or header[0] != PROFILE_MAGIC or header[2] != str(len(counts)):
+        raise ProfileError(f"Malformed profile '{path}'")
+    return header[1], counts
+
+
+def apply_profile(ast: File, path: str) -> int:
+    # Annotates `ast`, which has been through optimize_ast, with the profile
+    # at `path`; returns the number of function entries it recorded
+    program, counts = read_profile(path)
+    if program != program_digest(ast):
+        raise ProfileError(f"Profile '{path}' was recorded for another program or other compile options")
+    sites, count = number_sites(ast)
+    if count != len(counts):
+        raise ProfileError(f"Profile '{path}' has {len(counts)} counters, expected {count}")
+
+    entries: List[int] = []
+    branches: List[int] = []
+    for node, site in sites.items():
+        if isinstance(node, If):
+            node.profile = (counts[site], counts[site + 1])
+            branches.extend(node.profile)
+        else:
+            node.profile = counts[site]
+            entries.append(counts[site])
+    ast.profile = summarize(entries, branches)
+    return sum(entries)
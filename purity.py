@@ -0,0 +1,162 @@
+from typing import Dict, List, Set
+
+from my_ast import Binary, Bool, Call, File, First, Function, If, Int, Let, Print, Second, Term, Tuple, Var
+
+
+def collect_functions(node: Term, functions: Dict[str, List[Function]]):
+    if isinstance(node, Let):
+        if isinstance(node.value, Function):
+            functions.setdefault(node.name.text, []).append(node.value)
+        collect_functions(node.value, functions)
+        collect_functions(node.next, functions)
+    elif isinstance(node, Function):
+        collect_functions(node.value, functions)
+    elif isinstance(node, Binary):
+        collect_functions(node.lhs, functions)
+        collect_functions(node.rhs, functions)
+    elif isinstance(node, If):
+        collect_functions(node.condition, functions)
+        collect_functions(node.then, functions)
+        collect_functions(node.otherwise, functions)
+    elif isinstance(node, Call):
+        collect_functions(node.callee, functions)
+        for arg in node.arguments:
+            collect_functions(arg, functions)
+    elif isinstance(node, (Print, First, Second)):
+        collect_functions(node.value, functions)
+    elif isinstance(node, Tuple):
+        collect_functions(node.first, functions)
+        collect_functions(node.second, functions)
+
+
+def collect_visible_names(node: Term, env: Dict[str, Term], visible: Dict[Function, Dict[str, Term]]):
+    # Records what each name refers to inside every function: the Let,
+    # Parameter or Function (its own name) that binds it
+    if isinstance(node, Let):
+        collect_visible_names(node.value, env, visible)
+        shadowed = env.get(node.name.text)
+        env[node.name.text] = node
+        collect_visible_names(node.next, env, visible)
+        if shadowed is None:
+            del env[node.name.text]
+        else:
+            env[node.name.text] = shadowed
+    elif isinstance(node, Function):
+        inner = dict(env)
+        if node.name:
+            inner[node.name] = node
+        for param in node.parameters:
+            inner[param.text] = param
+        visible[node] = inner
+        collect_visible_names(node.value, inner, visible)
+    elif isinstance(node, Binary):
+        collect_visible_names(node.lhs, env, visible)
+        collect_visible_names(node.rhs, env, visible)
+    elif isinstance(node, If):
+        collect_visible_names(node.condition, env, visible)
+        collect_visible_names(node.then, env, visible)
+        collect_visible_names(node.otherwise, env, visible)
+    elif isinstance(node, Call):
+        collect_visible_names(node.callee, env, visible)
+        for arg in node.arguments:
+            collect_visible_names(arg, env, visible)
+    elif isinstance(node, (Print, First, Second)):
+        collect_visible_names(node.value, env, visible)
+    elif isinstance(node, Tuple):
+        collect_visible_names(node.first, env, visible)
+        collect_visible_names(node.second, env, visible)
+
+
+def body_is_pure(node: Term, locals_: Set[str], candidates: Set[str], callees: Set[str],
+                 visible: Dict[str, Term]) -> bool:
+    # Pure bodies only read their own parameters and locals, and only call
+    # other candidate functions; callees records the call graph edges.
+    # `visible` is what the names around the function refer to, so a
+    # parameter or Let of an enclosing function that shadows a candidate is
+    # not mistaken for it.
+    if isinstance(node, (Int, Bool)):
+        return True
+    if isinstance(node, Var):
+        return node.text in locals_
+    if isinstance(node, Binary):
+        return (body_is_pure(node.lhs, locals_, candidates, callees, visible)
+                and body_is_pure(node.rhs, locals_, candidates, callees, visible))
+    if isinstance(node, If):
+        return (body_is_pure(node.condition, locals_, candidates, callees, visible)
+                and body_is_pure(node.then, locals_, candidates, callees, visible)
+                and body_is_pure(node.otherwise, locals_, candidates, callees, visible))
+    if isinstance(node, Let):
+        if isinstance(node.value, Function):
+            return False
+        if not body_is_pure(node.value, locals_, candidates, callees, visible):
+            return False
+        return body_is_pure(node.next, locals_ | {node.name.text}, candidates, callees, visible)
+    if isinstance(node, Call):
+        callee = node.callee
+        if not isinstance(callee, Var) or callee.text in locals_ or callee.text not in candidates:
+            return False
+        # Candidate names are unique, so any function bound to the name is the candidate
+        binder = visible.get(callee.text)
+        if not isinstance(binder, Function) and not (isinstance(binder, Let) and isinstance(binder.value, Function)):
+            return False
+        callees.add(callee.text)
+        return all(body_is_pure(arg, locals_, candidates, callees, visible) for arg in node.arguments)
+    # Print has side effects; strings, tuples and closures are not integers
+    return False
+
+
+def is_recursive(name: str, call_graph: Dict[str, Set[str]]) -> bool:
+    seen: Set[str] = set()
+    pending = list(call_graph.get(name, ()))
+    while pending:
+        current = pending.pop()
+        if current == name:
+            return True
+        if current in seen:
+            continue
+        seen.add(current)
+        pending.extend(call_graph.get(current, ()))
+    return False
+
+
+def pure_call_graph(functions: Dict[str, List[Function]],
+                    visible: Dict[Function, Dict[str, Term]]) -> Dict[str, Set[str]]:
+    # Call graph between the pure functions among `functions`, by name
+    # Shadowed names would make call edges ambiguous, so only unique names qualify
+    candidates = {name for name, defs in functions.items() if len(defs) == 1 and defs[0].parameters}
+
+    call_graph: Dict[str, Set[str]] = {}
+    changed = True
+    while changed:
+        changed = False
+        for name in sorted(candidates):
+            function = functions[name][0]
+            callees: Set[str] = set()
+            params = {param.text for param in function.parameters}
+            if body_is_pure(function.value, params, candidates, callees, visible[function]):
+                call_graph[name] = callees
+            else:
+                candidates.discard(name)
+                call_graph.pop(name, None)
+                changed = True
+    return call_graph
+
+
+def find_memoizable_functions(ast: File) -> Set[str]:
+    functions: Dict[str, List[Function]] = {}
+    collect_functions(ast.expression, functions)
+    visible: Dict[Function, Dict[str, Term]] = {}
+    collect_visible_names(ast.expression, {}, visible)
+    call_graph = pure_call_graph(functions, visible)
+
+    # Memoizing non-recursive functions only adds a table probe per call
+    return {name for name in call_graph if is_recursive(name, call_graph)}
+
+
+def mark_memoizable_functions(ast: File) -> Set[str]:
+    memoizable = find_memoizable_functions(ast)
+    functions: Dict[str, List[Function]] = {}
+    collect_functions(ast.expression, functions)
+    for name in memoizable:
+        functions[name][0].memoize = True
+    return memoizable
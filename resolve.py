@@ -0,0 +1,103 @@
+from typing import Dict, Optional
+
+from my_ast import Binary, Call, File, First, Function, If, Let, Loc, Print, Second, Term, Tuple, Var
+
+# Binds every Var to a slot in the frame of the function it appears in, so
+# codegen indexes a list instead of walking scopes by name. A frame holds the
+# function's parameters, then the function itself when it has a name, then
+# one slot per captured value and per Let, in order of first use. Captured
+# values are copied into the frame when the function is entered, so a Var
+# never refers to an enclosing frame.
+
+
+class ResolveError(Exception):
+    pass
+
+
+def describe(location: Loc) -> str:
+    return f"{location.filename}:{location.start}"
+
+
+class Scope:
+    def __init__(self, parent: Optional['Scope'], function: Optional[Function]):
+        self.parent = parent
+        # None for the top level, which captures nothing
+        self.function = function
+        self.locals: Dict[str, int] = {}
+        self.captures: Dict[str, int] = {}
+        self.size = 0
+
+    def allocate(self) -> int:
+        self.size += 1
+        return self.size - 1
+
+    def resolve(self, name: str) -> Optional[int]:
+        slot = self.locals.get(name)
+        if slot is None:
+            slot = self.captures.get(name)
+        if slot is not None or self.parent is None:
+            return slot
+        outer = self.parent.resolve(name)
+        if outer is None:
+            return None
+        slot = self.allocate()
+        self.captures[name] = slot
+        self.function.captures.append((outer, slot))
+        return slot
+
+
+def resolve_function(node: Function, scope: Scope):
+    inner = Scope(scope, node)
+    node.captures = []
+    for param in node.parameters:
+        if param.text in inner.locals:
+            raise ResolveError(f"Duplicate parameter '{param.text}' at {describe(param.location)}")
+        inner.locals[param.text] = inner.allocate()
+    # A parameter with the function's own name hides it
+    node.self_slot = None
+    if node.name and node.name not in inner.locals:
+        node.self_slot = inner.locals[node.name] = inner.allocate()
+    resolve_node(node.value, inner)
+    node.frame_size = inner.size
+
+
+def resolve_node(node: Term, scope: Scope):
+    if isinstance(node, Var):
+        node.slot = scope.resolve(node.text)
+        if node.slot is None:
+            raise ResolveError(f"Unbound variable '{node.text}' at {describe(node.location)}")
+    elif isinstance(node, Let):
+        resolve_node(node.value, scope)
+        name = node.name.text
+        node.slot = scope.allocate()
+        shadowed = scope.locals.get(name)
+        scope.locals[name] = node.slot
+        resolve_node(node.next, scope)
+        if shadowed is None:
+            del scope.locals[name]
+        else:
+            scope.locals[name] = shadowed
+    elif isinstance(node, Function):
+        resolve_function(node, scope)
+    elif isinstance(node, Binary):
+        resolve_node(node.lhs, scope)
+        resolve_node(node.rhs, scope)
+    elif isinstance(node, If):
+        resolve_node(node.condition, scope)
+        resolve_node(node.then, scope)
+        resolve_node(node.otherwise, scope)
+    elif isinstance(node, Call):
+        resolve_node(node.callee, scope)
+        for arg in node.arguments:
+            resolve_node(arg, scope)
+    elif isinstance(node, (Print, First, Second)):
+        resolve_node(node.value, scope)
+    elif isinstance(node, Tuple):
+        resolve_node(node.first, scope)
+        resolve_node(node.second, scope)
+
+
+def resolve_names(ast: File):
+    scope = Scope(None, None)
+    resolve_node(ast.expression, scope)
+    ast.frame_size = scope.size
@@ -0,0 +1,84 @@
+/*
+ * Value representation shared by generated code and the runtime.
+ *
+ * Every Rinha value is a 64-bit word. Heap objects are 16-byte aligned, so
+ * the low four bits of a word tell its kind:
+ *   xxx0  small integer, stored as value << 1 (63-bit range)
+ *   0001  pointer to a BigInt
+ *   0011  pointer to a Tuple
+ *   0101  pointer to a Closure
+ *   0111  pointer to a NUL-terminated string
+ *   1001  boolean immediate (RINHA_FALSE or RINHA_TRUE)
+ * codegen.py mirrors these constants.
+ */
+#ifndef RINHA_H
+#define RINHA_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+typedef int64_t rinha_value;
+
+#define RINHA_TAG_MASK 15
+#define RINHA_TAG_BIGINT 1
+#define RINHA_TAG_TUPLE 3
+#define RINHA_TAG_CLOSURE 5
+#define RINHA_TAG_STRING 7
+#define RINHA_TAG_BOOL 9
+
+#define RINHA_FALSE ((rinha_value)0x09)
+#define RINHA_TRUE ((rinha_value)0x19)
+
+#define RINHA_IS_SMALL(value) (((value) & 1) == 0)
+#define RINHA_TAG(value) ((value) & RINHA_TAG_MASK)
+#define RINHA_POINTER(value) ((void *)(uintptr_t)((value) & ~(rinha_value)RINHA_TAG_MASK))
+#define RINHA_BOX(pointer, tag) ((rinha_value)((uintptr_t)(pointer) | (tag)))
+
+typedef struct {
+    rinha_value first;
+    rinha_value second;
+} RinhaTuple;
+
+/* Code takes the closure itself as its first argument, then the call arguments */
+typedef struct {
+    void *code;
+    int64_t arity;
+    rinha_value captures[];
+} RinhaClosure;
+
+/*
+ * Text is written through a RinhaBuffer: standard output flushes it to a file
+ * descriptor when full, strings being built (fd < 0) grow it instead.
+ */
+typedef struct {
+    char *data;
+    size_t length;
+    size_t capacity;
+    int fd;
+} RinhaBuffer;
+
+void rinha_buffer_write(RinhaBuffer *buffer, const char *text, size_t length);
+void rinha_flush(void);
+void rinha_write_value(RinhaBuffer *buffer, rinha_value value);
+
+/* Bump allocation from the arena; generated code inlines the fast path */
+extern char *rinha_arena_next;
+extern char *rinha_arena_end;
+void *rinha_alloc(size_t size);
+void *rinha_alloc_slow(size_t size);
+
+_Noreturn void rinha_fail(const char *format, ...);
+char *rinha_str_concat(rinha_value a, rinha_value b);
+const char *rinha_type_name(rinha_value value);
+
+void rinha_profile_start(const int64_t *counters, int64_t count, const char *path, const char *program);
+
+int rinha_is_int(rinha_value value);
+int32_t rinha_int_cmp(rinha_value a, rinha_value b, const char *op);
+void rinha_int_write(RinhaBuffer *buffer, rinha_value value);
+/* Writes the decimal form of a small integer backwards, ending just before
+ * `end`, and returns where it starts; needs RINHA_SMALL_DIGITS bytes */
+#define RINHA_SMALL_DIGITS 20
+char *rinha_format_small(char *end, rinha_value value);
+
+#endif
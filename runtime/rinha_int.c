@@ -0,0 +1,420 @@
+/*
+ * Arbitrary-precision integer runtime for compiled Rinha programs.
+ *
+ * Integers are small (value << 1, see rinha.h) or a pointer to a BigInt
+ * tagged RINHA_TAG_BIGINT. Generated code adds, subtracts and compares small
+ * integers directly and only calls into this file when an operand is not a
+ * small integer or when the native operation overflows, so these functions
+ * also report operands of the wrong type. Results are always normalized: a
+ * value that fits in the small range is never returned as a BigInt, so two
+ * equal integers always have the same representation kind.
+ *
+ * BigInts are immutable and live in the arena; programs are short-lived.
+ */
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "rinha.h"
+
+typedef rinha_value rinha_int;
+
+#define SMALL_MAX ((int64_t)(((uint64_t)1 << 62) - 1))
+#define SMALL_MIN_MAGNITUDE ((uint64_t)1 << 62)
+
+typedef struct {
+    int32_t sign;      /* 1 or -1 */
+    uint32_t length;   /* number of limbs, the top one is non-zero */
+    uint32_t limbs[];  /* little-endian magnitude in base 2^32 */
+} BigInt;
+
+/* A read-only view of either representation, for the generic algorithms */
+typedef struct {
+    int32_t sign;      /* 0 for zero */
+    uint32_t length;
+    const uint32_t *limbs;
+    uint32_t buffer[2];
+} IntView;
+
+/* Scratch buffers, freed before returning */
+static void *allocate(size_t size) {
+    void *memory = malloc(size);
+    if (!memory)
+        rinha_fail("out of memory");
+    return memory;
+}
+
+int rinha_is_int(rinha_value value) {
+    return RINHA_IS_SMALL(value) || RINHA_TAG(value) == RINHA_TAG_BIGINT;
+}
+
+static void check_operands(rinha_value a, rinha_value b, const char *op) {
+    if (!rinha_is_int(a) || !rinha_is_int(b))
+        rinha_fail("Invalid operands for %s: %s and %s", op, rinha_type_name(a), rinha_type_name(b));
+}
+
+static void view_int(rinha_int value, IntView *view) {
+    if (!RINHA_IS_SMALL(value)) {
+        const BigInt *big = RINHA_POINTER(value);
+        view->sign = big->sign;
+        view->length = big->length;
+        view->limbs = big->limbs;
+        return;
+    }
+    int64_t small = value >> 1;
+    uint64_t magnitude = small < 0 ? (uint64_t)0 - (uint64_t)small : (uint64_t)small;
+    view->sign = small < 0 ? -1 : (small > 0);
+    view->buffer[0] = (uint32_t)magnitude;
+    view->buffer[1] = (uint32_t)(magnitude >> 32);
+    view->length = magnitude == 0 ? 0 : (view->buffer[1] ? 2 : 1);
+    view->limbs = view->buffer;
+}
+
+/* Takes ownership of nothing: copies `limbs` into a BigInt unless the value fits a small int */
+static rinha_int make_int(int32_t sign, const uint32_t *limbs, uint32_t length) {
+    while (length > 0 && limbs[length - 1] == 0)
+        length--;
+    if (length == 0)
+        return 0;
+    if (length <= 2) {
+        uint64_t magnitude = limbs[0] | (length == 2 ? (uint64_t)limbs[1] << 32 : 0);
+        if (sign > 0 && magnitude <= (uint64_t)SMALL_MAX)
+            return (rinha_int)((uint64_t)magnitude << 1);
+        if (sign < 0 && magnitude <= SMALL_MIN_MAGNITUDE)
+            return (rinha_int)((uint64_t)0 - (magnitude << 1));
+    }
+    BigInt *big = rinha_alloc(sizeof(BigInt) + length * sizeof(uint32_t));
+    big->sign = sign;
+    big->length = length;
+    memcpy(big->limbs, limbs, length * sizeof(uint32_t));
+    return RINHA_BOX(big, RINHA_TAG_BIGINT);
+}
+
+static int compare_magnitudes(const uint32_t *a, uint32_t a_length, const uint32_t *b, uint32_t b_length) {
+    if (a_length != b_length)
+        return a_length < b_length ? -1 : 1;
+    for (uint32_t i = a_length; i-- > 0;) {
+        if (a[i] != b[i])
+            return a[i] < b[i] ? -1 : 1;
+    }
+    return 0;
+}
+
+/* out needs max(a_length, b_length) + 1 limbs */
+static uint32_t add_magnitudes(const uint32_t *a, uint32_t a_length, const uint32_t *b, uint32_t b_length,
+                               uint32_t *out) {
+    if (a_length < b_length) {
+        const uint32_t *limbs = a; a = b; b = limbs;
+        uint32_t length = a_length; a_length = b_length; b_length = length;
+    }
+    uint64_t carry = 0;
+    for (uint32_t i = 0; i < a_length; i++) {
+        uint64_t sum = (uint64_t)a[i] + (i < b_length ? b[i] : 0) + carry;
+        out[i] = (uint32_t)sum;
+        carry = sum >> 32;
+    }
+    out[a_length] = (uint32_t)carry;
+    return a_length + 1;
+}
+
+/* Requires |a| >= |b|; out needs a_length limbs */
+static uint32_t sub_magnitudes(const uint32_t *a, uint32_t a_length, const uint32_t *b, uint32_t b_length,
+                               uint32_t *out) {
+    int64_t borrow = 0;
+    for (uint32_t i = 0; i < a_length; i++) {
+        int64_t difference = (int64_t)a[i] - (i < b_length ? b[i] : 0) - borrow;
+        borrow = difference < 0;
+        out[i] = (uint32_t)(difference + (borrow ? ((int64_t)1 << 32) : 0));
+    }
+    return a_length;
+}
+
+static rinha_int add_views(const IntView *a, const IntView *b) {
+    if (a->sign == 0)
+        return make_int(b->sign, b->limbs, b->length);
+    if (b->sign == 0)
+        return make_int(a->sign, a->limbs, a->length);
+
+    uint32_t length = (a->length > b->length ? a->length : b->length) + 1;
+    uint32_t *out = allocate(length * sizeof(uint32_t));
+    rinha_int result;
+    if (a->sign == b->sign) {
+        length = add_magnitudes(a->limbs, a->length, b->limbs, b->length, out);
+        result = make_int(a->sign, out, length);
+    } else if (compare_magnitudes(a->limbs, a->length, b->limbs, b->length) >= 0) {
+        length = sub_magnitudes(a->limbs, a->length, b->limbs, b->length, out);
+        result = make_int(a->sign, out, length);
+    } else {
+        length = sub_magnitudes(b->limbs, b->length, a->limbs, a->length, out);
+        result = make_int(b->sign, out, length);
+    }
+    free(out);
+    return result;
+}
+
+rinha_int rinha_int_add(rinha_int a, rinha_int b) {
+    if (!rinha_is_int(a) || !rinha_is_int(b))
+        return RINHA_BOX(rinha_str_concat(a, b), RINHA_TAG_STRING);
+    IntView x, y;
+    view_int(a, &x);
+    view_int(b, &y);
+    return add_views(&x, &y);
+}
+
+rinha_int rinha_int_sub(rinha_int a, rinha_int b) {
+    check_operands(a, b, "Sub");
+    IntView x, y;
+    view_int(a, &x);
+    view_int(b, &y);
+    y.sign = -y.sign;
+    return add_views(&x, &y);
+}
+
+rinha_int rinha_int_mul(rinha_int a, rinha_int b) {
+    check_operands(a, b, "Mul");
+    IntView x, y;
+    view_int(a, &x);
+    view_int(b, &y);
+    if (x.sign == 0 || y.sign == 0)
+        return 0;
+
+    uint32_t length = x.length + y.length;
+    uint32_t *out = calloc(length, sizeof(uint32_t));
+    if (!out)
+        rinha_fail("out of memory");
+    for (uint32_t i = 0; i < x.length; i++) {
+        uint64_t carry = 0;
+        for (uint32_t j = 0; j < y.length; j++) {
+            uint64_t product = (uint64_t)x.limbs[i] * y.limbs[j] + out[i + j] + carry;
+            out[i + j] = (uint32_t)product;
+            carry = product >> 32;
+        }
+        out[i + y.length] = (uint32_t)carry;
+    }
+    rinha_int result = make_int(x.sign * y.sign, out, length);
+    free(out);
+    return result;
+}
+
+/*
+ * Knuth's algorithm D (TAOCP 4.3.1) on base 2^32 limbs. Requires
+ * u_length >= v_length >= 1 and a non-zero top limb in v. quotient needs
+ * u_length - v_length + 1 limbs and remainder v_length limbs.
+ */
+static void divide_magnitudes(const uint32_t *u, uint32_t u_length, const uint32_t *v, uint32_t v_length,
+                              uint32_t *quotient, uint32_t *remainder) {
+    const uint64_t base = (uint64_t)1 << 32;
+
+    if (v_length == 1) {
+        uint64_t rest = 0;
+        for (uint32_t j = u_length; j-- > 0;) {
+            uint64_t current = (rest << 32) | u[j];
+            quotient[j] = (uint32_t)(current / v[0]);
+            rest = current % v[0];
+        }
+        remainder[0] = (uint32_t)rest;
+        return;
+    }
+
+    /* Normalize so the divisor's top limb has its high bit set */
+    int shift = __builtin_clz(v[v_length - 1]);
+    uint32_t *vn = allocate(v_length * sizeof(uint32_t));
+    uint32_t *un = allocate((u_length + 1) * sizeof(uint32_t));
+    for (uint32_t i = v_length - 1; i > 0; i--)
+        vn[i] = (v[i] << shift) | (shift ? v[i - 1] >> (32 - shift) : 0);
+    vn[0] = v[0] << shift;
+    un[u_length] = shift ? u[u_length - 1] >> (32 - shift) : 0;
+    for (uint32_t i = u_length - 1; i > 0; i--)
+        un[i] = (u[i] << shift) | (shift ? u[i - 1] >> (32 - shift) : 0);
+    un[0] = u[0] << shift;
+
+    for (int64_t j = (int64_t)u_length - v_length; j >= 0; j--) {
+        uint64_t numerator = ((uint64_t)un[j + v_length] << 32) | un[j + v_length - 1];
+        uint64_t qhat = numerator / vn[v_length - 1];
+        uint64_t rhat = numerator % vn[v_length - 1];
+        while (qhat >= base || qhat * vn[v_length - 2] > ((rhat << 32) | un[j + v_length - 2])) {
+            qhat--;
+            rhat += vn[v_length - 1];
+            if (rhat >= base)
+                break;
+        }
+
+        /* Multiply and subtract qhat * vn from the current window of un */
+        int64_t borrow = 0;
+        int64_t t;
+        for (uint32_t i = 0; i < v_length; i++) {
+            uint64_t product = qhat * vn[i];
+            t = (int64_t)un[i + j] - borrow - (int64_t)(product & 0xFFFFFFFFu);
+            un[i + j] = (uint32_t)t;
+            borrow = (int64_t)(product >> 32) - (t >> 32);
+        }
+        t = (int64_t)un[j + v_length] - borrow;
+        un[j + v_length] = (uint32_t)t;
+
+        quotient[j] = (uint32_t)qhat;
+        if (t < 0) {
+            /* qhat was one too large: add the divisor back */
+            quotient[j]--;
+            uint64_t carry = 0;
+            for (uint32_t i = 0; i < v_length; i++) {
+                uint64_t sum = (uint64_t)un[i + j] + vn[i] + carry;
+                un[i + j] = (uint32_t)sum;
+                carry = sum >> 32;
+            }
+            un[j + v_length] += (uint32_t)carry;
+        }
+    }
+
+    for (uint32_t i = 0; i < v_length - 1; i++)
+        remainder[i] = (un[i] >> shift) | (shift ? un[i + 1] << (32 - shift) : 0);
+    remainder[v_length - 1] = un[v_length - 1] >> shift;
+    free(vn);
+    free(un);
+}
+
+/* Truncating division, like C and the native sdiv/srem fast path */
+static void divide(rinha_int a, rinha_int b, rinha_int *quotient, rinha_int *remainder) {
+    IntView x, y;
+    view_int(a, &x);
+    view_int(b, &y);
+    if (y.sign == 0)
+        rinha_fail("Division by zero");
+    if (compare_magnitudes(x.limbs, x.length, y.limbs, y.length) < 0) {
+        *quotient = 0;
+        *remainder = a;
+        return;
+    }
+
+    uint32_t q_length = x.length - y.length + 1;
+    uint32_t *q = allocate(q_length * sizeof(uint32_t));
+    uint32_t *r = allocate(y.length * sizeof(uint32_t));
+    divide_magnitudes(x.limbs, x.length, y.limbs, y.length, q, r);
+    *quotient = make_int(x.sign * y.sign, q, q_length);
+    *remainder = make_int(x.sign, r, y.length);
+    free(q);
+    free(r);
+}
+
+rinha_int rinha_int_div(rinha_int a, rinha_int b) {
+    check_operands(a, b, "Div");
+    rinha_int quotient, remainder;
+    divide(a, b, &quotient, &remainder);
+    return quotient;
+}
+
+rinha_int rinha_int_rem(rinha_int a, rinha_int b) {
+    check_operands(a, b, "Rem");
+    rinha_int quotient, remainder;
+    divide(a, b, &quotient, &remainder);
+    return remainder;
+}
+
+/* Only called for ordering comparisons, so `op` names the operator in errors */
+int32_t rinha_int_cmp(rinha_int a, rinha_int b, const char *op) {
+    check_operands(a, b, op);
+    IntView x, y;
+    view_int(a, &x);
+    view_int(b, &y);
+    if (x.sign != y.sign)
+        return x.sign < y.sign ? -1 : 1;
+    int magnitude = compare_magnitudes(x.limbs, x.length, y.limbs, y.length);
+    return x.sign < 0 ? -magnitude : magnitude;
+}
+
+/* Decimal literal with an optional leading '-', for constants outside the small range */
+rinha_int rinha_int_parse(const char *digits) {
+    int32_t sign = 1;
+    if (*digits == '-') {
+        sign = -1;
+        digits++;
+    }
+    uint32_t capacity = (uint32_t)(strlen(digits) / 9 + 2);
+    uint32_t *limbs = calloc(capacity, sizeof(uint32_t));
+    if (!limbs)
+        rinha_fail("out of memory");
+    uint32_t length = 0;
+    for (; *digits; digits++) {
+        uint64_t carry = (uint64_t)(*digits - '0');
+        for (uint32_t i = 0; i < length; i++) {
+            uint64_t value = (uint64_t)limbs[i] * 10 + carry;
+            limbs[i] = (uint32_t)value;
+            carry = value >> 32;
+        }
+        if (carry)
+            limbs[length++] = (uint32_t)carry;
+    }
+    rinha_int result = make_int(sign, limbs, length);
+    free(limbs);
+    return result;
+}
+
+static const char DIGIT_PAIRS[] =
+    "0001020304050607080910111213141516171819202122232425262728293031323334353637383940414243444546474849"
+    "5051525354555657585960616263646566676869707172737475767778798081828384858687888990919293949596979899";
+
+/* Writes the digits of `value` backwards, two per division, ending before `end` */
+static char *format_digits(char *end, uint64_t value) {
+    while (value >= 100) {
+        const char *pair = DIGIT_PAIRS + (value % 100) * 2;
+        value /= 100;
+        *--end = pair[1];
+        *--end = pair[0];
+    }
+    if (value >= 10) {
+        *--end = DIGIT_PAIRS[value * 2 + 1];
+        *--end = DIGIT_PAIRS[value * 2];
+    } else {
+        *--end = (char)('0' + value);
+    }
+    return end;
+}
+
+char *rinha_format_small(char *end, rinha_int value) {
+    int64_t small = value >> 1;
+    char *start = format_digits(end, small < 0 ? (uint64_t)0 - (uint64_t)small : (uint64_t)small);
+    if (small < 0)
+        *--start = '-';
+    return start;
+}
+
+void rinha_int_write(RinhaBuffer *buffer, rinha_int value) {
+    char digits[RINHA_SMALL_DIGITS];
+    if (RINHA_IS_SMALL(value)) {
+        char *start = rinha_format_small(digits + sizeof digits, value);
+        rinha_buffer_write(buffer, start, (size_t)(digits + sizeof digits - start));
+        return;
+    }
+
+    const BigInt *big = RINHA_POINTER(value);
+    uint32_t length = big->length;
+    uint32_t *limbs = allocate(length * sizeof(uint32_t));
+    memcpy(limbs, big->limbs, length * sizeof(uint32_t));
+
+    /* Peel off base 10^9 chunks, least significant first */
+    uint32_t *chunks = allocate((length * 10 / 9 + 2) * sizeof(uint32_t));
+    uint32_t count = 0;
+    do {
+        uint64_t rest = 0;
+        for (uint32_t i = length; i-- > 0;) {
+            uint64_t current = (rest << 32) | limbs[i];
+            limbs[i] = (uint32_t)(current / 1000000000u);
+            rest = current % 1000000000u;
+        }
+        chunks[count++] = (uint32_t)rest;
+        while (length > 0 && limbs[length - 1] == 0)
+            length--;
+    } while (length > 0);
+
+    if (big->sign < 0)
+        rinha_buffer_write(buffer, "-", 1);
+    char *start = format_digits(digits + sizeof digits, chunks[count - 1]);
+    rinha_buffer_write(buffer, start, (size_t)(digits + sizeof digits - start));
+    /* The other chunks are zero-padded to nine digits */
+    for (uint32_t i = count - 1; i-- > 0;) {
+        start = format_digits(digits + 9, chunks[i]);
+        memset(digits, '0', (size_t)(start - digits));
+        rinha_buffer_write(buffer, digits, 9);
+    }
+    free(limbs);
+    free(chunks);
+}
@@ -0,0 +1,192 @@
+/*
+ * Buffered output for compiled Rinha programs.
+ *
+ * Print appends to a buffer that is written to standard output only when it
+ * is full, when main returns (generated code calls rinha_flush) and before a
+ * runtime error is reported, instead of going through stdio once per Print.
+ * Small integers are formatted straight into it, and a line goes in with one
+ * copy when it fits.
+ *
+ * With RINHA_OUTPUT_MMAP set (to anything but 0) and standard output a
+ * regular file, once the first buffer is written out the rest of the output
+ * is formatted directly into a shared mapping of the file, a window of
+ * OUTPUT_WINDOW_SIZE bytes at a time, instead of being copied out by write().
+ * The file is cut to its final size when the output is flushed.
+ */
+#include <errno.h>
+#include <fcntl.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include "rinha.h"
+
+#define OUTPUT_BUFFER_SIZE ((size_t)1 << 16)
+#define OUTPUT_WINDOW_SIZE ((size_t)1 << 24)
+
+static char output_data[OUTPUT_BUFFER_SIZE];
+static RinhaBuffer output = {output_data, 0, OUTPUT_BUFFER_SIZE, STDOUT_FILENO};
+
+/* Set while `output` is a window of the file starting at window_offset */
+static int mapped_fd = -1;
+static off_t window_offset;
+static off_t mapped_size;
+/* The file is never cut below the size it had before the mapping */
+static off_t initial_size;
+static int mapping_tried;
+
+static void write_all(int fd, const char *data, size_t length) {
+    while (length > 0) {
+        ssize_t written = write(fd, data, length);
+        if (written < 0) {
+            if (errno == EINTR)
+                continue;
+            /* Nowhere left to report it */
+            return;
+        }
+        data += written;
+        length -= (size_t)written;
+    }
+}
+
+/* Maps the window holding file offset `offset` and points `output` at it */
+static int map_window(off_t offset) {
+    off_t base = offset - offset % (off_t)sysconf(_SC_PAGESIZE);
+    off_t end = base + (off_t)OUTPUT_WINDOW_SIZE;
+    if (end > mapped_size) {
+        if (ftruncate(mapped_fd, end) != 0)
+            return 0;
+        mapped_size = end;
+    }
+    void *data = mmap(NULL, OUTPUT_WINDOW_SIZE, PROT_READ | PROT_WRITE, MAP_SHARED, mapped_fd, base);
+    if (data == MAP_FAILED)
+        return 0;
+    window_offset = base;
+    output.data = data;
+    output.length = (size_t)(offset - base);
+    output.capacity = OUTPUT_WINDOW_SIZE;
+    return 1;
+}
+
+/* Leaves mapped mode with the output ending at file offset `end` */
+static void end_mapping(off_t end) {
+    if (ftruncate(mapped_fd, end > initial_size ? end : initial_size) == 0)
+        lseek(STDOUT_FILENO, end, SEEK_SET);
+    close(mapped_fd);
+    mapped_fd = -1;
+    output.data = output_data;
+    output.length = 0;
+    output.capacity = OUTPUT_BUFFER_SIZE;
+}
+
+static void start_mapping(void) {
+    const char *setting = getenv("RINHA_OUTPUT_MMAP");
+    struct stat st;
+    if (!setting || !*setting || strcmp(setting, "0") == 0 || fstat(STDOUT_FILENO, &st) != 0 || !S_ISREG(st.st_mode))
+        return;
+    off_t offset = fcntl(STDOUT_FILENO, F_GETFL) & O_APPEND ? st.st_size : lseek(STDOUT_FILENO, 0, SEEK_CUR);
+    /* Standard output is usually write-only, and a shared writable mapping needs read access too */
+    char path[32];
+    snprintf(path, sizeof path, "/proc/self/fd/%d", STDOUT_FILENO);
+    if (offset < 0 || (mapped_fd = open(path, O_RDWR)) < 0)
+        return;
+    initial_size = mapped_size = st.st_size;
+    if (!map_window(offset))
+        end_mapping(offset);
+}
+
+/* Empties `output` once it is full, or moves it to the next window */
+static void drain(void) {
+    if (mapped_fd >= 0) {
+        off_t end = window_offset + (off_t)output.length;
+        munmap(output.data, output.capacity);
+        if (!map_window(end))
+            end_mapping(end);
+        return;
+    }
+    write_all(output.fd, output.data, output.length);
+    output.length = 0;
+    if (!mapping_tried) {
+        mapping_tried = 1;
+        start_mapping();
+    }
+}
+
+static void write_output(const char *text, size_t length) {
+    while (output.capacity - output.length < length) {
+        if (mapped_fd < 0 && output.length == 0 && mapping_tried) {
+            /* Larger than the whole buffer */
+            write_all(output.fd, text, length);
+            return;
+        }
+        size_t room = output.capacity - output.length;
+        memcpy(output.data + output.length, text, room);
+        output.length += room;
+        text += room;
+        length -= room;
+        drain();
+    }
+    memcpy(output.data + output.length, text, length);
+    output.length += length;
+}
+
+void rinha_buffer_write(RinhaBuffer *buffer, const char *text, size_t length) {
+    if (buffer->capacity - buffer->length < length) {
+        if (buffer->fd >= 0) {
+            /* Only standard output writes to a file */
+            write_output(text, length);
+            return;
+        }
+        size_t capacity = buffer->capacity ? buffer->capacity * 2 : 64;
+        while (capacity - buffer->length < length)
+            capacity *= 2;
+        char *data = realloc(buffer->data, capacity);
+        if (!data)
+            rinha_fail("out of memory");
+        buffer->data = data;
+        buffer->capacity = capacity;
+    }
+    memcpy(buffer->data + buffer->length, text, length);
+    buffer->length += length;
+}
+
+void rinha_flush(void) {
+    if (mapped_fd >= 0) {
+        off_t end = window_offset + (off_t)output.length;
+        munmap(output.data, output.capacity);
+        end_mapping(end);
+        return;
+    }
+    write_all(output.fd, output.data, output.length);
+    output.length = 0;
+}
+
+static void write_line(const char *text, size_t length) {
+    if (output.capacity - output.length > length) {
+        memcpy(output.data + output.length, text, length);
+        output.data[output.length + length] = '\n';
+        output.length += length + 1;
+        return;
+    }
+    write_output(text, length);
+    write_output("\n", 1);
+}
+
+void rinha_print(rinha_value value) {
+    if (RINHA_IS_SMALL(value)) {
+        char digits[RINHA_SMALL_DIGITS];
+        char *start = rinha_format_small(digits + sizeof digits, value);
+        write_line(start, (size_t)(digits + sizeof digits - start));
+        return;
+    }
+    rinha_write_value(&output, value);
+    rinha_buffer_write(&output, "\n", 1);
+}
+
+/* Print of a value inferred to be a string */
+void rinha_print_str(const char *text) {
+    write_line(text, strlen(text));
+}
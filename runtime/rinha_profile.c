@@ -0,0 +1,39 @@
+/*
+ * Counters of instrumented builds (--profile-generate).
+ *
+ * Generated code increments one counter per function entry and two per If,
+ * and main registers them here before running the program. They are written
+ * out when the process exits, through a runtime error too, in the format
+ * pgo.read_profile expects: a header line, then one count per line.
+ */
+#include <inttypes.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#include "rinha.h"
+
+static const int64_t *profile_counters;
+static int64_t profile_count;
+static const char *profile_path;
+static const char *profile_program;
+
+static void write_profile(void) {
+    FILE *file = fopen(profile_path, "w");
+    if (!file) {
+        fprintf(stderr, "Error: cannot write profile to %s\n", profile_path);
+        return;
+    }
+    fprintf(file, "rinha-profile %s %" PRId64 "\n", profile_program, profile_count);
+    for (int64_t i = 0; i < profile_count; i++)
+        fprintf(file, "%" PRId64 "\n", profile_counters[i]);
+    fclose(file);
+}
+
+void rinha_profile_start(const int64_t *counters, int64_t count, const char *path, const char *program) {
+    profile_counters = counters;
+    profile_count = count;
+    profile_path = path;
+    profile_program = program;
+    atexit(write_profile);
+}
@@ -0,0 +1,151 @@
+/*
+ * Tuples, closures, strings and booleans for compiled Rinha programs: the
+ * arena allocator, formatting, concatenation, equality and runtime type errors.
+ *
+ * Objects are bump-allocated from arena chunks and never freed. Generated
+ * code inlines the bump (see codegen.emit_arena_alloc) and only calls
+ * rinha_alloc_slow when the current chunk is exhausted; objects that never
+ * escape their function are not allocated here at all, but on its stack.
+ */
+#include <inttypes.h>
+#include <stdarg.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "rinha.h"
+
+#define ARENA_ALIGNMENT 16
+#define ARENA_CHUNK_SIZE ((size_t)1 << 20)
+
+char *rinha_arena_next = NULL;
+char *rinha_arena_end = NULL;
+
+void rinha_fail(const char *format, ...) {
+    va_list args;
+    rinha_flush();
+    fputs("Error: ", stderr);
+    va_start(args, format);
+    vfprintf(stderr, format, args);
+    va_end(args);
+    fputc('\n', stderr);
+    exit(1);
+}
+
+static void *allocate_aligned(size_t size) {
+    void *memory = aligned_alloc(ARENA_ALIGNMENT, size);
+    if (!memory)
+        rinha_fail("out of memory");
+    return memory;
+}
+
+/* `size` is already rounded up to ARENA_ALIGNMENT by the caller */
+void *rinha_alloc_slow(size_t size) {
+    /* Big objects get their own block instead of wasting the rest of the chunk */
+    if (size > ARENA_CHUNK_SIZE / 4)
+        return allocate_aligned(size);
+    char *chunk = allocate_aligned(ARENA_CHUNK_SIZE);
+    rinha_arena_next = chunk + size;
+    rinha_arena_end = chunk + ARENA_CHUNK_SIZE;
+    return chunk;
+}
+
+void *rinha_alloc(size_t size) {
+    size = (size + ARENA_ALIGNMENT - 1) & ~(size_t)(ARENA_ALIGNMENT - 1);
+    if ((size_t)(rinha_arena_end - rinha_arena_next) < size)
+        return rinha_alloc_slow(size);
+    void *object = rinha_arena_next;
+    rinha_arena_next += size;
+    return object;
+}
+
+const char *rinha_type_name(rinha_value value) {
+    if (rinha_is_int(value))
+        return "Int";
+    switch (RINHA_TAG(value)) {
+    case RINHA_TAG_TUPLE:
+        return "Tuple";
+    case RINHA_TAG_CLOSURE:
+        return "Closure";
+    case RINHA_TAG_STRING:
+        return "Str";
+    default:
+        return "Bool";
+    }
+}
+
+void rinha_write_value(RinhaBuffer *buffer, rinha_value value) {
+    if (rinha_is_int(value)) {
+        rinha_int_write(buffer, value);
+        return;
+    }
+    const char *text;
+    switch (RINHA_TAG(value)) {
+    case RINHA_TAG_TUPLE: {
+        const RinhaTuple *tuple = RINHA_POINTER(value);
+        rinha_buffer_write(buffer, "(", 1);
+        rinha_write_value(buffer, tuple->first);
+        rinha_buffer_write(buffer, ", ", 2);
+        rinha_write_value(buffer, tuple->second);
+        rinha_buffer_write(buffer, ")", 1);
+        return;
+    }
+    case RINHA_TAG_CLOSURE:
+        text = "<#closure>";
+        break;
+    case RINHA_TAG_STRING:
+        text = RINHA_POINTER(value);
+        break;
+    default:
+        text = value == RINHA_TRUE ? "true" : "false";
+        break;
+    }
+    rinha_buffer_write(buffer, text, strlen(text));
+}
+
+static int is_string(rinha_value value) {
+    return !rinha_is_int(value) && RINHA_TAG(value) == RINHA_TAG_STRING;
+}
+
+/* Add with a string operand; the other one may be an integer */
+char *rinha_str_concat(rinha_value a, rinha_value b) {
+    if (!(rinha_is_int(a) || is_string(a)) || !(rinha_is_int(b) || is_string(b)))
+        rinha_fail("Invalid operands for Add: %s and %s", rinha_type_name(a), rinha_type_name(b));
+    RinhaBuffer text = {NULL, 0, 0, -1};
+    rinha_write_value(&text, a);
+    rinha_write_value(&text, b);
+    char *result = rinha_alloc(text.length + 1);
+    memcpy(result, text.data, text.length);
+    result[text.length] = '\0';
+    free(text.data);
+    return result;
+}
+
+/* Slow path of Eq/Neq, for anything but two small integers */
+int32_t rinha_value_eq(rinha_value a, rinha_value b, const char *op) {
+    if (rinha_is_int(a) && rinha_is_int(b))
+        return a == b || (!RINHA_IS_SMALL(a) && !RINHA_IS_SMALL(b) && rinha_int_cmp(a, b, op) == 0);
+    int a_tag = rinha_is_int(a) ? 0 : RINHA_TAG(a);
+    int b_tag = rinha_is_int(b) ? 0 : RINHA_TAG(b);
+    if (a_tag != b_tag || (a_tag != RINHA_TAG_STRING && a_tag != RINHA_TAG_BOOL))
+        rinha_fail("Invalid operands for %s: %s and %s", op, rinha_type_name(a), rinha_type_name(b));
+    if (a_tag == RINHA_TAG_BOOL)
+        return a == b;
+    return strcmp(RINHA_POINTER(a), RINHA_POINTER(b)) == 0;
+}
+
+void rinha_call_error(rinha_value callee, int64_t arguments) {
+    if (rinha_is_int(callee) || RINHA_TAG(callee) != RINHA_TAG_CLOSURE)
+        rinha_fail("Cannot call a value of type %s", rinha_type_name(callee));
+    const RinhaClosure *closure = RINHA_POINTER(callee);
+    rinha_fail("Function expects %" PRId64 " arguments, got %" PRId64, closure->arity, arguments);
+}
+
+void rinha_projection_error(rinha_value value, const char *kind) {
+    rinha_fail("Cannot take %s of %s", kind, rinha_type_name(value));
+}
+
+void rinha_condition_error(rinha_value value) {
+    rinha_fail("If condition must be a Bool, got %s", rinha_type_name(value));
+}
@@ -0,0 +1,45 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Modes every program is checked in; executables are built with the default --emit exe
+MODES = {
+    "interp": ["--interp"],
+    "jit-O0": ["--jit", "-O0"],
+    "jit-O2": ["--jit", "-O2"],
+    "exe": ["-O2"],
+}
+
+
+@pytest.fixture(scope="session")
+def cc() -> str:
+    return os.environ.get("CC") or shutil.which("clang") or "cc"
+
+
+@pytest.fixture
+def run_program(tmp_path, cc):
+    # Compiles or interprets a JSON AST with main.py and returns its output;
+    # executables are built in tmp_path and then run
+    env = dict(os.environ, CLOWNHEAD_CACHE_DIR=str(tmp_path / "cache"))
+    env.pop("CLOWNHEAD_FORKSERVER", None)
+
+    def run(ast: dict, flags: list, check: bool = True) -> subprocess.CompletedProcess:
+        path = tmp_path / "program.json"
+        path.write_text(json.dumps(ast))
+        command = [sys.executable, os.path.join(ROOT, "main.py"), str(path), "--cc", cc] + flags
+        result = subprocess.run(command, cwd=tmp_path, env=env, capture_output=True, text=True, timeout=300)
+        if not {"--jit", "--interp", "--auto"} & set(flags) and result.returncode == 0:
+            result = subprocess.run([str(tmp_path / "program")], cwd=tmp_path, capture_output=True, text=True,
+                                    timeout=300)
+        if check:
+            assert result.returncode == 0, result.stderr
+        return result
+
+    return run
@@ -0,0 +1,64 @@
+# Builders for the JSON ASTs the tests compile, in the shape rinha emits
+
+def location():
+    return {"start": 0, "end": 0, "filename": "test.rinha"}
+
+
+def program(expression: dict) -> dict:
+    return {"name": "test.rinha", "expression": expression, "location": location()}
+
+
+def integer(value: int) -> dict:
+    return {"kind": "Int", "value": value, "location": location()}
+
+
+def boolean(value: bool) -> dict:
+    return {"kind": "Bool", "value": value, "location": location()}
+
+
+def string(value: str) -> dict:
+    return {"kind": "Str", "value": value, "location": location()}
+
+
+def var(name: str) -> dict:
+    return {"kind": "Var", "text": name, "location": location()}
+
+
+def binary(op: str, lhs: dict, rhs: dict) -> dict:
+    return {"kind": "Binary", "op": op, "lhs": lhs, "rhs": rhs, "location": location()}
+
+
+def call(callee, *arguments) -> dict:
+    if isinstance(callee, str):
+        callee = var(callee)
+    return {"kind": "Call", "callee": callee, "arguments": list(arguments), "location": location()}
+
+
+def branch(condition: dict, then: dict, otherwise: dict) -> dict:
+    return {"kind": "If", "condition": condition, "then": then, "otherwise": otherwise, "location": location()}
+
+
+def function(parameters: list, body: dict) -> dict:
+    return {"kind": "Function", "parameters": [{"text": name, "location": location()} for name in parameters],
+            "value": body, "location": location()}
+
+
+def let(name: str, value: dict, next: dict) -> dict:
+    return {"kind": "Let", "name": {"text": name, "location": location()}, "value": value, "next": next,
+            "location": location()}
+
+
+def show(value: dict) -> dict:
+    return {"kind": "Print", "value": value, "location": location()}
+
+
+def pair(first: dict, second: dict) -> dict:
+    return {"kind": "Tuple", "first": first, "second": second, "location": location()}
+
+
+def first(value: dict) -> dict:
+    return {"kind": "First", "value": value, "location": location()}
+
+
+def second(value: dict) -> dict:
+    return {"kind": "Second", "value": value, "location": location()}
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from cache import CompileCache
+
+
+def cache_with_entry(tmp_path, contents: bytes = b"object code") -> CompileCache:
+    cache = CompileCache(str(tmp_path / "cache"))
+    artifact = tmp_path / "artifact"
+    artifact.write_bytes(contents)
+    os.chmod(artifact, 0o755)
+    cache.store("key", str(artifact))
+    return cache
+
+
+@pytest.mark.parametrize("link", [False, True])
+def test_fetch_survives_eviction_after_the_lock(tmp_path, monkeypatch, link):
+    cache = cache_with_entry(tmp_path)
+    claim = cache._claim
+
+    def claim_then_evict(entry, output_path, link):
+        # What a concurrent store_many does once fetch_many releases the lock
+        source = claim(entry, output_path, link)
+        os.remove(entry)
+        return source
+
+    monkeypatch.setattr(cache, "_claim", claim_then_evict)
+    output = tmp_path / "output"
+    assert cache.fetch_many([("key", str(output))], link=link) == [True]
+    assert output.read_bytes() == b"object code"
+    assert os.stat(output).st_mode & 0o777 == 0o755
+
+
+@pytest.mark.parametrize("link", [False, True])
+def test_missing_entry_is_a_miss(tmp_path, link):
+    cache = cache_with_entry(tmp_path)
+    os.remove(cache._entry_path("key"))
+    output = tmp_path / "output"
+    assert cache.fetch_many([("key", str(output)), ("other", str(tmp_path / "other"))], link=link) == [False, False]
+    assert not output.exists()
+    assert cache.stats()["misses"] == 2
+
+
+def test_fetch_replaces_an_existing_output(tmp_path):
+    cache = cache_with_entry(tmp_path)
+    output = tmp_path / "output"
+    output.write_bytes(b"stale")
+    assert cache.fetch_many([("key", str(output))], link=True) == [True]
+    assert output.read_bytes() == b"object code"
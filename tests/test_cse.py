@@ -0,0 +1,48 @@
+import pytest
+
+from conftest import MODES
+from programs import binary, branch, call, function, integer, let, program, show, var
+
+
+def shadowed_pure_function() -> dict:
+    # let h = fn (x) => x;
+    # let outer = fn (h) => { let g = fn (n) => h(n); g(1) + g(1) };
+    # print(outer(fn (y) => print(y)))
+    outer = function(["h"], let("g", function(["n"], call("h", var("n"))),
+                                binary("Add", call("g", integer(1)), call("g", integer(1)))))
+    return program(let("h", function(["x"], var("x")),
+                       let("outer", outer, show(call("outer", function(["y"], show(var("y"))))))))
+
+
+def shadowed_recursive_function() -> dict:
+    # As above, with g recursive so that it would be memoized
+    g = function(["n"], branch(binary("Eq", var("n"), integer(0)), integer(0),
+                               binary("Add", call("h", var("n")), call("g", binary("Sub", var("n"), integer(1))))))
+    outer = function(["h"], let("g", g, binary("Add", call("g", integer(2)), call("g", integer(2)))))
+    return program(let("h", function(["x"], var("x")),
+                       let("outer", outer, show(call("outer", function(["y"], show(var("y"))))))))
+
+
+def invariant_call_loop() -> dict:
+    # let sq = fn (x) => x * x;
+    # let loop = fn (i, n, acc) => if (i == sq(n)) { acc } else {
+    #   let _ = print(i); loop(i + 1, n, acc + (i % 3) * (i % 3)) };
+    # print(loop(0, 3, 0))
+    step = binary("Add", var("acc"), binary("Mul", binary("Rem", var("i"), integer(3)),
+                                            binary("Rem", var("i"), integer(3))))
+    loop = function(["i", "n", "acc"], branch(
+        binary("Eq", var("i"), call("sq", var("n"))), var("acc"),
+        let("_", show(var("i")), call("loop", binary("Add", var("i"), integer(1)), var("n"), step))))
+    return program(let("sq", function(["x"], binary("Mul", var("x"), var("x"))),
+                       let("loop", loop, show(call("loop", integer(0), integer(3), integer(0))))))
+
+
+@pytest.mark.parametrize("build", [shadowed_pure_function, shadowed_recursive_function, invariant_call_loop])
+@pytest.mark.parametrize("mode", [mode for mode in MODES if mode != "interp"])
+def test_matches_interpreter(run_program, build, mode):
+    expected = run_program(build(), MODES["interp"]).stdout
+    assert run_program(build(), MODES[mode]).stdout == expected
+
+
+def test_calls_through_shadowing_parameter_are_not_shared(run_program):
+    assert run_program(shadowed_pure_function(), MODES["jit-O2"]).stdout.split() == ["1", "1", "2"]
@@ -0,0 +1,30 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from programs import binary, integer, program, show
+
+
+@pytest.mark.skipif(shutil.which("cc") is None, reason="needs a cc to fall back to")
+def test_jit_without_clang_uses_cc(tmp_path):
+    # Only cc is left on PATH: every directory holding a clang is dropped
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    os.symlink(shutil.which("cc"), bin_dir / "cc")
+    paths = [path for path in os.environ.get("PATH", "").split(os.pathsep)
+             if path and not os.path.exists(os.path.join(path, "clang"))]
+    env = dict(os.environ, PATH=os.pathsep.join([str(bin_dir)] + paths),
+               CLOWNHEAD_CACHE_DIR=str(tmp_path / "cache"))
+    env.pop("CLOWNHEAD_FORKSERVER", None)
+
+    path = tmp_path / "program.json"
+    path.write_text(json.dumps(program(show(binary("Mul", integer(6), integer(7))))))
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), str(path), "--jit"], cwd=tmp_path,
+                            env=env, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "42\n"
@@ -0,0 +1,26 @@
+import pytest
+
+from conftest import MODES
+from programs import binary, call, function, integer, let, program, show, string, var
+
+
+def division_by_zero() -> dict:
+    # let z = 0; let _ = print(1); print(5 / z)
+    return program(let("z", integer(0), let("_", show(integer(1)), show(binary("Div", integer(5), var("z"))))))
+
+
+def call_of_a_string() -> dict:
+    # let f = fn (g) => g(1); let _ = print(1); print(f("g"))
+    return program(let("f", function(["g"], call("g", integer(1))),
+                       let("_", show(integer(1)), show(call("f", string("g"))))))
+
+
+@pytest.mark.parametrize("build, message", [(division_by_zero, "Error: Division by zero"),
+                                            (call_of_a_string, "Error: Cannot call a value of type Str")])
+@pytest.mark.parametrize("mode", list(MODES) + ["auto"])
+def test_runtime_errors_go_to_stderr_with_status_1(run_program, build, message, mode):
+    result = run_program(build(), MODES.get(mode, ["--auto"]), check=False)
+    assert result.returncode == 1
+    assert result.stdout == "1\n"
+    assert message in result.stderr.splitlines()
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import MODES
+from programs import binary, branch, call, first, function, integer, let, pair, program, second, show, var
+
+
+def closure_called_in_tail_position() -> dict:
+    # let make = fn (b) => {
+    #   let sum = fn (n) => {
+    #     let add = fn (k) => if (k < 1) { n + b } else { add(k - 1) + add(0) };
+    #     if (n == 0) { b } else { add(sum(n - 1) % 7) }
+    #   };
+    #   sum(5)
+    # };
+    # print(make(1))
+    # `add` is only called, so it is built on sum's stack, and the call to it
+    # is sum's tail call with the same signature
+    add = function(["k"], branch(binary("Lt", var("k"), integer(1)), binary("Add", var("n"), var("b")),
+                                 binary("Add", call("add", binary("Sub", var("k"), integer(1))),
+                                        call("add", integer(0)))))
+    total = function(["n"], let("add", add, branch(
+        binary("Eq", var("n"), integer(0)), var("b"),
+        call("add", binary("Rem", call("sum", binary("Sub", var("n"), integer(1))), integer(7))))))
+    make = function(["b"], let("sum", total, call("sum", integer(5))))
+    return program(let("make", make, show(call("make", integer(1)))))
+
+
+def printed_closure_call_in_tail_position() -> dict:
+    # let make = fn (b) => {
+    #   let scale = fn (n) => { let by = fn (k) => k * n + b; print(by(n)) };
+    #   scale(3) + scale(4)
+    # };
+    # print(make(1))
+    by = function(["k"], binary("Add", binary("Mul", var("k"), var("n")), var("b")))
+    scale = function(["n"], let("by", by, show(call("by", var("n")))))
+    make = function(["b"], let("scale", scale, binary("Add", call("scale", integer(3)), call("scale", integer(4)))))
+    return program(let("make", make, show(call("make", integer(1)))))
+
+
+def stack_tuples() -> dict:
+    # let norm = fn (x, y) => { let p = (x * x, y * y); first(p) + second(p) };
+    # print(norm(3, 4))
+    body = let("p", pair(binary("Mul", var("x"), var("x")), binary("Mul", var("y"), var("y"))),
+               binary("Add", first(var("p")), second(var("p"))))
+    return program(let("norm", function(["x", "y"], body), show(call("norm", integer(3), integer(4)))))
+
+
+@pytest.mark.parametrize("build", [closure_called_in_tail_position, printed_closure_call_in_tail_position,
+                                   stack_tuples])
+@pytest.mark.parametrize("mode", [mode for mode in MODES if mode != "interp"])
+def test_matches_interpreter(run_program, build, mode):
+    expected = run_program(build(), MODES["interp"]).stdout
+    assert run_program(build(), MODES[mode]).stdout == expected
+
+
+def test_stack_closure_survives_tail_call(run_program):
+    assert run_program(closure_called_in_tail_position(), MODES["jit-O2"]).stdout == "24\n"
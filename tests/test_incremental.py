@@ -0,0 +1,64 @@
+import os
+import subprocess
+
+import pytest
+
+from cache import CompileCache
+from programs import binary, call, function, integer, let, program, show, var
+
+
+def three_functions() -> dict:
+    # let double = fn (x) => x * 2; let inc = fn (x) => x + 1; let both = fn (x) => inc(double(x));
+    # print(both(20))
+    return program(let("double", function(["x"], binary("Mul", var("x"), integer(2))),
+                       let("inc", function(["x"], binary("Add", var("x"), integer(1))),
+                           let("both", function(["x"], call("inc", call("double", var("x")))),
+                               show(call("both", integer(20)))))))
+
+
+@pytest.fixture
+def build(tmp_path, cc):
+    # Runs main.py's --incremental unit build in process and returns the
+    # report and the program's output
+    import main
+    from backend import create_target_machine
+
+    target_machine = create_target_machine()
+    output_path = str(tmp_path / "program")
+
+    def run(cache: CompileCache):
+        args = main.parse_args(["program.json", "--incremental", "--cc", cc, "--cache-dir", cache.directory])
+        report = main.compile_program(main.dict_to_ast(three_functions()), args, target_machine, "program",
+                                      output_path, cache)
+        output = subprocess.run([output_path], capture_output=True, text=True, check=True).stdout
+        return report, output
+
+    return run
+
+
+def test_unit_evicted_before_link_is_still_reused(tmp_path, monkeypatch, build):
+    cache = CompileCache(str(tmp_path / "cache"))
+    report, output = build(cache)
+    assert output == "41\n" and not report.reused
+    claim = cache._claim
+
+    def claim_then_evict(entry, output_path, link):
+        # A concurrent build evicts every reused object before this one links
+        source = claim(entry, output_path, link)
+        os.remove(entry)
+        return source
+
+    monkeypatch.setattr(cache, "_claim", claim_then_evict)
+    report, output = build(cache)
+    assert output == "41\n"
+    assert sorted(report.reused) == ["both", "double", "inc", "main"] and not report.compiled
+
+
+def test_unit_missing_from_the_cache_is_recompiled(tmp_path, build):
+    cache = CompileCache(str(tmp_path / "cache"))
+    build(cache)
+    entries = sorted(os.listdir(cache.objects_dir))
+    os.remove(os.path.join(cache.objects_dir, entries[0]))
+    report, output = build(cache)
+    assert output == "41\n"
+    assert len(report.compiled) == 1 and len(report.reused) == 3
@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from conftest import MODES
+from programs import binary, branch, call, function, integer, let, program, show, var
+
+SMALL_INT_MIN = -(1 << 62)
+
+# Pairs crossing the tagged small-int range and the 64-bit range in both signs
+DIVISIONS = [
+    (7, 2), (7, -2), (-7, 2), (-7, -2), (-9, 3),
+    (SMALL_INT_MIN, -1), (SMALL_INT_MIN, 1), (SMALL_INT_MIN - 1, -1), (-SMALL_INT_MIN - 1, -1),
+    (-(1 << 63), -1), (-(1 << 63), 7), (-(1 << 70) - 5, 3), (1 << 70, -(1 << 65) + 1), (-1, 1 << 70),
+]
+
+
+def truncating_div(lhs: int, rhs: int) -> int:
+    # Rinha's `/` truncates towards zero, and `%` takes the sign of the dividend
+    quotient = abs(lhs) // abs(rhs)
+    return quotient if (lhs < 0) == (rhs < 0) else -quotient
+
+
+def literal(value: int) -> dict:
+    # There is no negative literal syntax, only `0 - n`
+    return integer(value) if value >= 0 else binary("Sub", integer(0), integer(-value))
+
+
+def factorials() -> dict:
+    # let fact = fn (n) => if (n == 0) { 1 } else { n * fact(n - 1) };
+    # print(fact(20)); print(fact(21)); print(fact(30))
+    body = branch(binary("Eq", var("n"), integer(0)), integer(1),
+                  binary("Mul", var("n"), call("fact", binary("Sub", var("n"), integer(1)))))
+    prints = show(call("fact", integer(30)))
+    for n in (21, 20):
+        prints = let("_", show(call("fact", integer(n))), prints)
+    return program(let("fact", function(["n"], body), prints))
+
+
+def fibonacci() -> dict:
+    # let fib = fn (n, a, b) => if (n == 0) { a } else { fib(n - 1, b, a + b) };
+    # print(fib(92, 0, 1)); print(fib(100, 0, 1))
+    body = branch(binary("Eq", var("n"), integer(0)), var("a"),
+                  call("fib", binary("Sub", var("n"), integer(1)), var("b"), binary("Add", var("a"), var("b"))))
+    prints = let("_", show(call("fib", integer(92), integer(0), integer(1))),
+                 show(call("fib", integer(100), integer(0), integer(1))))
+    return program(let("fib", function(["n", "a", "b"], body), prints))
+
+
+def divisions() -> dict:
+    # let check = fn (a, b) => { let _ = print(a / b); print(a % b) };
+    # with one check(a, b) per pair, so that nothing is folded before codegen
+    check = function(["a", "b"], let("_", show(binary("Div", var("a"), var("b"))),
+                                     show(binary("Rem", var("a"), var("b")))))
+    (lhs, rhs), *rest = reversed(DIVISIONS)
+    calls = call("check", literal(lhs), literal(rhs))
+    for lhs, rhs in rest:
+        calls = let("_", call("check", literal(lhs), literal(rhs)), calls)
+    return program(let("check", check, calls))
+
+
+def fib(n: int) -> int:
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+EXPECTED = {
+    factorials: [math.factorial(20), math.factorial(21), math.factorial(30)],
+    fibonacci: [fib(92), fib(100)],
+    divisions: [value for lhs, rhs in DIVISIONS
+                for value in (truncating_div(lhs, rhs), lhs - truncating_div(lhs, rhs) * rhs)],
+}
+
+
+@pytest.mark.parametrize("build", [factorials, fibonacci, divisions])
+@pytest.mark.parametrize("mode", MODES)
+def test_matches_python_integers(run_program, build, mode):
+    assert run_program(build(), MODES[mode]).stdout.split() == [str(value) for value in EXPECTED[build]]
@@ -0,0 +1,64 @@
+import pytest
+
+from conftest import MODES
+from programs import binary, boolean, call, function, integer, let, program, show, string, var
+
+
+def multiply_failing_division_by_zero() -> dict:
+    # let z = 0; print((5 / z) * 0)
+    return program(let("z", integer(0), show(binary("Mul", binary("Div", integer(5), var("z")), integer(0)))))
+
+
+def and_failing_remainder_by_zero() -> dict:
+    # print(((1 % 0) == 1) && false)
+    return program(show(binary("And", binary("Eq", binary("Rem", integer(1), integer(0)), integer(1)),
+                               boolean(False))))
+
+
+def multiply_bool_by_zero() -> dict:
+    # let h = fn (x) => x * 0; print(h(true))
+    return program(let("h", function(["x"], binary("Mul", var("x"), integer(0))),
+                       show(call("h", boolean(True)))))
+
+
+@pytest.mark.parametrize("build", [multiply_failing_division_by_zero, and_failing_remainder_by_zero,
+                                   multiply_bool_by_zero])
+@pytest.mark.parametrize("mode", MODES)
+def test_dropped_operands_still_fail(run_program, build, mode):
+    result = run_program(build(), MODES[mode], check=False)
+    output = result.stdout + result.stderr
+    assert "Error: " in output
+    assert result.stdout.split("Error: ")[0].strip() == ""
+
+
+def add_zero_to_string() -> dict:
+    # let s = "a"; print(s + 0)
+    return program(let("s", string("a"), show(binary("Add", var("s"), integer(0)))))
+
+
+def identities_on_parameters() -> dict:
+    # let f = fn (x) => 0 + x; let g = fn (x) => x * 1;
+    # print(f("b")); print(f(4)); print(g(3)); print(g(5) / 1 - 0)
+    f = function(["x"], binary("Add", integer(0), var("x")))
+    g = function(["x"], binary("Mul", var("x"), integer(1)))
+    prints = let("_", show(call("f", string("b"))), let("_", show(call("f", integer(4))), let(
+        "_", show(call("g", integer(3))),
+        show(binary("Sub", binary("Div", call("g", integer(5)), integer(1)), integer(0))))))
+    return program(let("f", f, let("g", g, prints)))
+
+
+def identities_on_booleans() -> dict:
+    # let k = fn (x, y) => (x || false) && (true && y) || (x && false);
+    # print(k(true, true)); print(k(true, false))
+    body = binary("Or", binary("And", binary("Or", var("x"), boolean(False)), binary("And", boolean(True), var("y"))),
+                  binary("And", var("x"), boolean(False)))
+    prints = let("_", show(call("k", boolean(True), boolean(True))), show(call("k", boolean(True), boolean(False))))
+    return program(let("k", function(["x", "y"], body), prints))
+
+
+@pytest.mark.parametrize("build, expected", [(add_zero_to_string, ["a0"]),
+                                             (identities_on_parameters, ["0b", "4", "3", "5"]),
+                                             (identities_on_booleans, ["true", "false"])])
+@pytest.mark.parametrize("mode", MODES)
+def test_identities(run_program, build, expected, mode):
+    assert run_program(build(), MODES[mode]).stdout.split() == expected
@@ -0,0 +1,111 @@
+import os
+import subprocess
+
+import pytest
+
+from conftest import MODES
+from programs import binary, branch, call, function, integer, let, program, show, string, var
+
+
+def sequence(*expressions: dict) -> dict:
+    *effects, last = expressions
+    for effect in reversed(effects):
+        last = let("_", effect, last)
+    return last
+
+
+def format_characters() -> dict:
+    # print("100%"); print("%s%d%n"); print("a\tb"); print("%s%d%n")
+    return program(sequence(show(string("100%")), show(string("%s%d%n")), show(string("a\tb")),
+                            show(string("%s%d%n"))))
+
+
+def print_returns_its_argument() -> dict:
+    # print(print(1) + 1); print(print("a") + "b")
+    return program(sequence(show(binary("Add", show(integer(1)), integer(1))),
+                            show(binary("Add", show(string("a")), string("b")))))
+
+
+def interned_literals_are_not_shared_with_results() -> dict:
+    # let a = "x"; let b = a + "y"; print(a); print(b); print("x" + "")
+    return program(let("a", string("x"), let("b", binary("Add", var("a"), string("y")), sequence(
+        show(var("a")), show(var("b")), show(binary("Add", string("x"), string("")))))))
+
+
+def repeated_literal_in_a_loop() -> dict:
+    # let loop = fn (i) => if (i == 0) { "done" } else { let _ = print("tick"); loop(i - 1) };
+    # print(loop(1000))
+    loop = function(["i"], branch(binary("Eq", var("i"), integer(0)), string("done"),
+                                  let("_", show(string("tick")), call("loop", binary("Sub", var("i"), integer(1))))))
+    return program(let("loop", loop, show(call("loop", integer(1000)))))
+
+
+EXPECTED = {
+    format_characters: ["100%", "%s%d%n", "a\tb", "%s%d%n"],
+    print_returns_its_argument: ["1", "2", "a", "ab"],
+    interned_literals_are_not_shared_with_results: ["x", "xy", "x"],
+    repeated_literal_in_a_loop: ["tick"] * 1000 + ["done"],
+}
+
+
+@pytest.mark.parametrize("build", list(EXPECTED))
+@pytest.mark.parametrize("mode", MODES)
+def test_printed_output(run_program, build, mode):
+    assert run_program(build(), MODES[mode]).stdout.split("\n") == EXPECTED[build] + [""]
+
+
+def test_string_literals_are_interned():
+    import main
+    from codegen import generate_code
+    ast = main.optimize_ast(main.dict_to_ast(format_characters()), main.parse_args(["program.json", "-O2"]))
+    module = generate_code(ast, None)
+    texts = [str(value.initializer) for value in module.global_values if value.name.startswith("str")]
+    # Four prints of three distinct texts
+    assert len(texts) == len(set(texts)) == 3
+
+
+INTEGERS = [0, 9, 10, 99, 100, -1, -10, -99, (1 << 62) - 1, -(1 << 62), 1 << 62, 10 ** 19, -(10 ** 20)]
+LINES = 30000
+
+
+def literal(value: int) -> dict:
+    return integer(value) if value >= 0 else binary("Sub", integer(0), integer(-value))
+
+
+def integer_formatting() -> dict:
+    # let show = fn (n) => print(n); show(0); show(9); ...
+    # Through a parameter, so nothing is formatted at compile time
+    return program(let("p", function(["n"], show(var("n"))),
+                       sequence(*(call("p", literal(value)) for value in INTEGERS))))
+
+
+def counting_loop(last: dict) -> dict:
+    # let d = 0; let loop = fn (i) => if (i == LINES) { <last> } else { let _ = print(i); loop(i + 1) }; loop(0)
+    loop = function(["i"], branch(binary("Eq", var("i"), integer(LINES)), last,
+                                  let("_", show(var("i")), call("loop", binary("Add", var("i"), integer(1))))))
+    return program(let("d", integer(0), let("loop", loop, call("loop", integer(0)))))
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_integer_formatting(run_program, mode):
+    assert run_program(integer_formatting(), MODES[mode]).stdout.split() == [str(value) for value in INTEGERS]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_output_larger_than_the_buffer(run_program, mode):
+    expected = "".join(f"{i}\n" for i in range(LINES))
+    assert len(expected) > 64 * 1024
+    assert run_program(counting_loop(integer(0)), MODES[mode]).stdout == expected
+
+
+@pytest.mark.parametrize("last, status", [(integer(0), 0), (binary("Div", integer(1), var("d")), 1)])
+def test_memory_mapped_output(run_program, tmp_path, last, status):
+    # Formatted straight into a mapping of the file after the first buffer,
+    # and cut to length when flushed, also before a runtime error
+    run_program(counting_loop(last), MODES["exe"], check=False)
+    output = tmp_path / "output.txt"
+    with open(output, "w") as stdout:
+        result = subprocess.run([str(tmp_path / "program")], stdout=stdout, stderr=subprocess.PIPE, text=True,
+                                env=dict(os.environ, RINHA_OUTPUT_MMAP="1"), timeout=300)
+    assert result.returncode == status
+    assert output.read_text() == "".join(f"{i}\n" for i in range(LINES))
@@ -0,0 +1,67 @@
+import pytest
+
+from conftest import MODES
+from programs import binary, branch, call, function, integer, let, program, show, var
+
+
+def collatz_steps(n: int) -> int:
+    steps = 0
+    while n != 1:
+        n = n // 2 if n % 2 == 0 else 3 * n + 1
+        steps += 1
+    return steps
+
+
+LIMIT = 300
+EXPECTED = f"{sum(collatz_steps(i) for i in range(1, LIMIT + 1))}\n"
+
+
+def collatz_total() -> dict:
+    # let collatz = fn (n, steps) => if (n == 1) { steps } else {
+    #   if (n % 2 == 0) { collatz(n / 2, steps + 1) } else { collatz(3 * n + 1, steps + 1) } };
+    # let sum = fn (i, acc) => if (i == 0) { acc } else { sum(i - 1, acc + collatz(i, 0)) };
+    # print(sum(LIMIT, 0))
+    steps = binary("Add", var("steps"), integer(1))
+    collatz = function(["n", "steps"], branch(
+        binary("Eq", var("n"), integer(1)), var("steps"),
+        branch(binary("Eq", binary("Rem", var("n"), integer(2)), integer(0)),
+               call("collatz", binary("Div", var("n"), integer(2)), steps),
+               call("collatz", binary("Add", binary("Mul", integer(3), var("n")), integer(1)), steps))))
+    total = function(["i", "acc"], branch(
+        binary("Eq", var("i"), integer(0)), var("acc"),
+        call("sum", binary("Sub", var("i"), integer(1)),
+             binary("Add", var("acc"), call("collatz", var("i"), integer(0))))))
+    return program(let("collatz", collatz, let("sum", total, show(call("sum", integer(LIMIT), integer(0))))))
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_training_program(run_program, mode):
+    assert run_program(collatz_total(), MODES[mode]).stdout == EXPECTED
+
+
+def test_pgo(run_program):
+    assert run_program(collatz_total(), ["-O2", "--pgo"]).stdout == EXPECTED
+
+
+@pytest.mark.parametrize("mode", ["jit-O2", "exe"])
+def test_profile_generate_then_use(run_program, tmp_path, mode):
+    # The instrumented executable writes the profile when it exits
+    assert run_program(collatz_total(), ["-O2", "--profile-generate", "program.profile"]).stdout == EXPECTED
+    assert (tmp_path / "program.profile").exists()
+    assert run_program(collatz_total(), MODES[mode] + ["--profile-use", "program.profile"]).stdout == EXPECTED
+
+
+def test_profile_of_another_program_is_rejected(run_program):
+    run_program(collatz_total(), ["-O2", "--profile-generate", "program.profile"])
+    other = program(show(integer(1)))
+    result = run_program(other, ["-O2", "--profile-use", "program.profile"], check=False)
+    assert result.returncode == 1
+    assert "recorded for another program" in result.stdout
+
+
+def test_pgo_fails_with_the_training_run(run_program):
+    # let z = 0; print(1 / z)
+    failing = program(let("z", integer(0), show(binary("Div", integer(1), var("z")))))
+    result = run_program(failing, ["-O2", "--pgo"], check=False)
+    assert result.returncode == 1
+    assert "The training run failed with exit status 1" in result.stdout
@@ -0,0 +1,60 @@
+import pytest
+
+from conftest import MODES
+from programs import binary, branch, call, function, integer, let, program, show, var
+
+
+def parameter_hides_function_name() -> dict:
+    # let f = fn (f) => f + 1; print(f(1))
+    return program(let("f", function(["f"], binary("Add", var("f"), integer(1))), show(call("f", integer(1)))))
+
+
+def nested_let_restores_outer_binding() -> dict:
+    # let x = 1; let y = (let x = 2; x * 10); print(x + y)
+    return program(let("x", integer(1), let("y", let("x", integer(2), binary("Mul", var("x"), integer(10))),
+                                            show(binary("Add", var("x"), var("y"))))))
+
+
+def captures_across_levels() -> dict:
+    # let a = 1; let f = fn (b) => { let g = fn (c) => a + b * c; g(3) }; print(f(2))
+    g = function(["c"], binary("Add", var("a"), binary("Mul", var("b"), var("c"))))
+    return program(let("a", integer(1), let("f", function(["b"], let("g", g, call("g", integer(3)))),
+                                            show(call("f", integer(2))))))
+
+
+def returned_recursive_closure() -> dict:
+    # let make = fn (k) => { let loop = fn (n) => if (n == 0) { k } else { loop(n - 1) }; loop };
+    # print(make(7)(3))
+    loop = function(["n"], branch(binary("Eq", var("n"), integer(0)), var("k"),
+                                  call("loop", binary("Sub", var("n"), integer(1)))))
+    return program(let("make", function(["k"], let("loop", loop, var("loop"))),
+                       show(call(call("make", integer(7)), integer(3)))))
+
+
+EXPECTED = {
+    parameter_hides_function_name: ["2"],
+    nested_let_restores_outer_binding: ["21"],
+    captures_across_levels: ["7"],
+    returned_recursive_closure: ["7"],
+}
+
+
+@pytest.mark.parametrize("build", list(EXPECTED))
+@pytest.mark.parametrize("mode", MODES)
+def test_bindings(run_program, build, mode):
+    assert run_program(build(), MODES[mode]).stdout.split() == EXPECTED[build]
+
+
+@pytest.mark.parametrize("ast, message", [
+    # print(nope)
+    (program(show(var("nope"))), "Unbound variable 'nope' at test.rinha:0"),
+    # let f = fn (x, x) => x; print(f(1, 2))
+    (program(let("f", function(["x", "x"], var("x")), show(call("f", integer(1), integer(2))))),
+     "Duplicate parameter 'x' at test.rinha:0"),
+])
+def test_errors_are_reported_before_code_generation(ast, message):
+    import main
+    from resolve import ResolveError, resolve_names
+
+    with pytest.raises(ResolveError, match=message):
+        resolve_names(main.dict_to_ast(ast))
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import MODES
+from programs import binary, boolean, branch, call, function, integer, let, program, show, var
+
+# Deep enough to overflow any stack unless the recursion runs as a loop
+N = 10 ** 7
+
+
+def accumulating_sum() -> dict:
+    # let sum = fn (n) => if (n == 1) { n } else { n + sum(n - 1) };
+    # print(sum(N))
+    body = branch(binary("Eq", var("n"), integer(1)), var("n"),
+                  binary("Add", var("n"), call("sum", binary("Sub", var("n"), integer(1)))))
+    return program(let("sum", function(["n"], body), show(call("sum", integer(N)))))
+
+
+def tail_recursive_sum() -> dict:
+    # let sum = fn (n, acc) => if (n == 0) { acc } else { sum(n - 1, acc + n) };
+    # print(sum(N, 0))
+    body = branch(binary("Eq", var("n"), integer(0)), var("acc"),
+                  call("sum", binary("Sub", var("n"), integer(1)), binary("Add", var("acc"), var("n"))))
+    return program(let("sum", function(["n", "acc"], body), show(call("sum", integer(N), integer(0)))))
+
+
+@pytest.mark.parametrize("build", [accumulating_sum, tail_recursive_sum])
+@pytest.mark.parametrize("mode", ["jit-O0", "jit-O2", "interp"])
+def test_sum_to_ten_million(run_program, build, mode):
+    assert run_program(build(), MODES[mode]).stdout == f"{N * (N + 1) // 2}\n"
+
+
+def failing_accumulated_division() -> dict:
+    # let d = 0;
+    # let f = fn (n) => if (n == 0) { print(0) } else { let _ = print(n); f(n - 1) + n / d };
+    # print(f(3))
+    body = branch(binary("Eq", var("n"), integer(0)), show(integer(0)),
+                  let("_", show(var("n")), binary("Add", call("f", binary("Sub", var("n"), integer(1))),
+                                                  binary("Div", var("n"), var("d")))))
+    return program(let("d", integer(0), let("f", function(["n"], body), show(call("f", integer(3))))))
+
+
+def failing_accumulated_bool() -> dict:
+    # let f = fn (n, b) => if (n == 0) { print(1) } else { let _ = print(n); f(n - 1, b) * b };
+    # print(f(3, true))
+    body = branch(binary("Eq", var("n"), integer(0)), show(integer(1)),
+                  let("_", show(var("n")), binary("Mul", call("f", binary("Sub", var("n"), integer(1)), var("b")),
+                                                  var("b"))))
+    return program(let("f", function(["n", "b"], body), show(call("f", integer(3), boolean(True)))))
+
+
+@pytest.mark.parametrize("build, expected", [(failing_accumulated_division, ["3", "2", "1", "0"]),
+                                             (failing_accumulated_bool, ["3", "2", "1", "1"])])
+@pytest.mark.parametrize("mode", MODES)
+def test_operand_fails_after_the_recursion(run_program, build, expected, mode):
+    # Every level prints before the first operand is evaluated
+    result = run_program(build(), MODES[mode], check=False)
+    assert result.returncode == 1
+    assert result.stdout.split() == expected
@@ -0,0 +1,77 @@
+import pytest
+
+from conftest import MODES
+from programs import (binary, boolean, branch, call, first, function, integer, let, pair, program, second, show,
+                      string, var)
+
+
+def sequence(*expressions: dict) -> dict:
+    # let _ = e1; let _ = e2; ...; en
+    *effects, last = expressions
+    for effect in reversed(effects):
+        last = let("_", effect, last)
+    return last
+
+
+def polymorphic_identity() -> dict:
+    # let id = fn (x) => x; print(id(1)); print(id("a")); print(id(true)); print(id((1, 2)))
+    return program(let("id", function(["x"], var("x")), sequence(
+        show(call("id", integer(1))), show(call("id", string("a"))), show(call("id", boolean(True))),
+        show(call("id", pair(integer(1), integer(2)))))))
+
+
+def dynamic_result() -> dict:
+    # let f = fn (b) => if (b) { 1 } else { "one" };
+    # print(f(true)); print(f(false)); print(f(true) + 1); print(f(false) + 1)
+    f = function(["b"], branch(var("b"), integer(1), string("one")))
+    return program(let("f", f, sequence(
+        show(call("f", boolean(True))), show(call("f", boolean(False))),
+        show(binary("Add", call("f", boolean(True)), integer(1))),
+        show(binary("Add", call("f", boolean(False)), integer(1))))))
+
+
+def functions_as_values() -> dict:
+    # let add = fn (a, b) => a + b; let apply = fn (g, x, y) => g(x, y);
+    # print(apply(add, 1, 2)); print(add("x", 3)); print(apply(add, "p", "q")); print(add(4, 5))
+    add = function(["a", "b"], binary("Add", var("a"), var("b")))
+    apply = function(["g", "x", "y"], call("g", var("x"), var("y")))
+    return program(let("add", add, let("apply", apply, sequence(
+        show(call("apply", var("add"), integer(1), integer(2))), show(call("add", string("x"), integer(3))),
+        show(call("apply", var("add"), string("p"), string("q"))), show(call("add", integer(4), integer(5)))))))
+
+
+def mixed_tuples() -> dict:
+    # let t = (1, "s"); print(first(t) + 1); print(second(t) + 1); print(first(t) == 1)
+    return program(let("t", pair(integer(1), string("s")), sequence(
+        show(binary("Add", first(var("t")), integer(1))), show(binary("Add", second(var("t")), integer(1))),
+        show(binary("Eq", first(var("t")), integer(1))))))
+
+
+def equality_on_every_type() -> dict:
+    # let eq = fn (a, b) => a == b; print(eq(1, 1)); print(eq("a", "b")); print(eq(true, true))
+    eq = function(["a", "b"], binary("Eq", var("a"), var("b")))
+    return program(let("eq", eq, sequence(
+        show(call("eq", integer(1), integer(1))), show(call("eq", string("a"), string("b"))),
+        show(call("eq", boolean(True), boolean(True))))))
+
+
+def overflowing_int_parameter() -> dict:
+    # let sq = fn (x) => x * x; print(sq(3037000500)); print(sq(3))
+    return program(let("sq", function(["x"], binary("Mul", var("x"), var("x"))), sequence(
+        show(call("sq", integer(3037000500))), show(call("sq", integer(3))))))
+
+
+EXPECTED = {
+    polymorphic_identity: ["1", "a", "true", "(1, 2)"],
+    dynamic_result: ["1", "one", "2", "one1"],
+    functions_as_values: ["3", "x3", "pq", "9"],
+    mixed_tuples: ["2", "s1", "true"],
+    equality_on_every_type: ["true", "false", "true"],
+    overflowing_int_parameter: [str(3037000500 ** 2), "9"],
+}
+
+
+@pytest.mark.parametrize("build", list(EXPECTED))
+@pytest.mark.parametrize("mode", MODES)
+def test_known_and_dynamic_types(run_program, build, mode):
+    assert run_program(build(), MODES[mode]).stdout.splitlines() == EXPECTED[build]